@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the memory processor's payload reader (functions/memory_processor/payload_reader.py).
+
+Builds synthetic delivered payloads of the requested sizes, mostly made of
+tool results (JSON documents embedded as escaped strings, nested objects) and
+base64 images between a few text turns, and compares reading the transcript
+with the streaming reader against loading the whole payload with json.loads
+and re-serializing non-text content with json.dumps, as the handler used to.
+Reports parse time and peak Python memory (tracemalloc) for both.
+
+Examples:
+  python bench/bench_payload.py
+  python bench/bench_payload.py --sizes-mb 1 10 100 --max-tokens 8000
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "functions", "memory_processor"))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from payload_reader import read_transcript  # noqa: E402
+
+CHUNK_BYTES = 64 * 1024
+
+
+def _tool_result(rng: random.Random, size: int) -> dict:
+    rows = [{"id": i, "name": f"item-{rng.randint(0, 10**6)}", "tags": ["a", "b"], "score": rng.random()}
+            for i in range(max(1, size // 80))]
+    if rng.random() < 0.5:
+        # Tool output passed through as a JSON string: every quote is escaped
+        return {"toolResult": {"toolUseId": "t1", "content": [{"text": json.dumps(rows)}]}}
+    return {"toolResult": {"toolUseId": "t1", "content": [{"json": rows}]}}
+
+
+def synthetic_payload(size_mb: float, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    turns, size, i = [], 0, 0
+    while size < target:
+        if i % 4 == 0:
+            content = {"text": f"My name is user{i} and I prefer email, my dog is called Rex{i}."}
+        elif i % 4 == 1:
+            content = {"text": "Sure, I will remember that."}
+        elif i % 8 == 2:
+            content = {"image": {"format": "png", "source": {"bytes": base64.b64encode(rng.randbytes(256 * 1024)).decode()}}}
+        else:
+            content = _tool_result(rng, 512 * 1024)
+        turn = {"role": "USER" if i % 2 == 0 else "ASSISTANT", "content": content}
+        size += len(json.dumps(turn))
+        turns.append(turn)
+        i += 1
+    payload = {
+        "actorId": "bench-actor",
+        "sessionId": "bench-session",
+        "historicalContext": turns[:-2],
+        "currentContext": turns[-2:],
+    }
+    return json.dumps(payload).encode()
+
+
+def load_whole(raw: bytes) -> list[str]:
+    """The previous approach: json.loads the body, json.dumps whatever is not text."""
+    payload = json.loads(raw)
+    lines = []
+    for section in ("historicalContext", "currentContext"):
+        for item in payload.get(section, []) or []:
+            if "role" in item and "content" in item:
+                content = item.get("content", {})
+                text = content.get("text")
+                if text is None:
+                    text = json.dumps(content) if content else json.dumps(item)
+                lines.append(f"{item.get('role', 'UNKNOWN')}: {text}")
+    return lines
+
+
+def stream(raw: bytes, max_tokens: int) -> list[str]:
+    view = memoryview(raw)
+    chunks = (bytes(view[i:i + CHUNK_BYTES]) for i in range(0, len(raw), CHUNK_BYTES))
+    return read_transcript(chunks, max_tokens=max_tokens).lines
+
+
+def measure(fn) -> tuple[float, float, list[str]]:
+    start = time.perf_counter()
+    lines = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 10, 50, 100], help="Payload sizes")
+    parser.add_argument("--max-tokens", type=int, default=16000, help="Transcript budget for the streaming reader")
+    args = parser.parse_args()
+
+    print(f"{'size':>8}  {'method':<10} {'time':>9} {'peak mem':>10} {'turns':>6} {'transcript':>11}")
+    for size_mb in args.sizes_mb:
+        raw = synthetic_payload(size_mb)
+        for name, fn in (("json.loads", lambda: load_whole(raw)), ("stream", lambda: stream(raw, args.max_tokens))):
+            elapsed, peak, lines = measure(fn)
+            transcript_kb = sum(len(line.encode()) + 1 for line in lines) / 1024
+            print(f"{len(raw) / 2**20:6.1f}MB  {name:<10} {elapsed * 1000:7.0f}ms {peak / 2**20:8.1f}MB "
+                  f"{len(lines):6d} {transcript_kb:9.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the transcript scrubber (src/scrubber.py).
+
+Builds synthetic transcripts with a mix of plain turns, filler turns and turns
+carrying SSNs, passwords and card numbers, and reports scrub time per KB and
+the bytes/tokens the scrubber removes.
+
+Examples:
+  python bench/bench_scrubber.py
+  python bench/bench_scrubber.py --turns 2000 --repeat 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from scrubber import Scrubber  # noqa: E402
+
+TURNS = (
+    "USER: Hi, my name is {name} and I live in Seattle.",
+    "ASSISTANT: Nice to meet you, {name}! How can I help you today?",
+    "USER: My SSN is {ssn}, can you keep it on file?",
+    "USER: my password is {word}{n}!",
+    "USER: please charge card {card}",
+    "USER: thanks!",
+    "ASSISTANT: ok",
+    "USER: I prefer to be contacted by email, I have a dog named {word}.",
+    "ASSISTANT: Got it. I will remember that you prefer email and that your dog is called {word}.",
+)
+NAMES = ("John", "Jane", "Priya", "Wei", "Ana")
+WORDS = ("frogo", "hunter", "river", "maple", "orbit")
+
+
+def synthetic_lines(turns: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(turns):
+        lines.append(rng.choice(TURNS).format(
+            name=rng.choice(NAMES),
+            word=rng.choice(WORDS),
+            n=rng.randint(10, 99),
+            ssn=f"{rng.randint(100, 665):03d}-{rng.randint(10, 99)}-{rng.randint(1000, 9999)}",
+            card=" ".join(f"{rng.randint(1000, 9999)}" for _ in range(4)),
+        ))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200, help="Turns per synthetic transcript")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed iterations")
+    args = parser.parse_args()
+
+    scrubber = Scrubber()
+    lines = synthetic_lines(args.turns)
+    size_kb = len("\n".join(lines).encode()) / 1024
+
+    scrubber.scrub_lines(lines)  # warm up
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        _, stats = scrubber.scrub_lines(lines)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    median = timings[len(timings) // 2]
+
+    print(f"transcript: {args.turns} turns, {size_kb:.1f} KB")
+    print(f"scrub time: median {median * 1e6:.0f} us, {median * 1e6 / size_kb:.1f} us/KB")
+    print(f"saved:      {stats.bytes_saved} bytes (~{stats.tokens_saved} tokens), "
+          f"{stats.turns_in - stats.turns_out} of {stats.turns_in} turns dropped")
+    print(f"redactions: {stats.redactions}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark for relevance-based tool selection (src/tool_selection.py).
+
+Replays prompts with known relevant tools against a tool catalog and reports,
+for each top-k: how often every relevant tool was selected (recall), how often
+at least one was, the tool-definition tokens attached and saved per request,
+and the selection time. The built-in catalog imitates a few federated MCP
+servers (web search, code hosting, issue tracking, chat, files, calendar).
+
+Examples:
+  python bench/bench_tool_selection.py
+  python bench/bench_tool_selection.py --top-k 3 5 8 --pinned "web_*"
+  python bench/bench_tool_selection.py --catalog tools.json --replay replay.jsonl
+
+--catalog is a JSON list of tool specs ({"name", "description", "inputSchema"}),
+--replay has one {"prompt": ..., "expected": [tool names]} object per line.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from tool_selection import ToolSelector  # noqa: E402
+
+
+def _tool(name: str, description: str, **params: str) -> dict:
+    return {
+        "name": name,
+        "description": description,
+        "inputSchema": {"json": {
+            "type": "object",
+            "properties": {p: {"type": "string", "description": d} for p, d in params.items()},
+            "required": list(params)[:1],
+        }},
+    }
+
+
+CATALOG = [
+    _tool("web_search_exa", "Search the web for up-to-date information and return page titles, URLs and snippets.",
+          query="Search query", num_results="Number of results to return"),
+    _tool("web_crawling_exa", "Fetch the full content of a web page by URL, including text and metadata.",
+          url="URL of the page to crawl", max_characters="Maximum characters to return"),
+    _tool("get_code_context_exa", "Find code examples, API documentation and library usage snippets for a programming question.",
+          query="Programming question or library name", tokens="Token budget for the response"),
+    _tool("company_research_exa", "Research a company: business overview, funding, news and key people.",
+          company_name="Name of the company"),
+    _tool("linkedin_search_exa", "Search LinkedIn profiles and company pages.", query="Person or company to search for"),
+    _tool("github_search_repositories", "Search GitHub repositories by keyword, language or topic.",
+          query="Search keywords", language="Programming language filter"),
+    _tool("github_get_file_contents", "Get the contents of a file or directory in a GitHub repository.",
+          owner="Repository owner", repo="Repository name", path="File path", ref="Branch or commit"),
+    _tool("github_create_issue", "Open a new issue in a GitHub repository.",
+          owner="Repository owner", repo="Repository name", title="Issue title", body="Issue description"),
+    _tool("github_list_pull_requests", "List open or closed pull requests of a GitHub repository.",
+          owner="Repository owner", repo="Repository name", state="open, closed or all"),
+    _tool("github_create_pull_request", "Create a pull request from a branch.",
+          owner="Repository owner", repo="Repository name", head="Source branch", base="Target branch"),
+    _tool("github_search_code", "Search source code across GitHub repositories.", query="Code search query"),
+    _tool("jira_search_issues", "Search Jira tickets with JQL or free text.", jql="JQL query", max_results="Maximum tickets"),
+    _tool("jira_create_issue", "Create a Jira ticket in a project.",
+          project="Project key", summary="Ticket summary", issue_type="Bug, Task or Story"),
+    _tool("jira_transition_issue", "Move a Jira ticket to another status such as In Progress or Done.",
+          issue_key="Ticket key", transition="Target status"),
+    _tool("jira_add_comment", "Add a comment to a Jira ticket.", issue_key="Ticket key", comment="Comment text"),
+    _tool("slack_post_message", "Post a message to a Slack channel or user.", channel="Channel name or id", text="Message text"),
+    _tool("slack_search_messages", "Search Slack messages across channels.", query="Search text"),
+    _tool("slack_list_channels", "List the Slack channels the bot can access."),
+    _tool("read_file", "Read a text file from the local workspace.", path="File path"),
+    _tool("write_file", "Create or overwrite a file in the local workspace.", path="File path", content="File content"),
+    _tool("list_directory", "List files and folders in a workspace directory.", path="Directory path"),
+    _tool("search_files", "Find files in the workspace whose name matches a glob pattern.", pattern="Glob pattern"),
+    _tool("calendar_list_events", "List calendar events and meetings in a date range.", start="Start date", end="End date"),
+    _tool("calendar_create_event", "Schedule a meeting or calendar event and invite attendees.",
+          title="Event title", start="Start time", attendees="Email addresses"),
+    _tool("calendar_find_free_time", "Find free time slots shared by several people.", attendees="Email addresses"),
+    _tool("email_send", "Send an email message.", to="Recipient address", subject="Subject", body="Message body"),
+    _tool("email_search", "Search the mailbox for emails by sender, subject or text.", query="Search text"),
+    _tool("weather_forecast", "Get the weather forecast for a city or coordinates.", location="City name", days="Days ahead"),
+    _tool("currency_convert", "Convert an amount between currencies at today's exchange rate.",
+          amount="Amount", source="Currency code", target="Currency code"),
+    _tool("translate_text", "Translate text into another language.", text="Text to translate", target_language="Language"),
+    _tool("sql_query", "Run a read-only SQL query against the analytics database.", query="SQL statement"),
+    _tool("sql_describe_table", "Describe the columns and types of a database table.", table="Table name"),
+    _tool("cloudwatch_get_logs", "Fetch recent log events from a CloudWatch log group.", log_group="Log group name", filter="Filter pattern"),
+    _tool("cloudwatch_get_metric", "Get datapoints of a CloudWatch metric such as Lambda errors or latency.",
+          namespace="Metric namespace", metric="Metric name"),
+    _tool("s3_list_objects", "List objects in an S3 bucket under a prefix.", bucket="Bucket name", prefix="Key prefix"),
+    _tool("s3_get_object", "Download an object from S3.", bucket="Bucket name", key="Object key"),
+]
+
+REPLAY = [
+    {"prompt": "What's the latest news about the Python 3.13 release?", "expected": ["web_search_exa"]},
+    {"prompt": "Summarize this article for me: https://example.com/blog/post", "expected": ["web_crawling_exa"]},
+    {"prompt": "How do I use asyncio.TaskGroup? Show me a code example", "expected": ["get_code_context_exa"]},
+    {"prompt": "Give me an overview of Anthropic as a company and its funding", "expected": ["company_research_exa"]},
+    {"prompt": "Find popular Rust repositories for parsing JSON", "expected": ["github_search_repositories"]},
+    {"prompt": "Show me the README file in the strands-agents/sdk-python repo", "expected": ["github_get_file_contents"]},
+    {"prompt": "Open a GitHub issue in my repo about the broken login page", "expected": ["github_create_issue"]},
+    {"prompt": "Which pull requests are still open on our backend repository?", "expected": ["github_list_pull_requests"]},
+    {"prompt": "Where in GitHub code is BedrockAgentCoreApp used?", "expected": ["github_search_code"]},
+    {"prompt": "Find all Jira tickets assigned to me that are blocked", "expected": ["jira_search_issues"]},
+    {"prompt": "Create a bug ticket in project PAY for the failing refunds", "expected": ["jira_create_issue"]},
+    {"prompt": "Move PAY-123 to Done", "expected": ["jira_transition_issue"]},
+    {"prompt": "Comment on ticket PAY-88 that the fix is deployed", "expected": ["jira_add_comment"]},
+    {"prompt": "Post a message in the #releases Slack channel saying v2 is out", "expected": ["slack_post_message"]},
+    {"prompt": "Did anyone mention the outage in Slack yesterday?", "expected": ["slack_search_messages"]},
+    {"prompt": "Read the config.yaml file in my workspace", "expected": ["read_file"]},
+    {"prompt": "Save these notes to a file called notes.md", "expected": ["write_file"]},
+    {"prompt": "What files are in the src directory?", "expected": ["list_directory"]},
+    {"prompt": "Find all files matching *.test.ts", "expected": ["search_files"]},
+    {"prompt": "What meetings do I have tomorrow?", "expected": ["calendar_list_events"]},
+    {"prompt": "Schedule a meeting with ana@example.com on Friday at 10", "expected": ["calendar_create_event"]},
+    {"prompt": "When are Bob and Carol both free next week?", "expected": ["calendar_find_free_time"]},
+    {"prompt": "Send an email to my manager saying I'm out sick", "expected": ["email_send"]},
+    {"prompt": "Find the email from the landlord about the lease", "expected": ["email_search"]},
+    {"prompt": "Will it rain in Seattle this weekend?", "expected": ["weather_forecast"]},
+    {"prompt": "How much is 250 euros in US dollars?", "expected": ["currency_convert"]},
+    {"prompt": "Translate 'good morning, how are you' into Japanese", "expected": ["translate_text"]},
+    {"prompt": "How many orders did we get last month? Query the orders table", "expected": ["sql_query"]},
+    {"prompt": "What columns does the customers table have?", "expected": ["sql_describe_table"]},
+    {"prompt": "Show me the error logs of the memory processor Lambda", "expected": ["cloudwatch_get_logs"]},
+    {"prompt": "What was the p99 latency metric of the API last hour?", "expected": ["cloudwatch_get_metric"]},
+    {"prompt": "List the objects under deliveries/ in the events bucket", "expected": ["s3_list_objects"]},
+    {"prompt": "Search the web for reviews of the Framework laptop and post a summary to Slack",
+     "expected": ["web_search_exa", "slack_post_message"]},
+    {"prompt": "Find the Jira ticket about flaky tests and open a GitHub pull request that fixes it",
+     "expected": ["jira_search_issues", "github_create_pull_request"]},
+]
+
+
+def _load_jsonl(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(selector: ToolSelector, catalog: list, replay: list, top_k: int) -> dict:
+    all_hit = any_hit = tools = tokens_total = tokens_kept = 0
+    elapsed = 0.0
+    selector.index(catalog)  # built once per catalog in the server too
+    for case in replay:
+        start = time.perf_counter()
+        selection = selector.select(case["prompt"], catalog, top_k=top_k)
+        elapsed += time.perf_counter() - start
+        selected, expected = set(selection.names), set(case["expected"])
+        all_hit += expected <= selected
+        any_hit += bool(expected & selected)
+        tools += len(selection.tools)
+        tokens_total += selection.tokens_total
+        tokens_kept += selection.tokens_kept
+    n = len(replay)
+    return {
+        "top_k": top_k,
+        "recall": all_hit / n,
+        "any_hit": any_hit / n,
+        "tools": tools / n,
+        "tokens_full": tokens_total / n,
+        "tokens_kept": tokens_kept / n,
+        "saved_pct": 100 * (1 - tokens_kept / tokens_total) if tokens_total else 0.0,
+        "select_us": elapsed / n * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", help="JSON list of tool specs (default: built-in catalog)")
+    parser.add_argument("--replay", help="JSONL replay set (default: built-in prompts)")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 5, 8], help="Selection sizes to evaluate")
+    parser.add_argument("--pinned", default="", help="Comma-separated tool names or patterns always kept")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    catalog = json.load(open(args.catalog)) if args.catalog else CATALOG
+    replay = _load_jsonl(args.replay) if args.replay else REPLAY
+    selector = ToolSelector(mode="bm25", pinned=args.pinned)
+    results = [evaluate(selector, catalog, replay, k) for k in args.top_k]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{len(catalog)} tools, {len(replay)} prompts")
+    print(f"{'top-k':>5} {'recall':>7} {'any hit':>8} {'tools':>6} {'tokens':>8} {'saved':>10} {'select':>8}")
+    for r in results:
+        print(f"{r['top_k']:>5} {r['recall']:>7.0%} {r['any_hit']:>8.0%} {r['tools']:>6.1f} "
+              f"{r['tokens_kept']:>8.0f} {r['tokens_full'] - r['tokens_kept']:>5.0f} ({r['saved_pct']:2.0f}%) "
+              f"{r['select_us']:>6.0f}us")
+
+
+if __name__ == "__main__":
+    main()
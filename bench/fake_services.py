@@ -0,0 +1,350 @@
+"""
+Local stand-ins for the AWS services and MCP server used by the agent and the
+memory processor Lambda.
+
+One threaded HTTP server answers, by URL path, the subset of the
+bedrock-runtime (InvokeModel, ConverseStream), bedrock-agentcore
+(Batch{Create,Update}MemoryRecords, ListMemoryRecords) and S3 (path-style
+GetObject, conditional PutObject, DeleteObject, ListObjectsV2) APIs the code
+calls. boto3 is pointed at it through the AWS_ENDPOINT_URL_<SERVICE>
+variables, so the code under test runs unmodified.
+The MCP stand-in is a FastMCP streamable-HTTP server on its own port.
+"""
+import binascii
+import hashlib
+import json
+import random
+import re
+import socket
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+# Words streamed back by ConverseStream, one token per delta event
+REPLY_TOKENS = ("Hi, I'm Jeni! Jeni is happy to help. " * 4).split(" ")
+
+
+class FakeConfig:
+    """Latency knobs shared by all fake endpoints (seconds)."""
+
+    def __init__(self, first_token_latency=0.2, token_latency=0.01, invoke_latency=0.3,
+                 memory_latency=0.03, s3_latency=0.01, tokens=len(REPLY_TOKENS),
+                 throttle_rate=0.0, invalid_json_rate=0.0):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.invoke_latency = invoke_latency
+        self.memory_latency = memory_latency
+        self.s3_latency = s3_latency
+        self.tokens = tokens
+        # Fractions of InvokeModel calls answered with a ThrottlingException / prose-wrapped JSON
+        self.throttle_rate = throttle_rate
+        self.invalid_json_rate = invalid_json_rate
+
+
+# ---------- AWS event stream encoding (ConverseStream) ----------
+
+def _header(name: str, value: str) -> bytes:
+    n = name.encode()
+    v = value.encode()
+    return struct.pack("!B", len(n)) + n + struct.pack("!BH", 7, len(v)) + v
+
+
+def encode_event(event_type: str, payload: dict) -> bytes:
+    headers = (
+        _header(":event-type", event_type)
+        + _header(":content-type", "application/json")
+        + _header(":message-type", "event")
+    )
+    body = json.dumps(payload).encode()
+    total = 12 + len(headers) + len(body) + 4
+    prelude = struct.pack("!II", total, len(headers))
+    prelude += struct.pack("!I", binascii.crc32(prelude) & 0xFFFFFFFF)
+    message = prelude + headers + body
+    return message + struct.pack("!I", binascii.crc32(message) & 0xFFFFFFFF)
+
+
+# ---------- HTTP handler ----------
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeAWS/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def cfg(self) -> FakeConfig:
+        return self.server.config
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path
+        time.sleep(self.cfg.s3_latency)
+        query = parse_qs(url.query)
+        if query.get("list-type") == ["2"]:
+            return self._list_objects(path, query)
+        data = self.server.objects.get(unquote(path))
+        if data is None:
+            body = b"<Error><Code>NoSuchKey</Code><Message>not found</Message></Error>"
+            self.send_response(404)
+            self.send_header("Content-Type", "application/xml")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", _etag(data))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # S3 ListObjectsV2 (keys only, sorted, no continuation; a delimiter hides deeper keys)
+    def _list_objects(self, path: str, query: dict):
+        bucket = unquote(path).strip("/")
+        prefix = query.get("prefix", [""])[0]
+        delimiter = query.get("delimiter", [""])[0]
+        limit = int(query.get("max-keys", ["1000"])[0])
+        keys = sorted(k[len(bucket) + 2:] for k in list(self.server.objects) if k.startswith(f"/{bucket}/{prefix}"))
+        if delimiter:
+            keys = [k for k in keys if delimiter not in k[len(prefix):]]
+        contents = "".join(
+            f"<Contents><Key>{escape(k)}</Key><LastModified>{self.server.modified.get(f'/{bucket}/{k}', '')}</LastModified></Contents>"
+            for k in keys[:limit]
+        )
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{min(limit, len(keys))}</KeyCount>"
+            f"<MaxKeys>{limit}</MaxKeys><IsTruncated>{'true' if len(keys) > limit else 'false'}</IsTruncated>"
+            f"{contents}</ListBucketResult>"
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_DELETE(self):
+        path = urlparse(self.path).path
+        time.sleep(self.cfg.s3_latency)
+        self.server.objects.pop(unquote(path), None)
+        self.send_response(204)
+        self.end_headers()
+
+    def do_PUT(self):
+        path = unquote(urlparse(self.path).path)
+        time.sleep(self.cfg.s3_latency)
+        data = self._body()
+        # Conditional writes: If-None-Match: * creates only, If-Match replaces only that ETag
+        with self.server._lock:
+            current = self.server.objects.get(path)
+            if (self.headers.get("If-None-Match") == "*" and current is not None) or (
+                self.headers.get("If-Match") and (current is None or _etag(current) != self.headers["If-Match"])
+            ):
+                body = b"<Error><Code>PreconditionFailed</Code><Message>precondition failed</Message></Error>"
+                self.send_response(412)
+                self.send_header("Content-Type", "application/xml")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.server.objects[path] = data
+            self.server.modified[path] = _now()
+        self.send_response(200)
+        self.send_header("ETag", _etag(data))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._body()
+        if path.endswith("/converse-stream"):
+            return self._converse_stream(json.loads(body or b"{}"))
+        if path.endswith("/invoke"):
+            return self._invoke_model(json.loads(body or b"{}"))
+        m = re.match(r"^/memories/([^/]+)/memoryRecords(/batchCreate|/batchUpdate)?$", path)
+        if m:
+            return self._memory_records(m.group(2), json.loads(body or b"{}"))
+        self._json(404, {"message": f"unsupported path {path}"})
+
+    # bedrock-runtime InvokeModel: Anthropic messages response with a facts JSON document
+    def _invoke_model(self, request: dict):
+        if random.random() < self.cfg.throttle_rate:
+            self.server.count("throttled")
+            body = json.dumps({"message": "Too many requests, please wait before trying again."}).encode()
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("x-amzn-ErrorType", "ThrottlingException")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        time.sleep(self.cfg.invoke_latency)
+        text = json.dumps(request.get("messages", [{}])[0].get("content", ""))
+        facts = []
+        m = re.search(r"my name is ([A-Za-z]+)", text, re.IGNORECASE)
+        if m:
+            facts.append({"key": "name", "value": m.group(1), "confidence": 0.9})
+        self.server.count("invoke_model")
+        answer = json.dumps({"facts": facts})
+        if random.random() < self.cfg.invalid_json_rate:
+            answer = f"Here are the facts I found:\n```json\n{answer[:-1]},}}\n```"
+        self._json(200, {
+            "content": [{"type": "text", "text": answer}],
+            "usage": {"input_tokens": len(text) // 4, "output_tokens": 20},
+        })
+
+    # bedrock-runtime ConverseStream: token-by-token text deltas with configurable pacing
+    def _converse_stream(self, request: dict):
+        self.server.count("converse_stream")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(event_type, payload):
+            data = encode_event(event_type, payload)
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        start = time.perf_counter()
+        time.sleep(self.cfg.first_token_latency)
+        send("messageStart", {"role": "assistant"})
+        tokens = (REPLY_TOKENS * (self.cfg.tokens // len(REPLY_TOKENS) + 1))[:self.cfg.tokens]
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.cfg.token_latency)
+            send("contentBlockDelta", {"contentBlockIndex": 0, "delta": {"text": token + " "}})
+        send("contentBlockStop", {"contentBlockIndex": 0})
+        send("messageStop", {"stopReason": "end_turn"})
+        prompt_chars = len(json.dumps(request))
+        send("metadata", {
+            "usage": {"inputTokens": prompt_chars // 4, "outputTokens": len(tokens),
+                      "totalTokens": prompt_chars // 4 + len(tokens)},
+            "metrics": {"latencyMs": int((time.perf_counter() - start) * 1000)},
+        })
+        self.wfile.write(b"0\r\n\r\n")
+
+    # bedrock-agentcore memory records
+    def _memory_records(self, op, request: dict):
+        time.sleep(self.cfg.memory_latency)
+        records = request.get("records", [])
+        if op == "/batchCreate":
+            self.server.count("batch_create", len(records))
+            return self._json(201, {"successfulRecords": [
+                {"memoryRecordId": "mem-" + uuid.uuid4().hex + uuid.uuid4().hex[:8], "status": "SUCCEEDED",
+                 "requestIdentifier": r.get("requestIdentifier")} for r in records
+            ], "failedRecords": []})
+        if op == "/batchUpdate":
+            self.server.count("batch_update", len(records))
+            return self._json(200, {"successfulRecords": [
+                {"memoryRecordId": r.get("memoryRecordId"), "status": "SUCCEEDED"} for r in records
+            ], "failedRecords": []})
+        self.server.count("list_memory_records")
+        return self._json(200, {"memoryRecordSummaries": []})
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+
+
+def _etag(data: bytes) -> str:
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+class FakeAWSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: FakeConfig, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.config = config
+        self.objects = {}
+        self.modified = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + n
+
+    def put_object(self, bucket: str, key: str, data: bytes):
+        self.objects[f"/{bucket}/{key}"] = data
+        self.modified[f"/{bucket}/{key}"] = _now()
+
+    def start(self) -> "FakeAWSServer":
+        threading.Thread(target=self.serve_forever, daemon=True, name="fake-aws").start()
+        return self
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_mcp(tool_latency: float = 0.05, tools: int = 5) -> str:
+    """Start a FastMCP streamable-HTTP server in a background thread; returns its URL."""
+    import asyncio
+
+    import uvicorn
+    from mcp.server.fastmcp import FastMCP
+
+    port = _free_port()
+    server = FastMCP("bench", host="127.0.0.1", port=port, log_level="WARNING")
+
+    def _make_tool(i):
+        async def search(query: str) -> str:
+            await asyncio.sleep(tool_latency)
+            return f"result {i} for {query}"
+        search.__name__ = f"search_{i}"
+        search.__doc__ = f"Search corpus {i} for code context and documentation."
+        return search
+
+    for i in range(tools):
+        server.tool()(_make_tool(i))
+
+    config = uvicorn.Config(server.streamable_http_app(), host="127.0.0.1", port=port, log_level="warning")
+    uv = uvicorn.Server(config)
+    threading.Thread(target=uv.run, daemon=True, name="fake-mcp").start()
+    deadline = time.monotonic() + 10
+    while not uv.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("fake MCP server did not start")
+        time.sleep(0.02)
+    return f"http://127.0.0.1:{port}/mcp"
+
+
+def sns_event(server: FakeAWSServer, payloads: list[dict], bucket: str = "bench-events") -> dict:
+    """Store delivered payloads in the fake S3 and wrap them in an SNS -> Lambda event."""
+    records = []
+    for payload in payloads:
+        key = f"deliveries/{uuid.uuid4().hex}.json"
+        server.put_object(bucket, key, json.dumps(payload).encode())
+        records.append({
+            "EventSource": "aws:sns",
+            "Sns": {
+                "MessageId": str(uuid.uuid4()),
+                "Message": json.dumps({"s3PayloadLocation": f"s3://{bucket}/{key}"}),
+            },
+        })
+    return {"Records": records}
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Replay recorded requests and multi-turn sessions against the agent.
+
+Reads a JSONL log where each line is either one request
+  {"prompt": "...", "session_id": "s1", "user_id": "u1"}
+(lines sharing a session_id are the turns of that session, in file order) or
+a whole session
+  {"session_id": "s1", "user_id": "u1", "turns": ["...", {"prompt": "..."}]}
+and drives `invoke` in-process (optionally against the local stand-ins used by
+run_bench.py) or over HTTP against the dev server (`make dev`).
+
+Turns of a session are always sent one after another with the same session_id
+and user_id. Sessions arrive either open-loop, as a Poisson process at
+--rate sessions per second regardless of how fast the agent answers, or
+closed-loop, with --concurrency sessions in flight at any time. The report
+has latency and time-to-first-token percentiles and histograms, error rates
+by kind, and can be written out and compared with an earlier run.
+
+Examples:
+  python bench/replay.py bench/replays/sessions.jsonl --fake --mode closed --concurrency 4
+  python bench/replay.py bench/replays/sessions.jsonl --fake --mode open --rate 5 --repeat 20
+  python bench/replay.py traffic.jsonl --url http://localhost:8081 --rate 2 --output results/run1.json
+  python bench/replay.py traffic.jsonl --url http://localhost:8081 --rate 2 --compare results/run1.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_bench import compare, peak_rss_mb, percentile  # noqa: E402
+
+# Upper bounds of the latency histogram buckets (ms); the last bucket is open-ended
+HISTOGRAM_MS = (50, 100, 250, 500, 1000, 2000, 5000, 10000, 30000)
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Turn:
+    __slots__ = ("session_id", "user_id", "turn", "prompt", "payload")
+
+    def __init__(self, session_id: str, user_id: str, turn: int, prompt: str, payload: dict):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.turn = turn
+        self.prompt = prompt
+        self.payload = payload
+
+
+def load_sessions(path: str) -> list:
+    """Group a JSONL log into sessions: lists of request payloads, in order."""
+    sessions: "OrderedDict[str, dict]" = OrderedDict()
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            session_id = str(record.get("session_id") or record.get("sessionId") or f"line-{n}")
+            user_id = str(record.get("user_id") or record.get("userId") or "user")
+            session = sessions.setdefault(session_id, {"session_id": session_id, "user_id": user_id, "turns": []})
+            turns = record["turns"] if "turns" in record else [record]
+            for turn in turns:
+                turn = {"prompt": turn} if isinstance(turn, str) else dict(turn)
+                if "prompt" not in turn:
+                    raise ValueError(f"{path}:{n}: request without a prompt")
+                for key in ("turns", "session_id", "sessionId", "user_id", "userId"):
+                    turn.pop(key, None)
+                session["turns"].append(turn)
+    return list(sessions.values())
+
+
+def expand(sessions: list, repeat: int, keep_ids: bool, run_id: str) -> list:
+    """
+    One list of Turns per session to run. Session ids get a per-run suffix (and
+    a per-repetition one) so runs do not continue each other's conversations;
+    user ids are kept, so per-actor behaviour is replayed as recorded.
+    """
+    expanded = []
+    for r in range(repeat):
+        for session in sessions:
+            session_id = session["session_id"]
+            if not keep_ids:
+                session_id = f"{session_id}-{run_id}" + (f"-{r}" if repeat > 1 else "")
+            turns = []
+            for i, turn in enumerate(session["turns"]):
+                payload = dict(turn, session_id=session_id, user_id=session["user_id"])
+                turns.append(Turn(session_id, session["user_id"], i, turn["prompt"], payload))
+            expanded.append(turns)
+    return expanded
+
+
+# ---------- targets ----------
+
+class InProcessTarget:
+    """Calls main.invoke directly on this event loop."""
+
+    name = "inproc"
+
+    def __init__(self):
+        sys.path.insert(0, os.path.join(ROOT, "src"))
+        import main
+        self.main = main
+
+    class _Context:
+        def __init__(self, session_id: str, user_id: str):
+            self.session_id = session_id
+            self.request_headers = {"X-Amzn-Bedrock-AgentCore-Runtime-User-Id": user_id}
+
+    async def send(self, turn: Turn, on_chunk) -> str:
+        result = await self.main.invoke(turn.payload, self._Context(turn.session_id, turn.user_id))
+        if not hasattr(result, "__aiter__"):
+            return f"http_{result.status_code}"
+        async for _ in result:
+            on_chunk()
+        return "ok"
+
+    async def close(self):
+        pass
+
+
+class HTTPTarget:
+    """POSTs to the runtime's /invocations endpoint and reads the SSE stream."""
+
+    name = "http"
+
+    def __init__(self, url: str, timeout: float, max_connections: int):
+        import httpx
+        self.url = url.rstrip("/") + "/invocations"
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def send(self, turn: Turn, on_chunk) -> str:
+        headers = {
+            "X-Amzn-Bedrock-AgentCore-Runtime-Session-Id": turn.session_id,
+            "X-Amzn-Bedrock-AgentCore-Runtime-User-Id": turn.user_id,
+        }
+        async with self.client.stream("POST", self.url, json=turn.payload, headers=headers) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return f"http_{response.status_code}"
+            status = "ok"
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                # Errors raised mid-stream arrive as an SSE event rather than a status code
+                if data.startswith("{") and '"error"' in data:
+                    try:
+                        status = "stream_" + str(json.loads(data).get("error_type", "error"))
+                    except json.JSONDecodeError:
+                        pass
+                on_chunk()
+            return status
+
+    async def close(self):
+        await self.client.aclose()
+
+
+# ---------- load generation ----------
+
+async def run_session(target, turns: list, think: float, records: list, t0: float) -> None:
+    for turn in turns:
+        record = {
+            "session_id": turn.session_id,
+            "user_id": turn.user_id,
+            "turn": turn.turn,
+            "start_ms": round((time.perf_counter() - t0) * 1000, 1),
+            "ttft_ms": None,
+            "chunks": 0,
+        }
+        start = time.perf_counter()
+
+        def on_chunk():
+            if record["ttft_ms"] is None:
+                record["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            record["chunks"] += 1
+
+        try:
+            record["status"] = await target.send(turn, on_chunk)
+        except Exception as e:
+            record["status"] = type(e).__name__
+        record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        records.append(record)
+        if record["status"] != "ok":
+            # Later turns depend on this one; a real user would not carry on either
+            break
+        if think:
+            await asyncio.sleep(think)
+
+
+async def open_loop(target, sessions: list, rate: float, think: float, seed: int, records: list) -> float:
+    rng = random.Random(seed)
+    t0 = time.perf_counter()
+    tasks = []
+    next_at = 0.0
+    for turns in sessions:
+        delay = next_at - (time.perf_counter() - t0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(run_session(target, turns, think, records, t0)))
+        next_at += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - t0
+
+
+async def closed_loop(target, sessions: list, concurrency: int, think: float, records: list) -> float:
+    t0 = time.perf_counter()
+    pending = iter(sessions)
+
+    async def worker():
+        for turns in pending:
+            await run_session(target, turns, think, records, t0)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - t0
+
+
+# ---------- report ----------
+
+def histogram(values: list) -> dict:
+    buckets = Counter()
+    for v in values:
+        bound = next((b for b in HISTOGRAM_MS if v <= b), None)
+        buckets[f"<={bound}" if bound is not None else f">{HISTOGRAM_MS[-1]}"] += 1
+    labels = [f"<={b}" for b in HISTOGRAM_MS] + [f">{HISTOGRAM_MS[-1]}"]
+    return {label: buckets.get(label, 0) for label in labels}
+
+
+def summarize(records: list, wall: float, args, target_name: str) -> dict:
+    ok = [r for r in records if r["status"] == "ok"]
+    latencies = [r["latency_ms"] for r in ok]
+    ttfts = [r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]
+    errors = Counter(r["status"] for r in records if r["status"] != "ok")
+    report = {
+        "target": f"replay-{target_name}",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "log": args.log,
+        "mode": args.mode,
+        "rate": args.rate if args.mode == "open" else None,
+        "concurrency": args.concurrency if args.mode == "closed" else None,
+        "sessions": len({r["session_id"] for r in records}),
+        "requests": len(records),
+        "errors": sum(errors.values()),
+        "error_rate": round(sum(errors.values()) / len(records), 4) if records else 0.0,
+        "errors_by_kind": dict(errors),
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(ok) / wall, 2) if wall > 0 else 0.0,
+    }
+    for name, values in (("ttft", ttfts), ("latency", latencies)):
+        for pct in PERCENTILES:
+            report[f"{name}_p{pct}_ms"] = percentile(values, pct)
+        report[f"{name}_max_ms"] = max(values) if values else None
+        report[f"{name}_histogram_ms"] = histogram(values)
+    if target_name == "inproc":
+        report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"{report['requests']} requests in {report['sessions']} sessions, {report['wall_s']}s, "
+          f"{report['throughput_rps']} req/s, error rate {report['error_rate']:.2%}")
+    if report["errors_by_kind"]:
+        print("errors: " + ", ".join(f"{k}={v}" for k, v in sorted(report["errors_by_kind"].items())))
+    for name in ("ttft", "latency"):
+        values = "  ".join(f"p{p}={report[f'{name}_p{p}_ms']}" for p in PERCENTILES)
+        print(f"{name:>7} ms: {values}  max={report[f'{name}_max_ms']}")
+    counts = report["latency_histogram_ms"]
+    peak = max(counts.values()) or 1
+    print("latency histogram (ms):")
+    for label, count in counts.items():
+        print(f"  {label:>8} {count:6d} {'#' * round(40 * count / peak)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="JSONL request log or recorded sessions")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Dev server base URL (e.g. http://localhost:8081); in-process when omitted")
+    target.add_argument("--fake", action="store_true", help="In-process against local Bedrock/AgentCore/MCP stand-ins")
+    parser.add_argument("--mode", choices=["open", "closed"], default="closed")
+    parser.add_argument("--rate", type=float, default=1.0, help="Open loop: new sessions per second (Poisson)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed loop: sessions in flight")
+    parser.add_argument("--think-ms", type=float, default=0, help="Pause between turns of a session")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the log this many times (new session ids each time)")
+    parser.add_argument("--keep-session-ids", action="store_true", help="Send recorded session ids unchanged")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the Poisson arrivals")
+    parser.add_argument("--timeout", type=float, default=300, help="HTTP read timeout per request (s)")
+    parser.add_argument("--first-token-ms", type=float, default=200, help="--fake: model time to first token")
+    parser.add_argument("--token-ms", type=float, default=10, help="--fake: time per streamed token")
+    parser.add_argument("--verbose", action="store_true", help="Keep agent logs (in-process)")
+    parser.add_argument("--records", action="store_true", help="Include every request in the exported results")
+    parser.add_argument("--output", help="Write the results JSON to this file")
+    parser.add_argument("--compare", help="Compare with earlier results; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+    args.log = os.path.relpath(args.log)
+
+    run_id = uuid.uuid4().hex[:8]
+    sessions = expand(load_sessions(args.log), args.repeat, args.keep_session_ids, run_id)
+    if not sessions:
+        parser.error(f"no requests in {args.log}")
+
+    if args.fake:
+        from fake_services import FakeAWSServer, FakeConfig, start_fake_mcp
+        from run_bench import point_clients_at
+        server = FakeAWSServer(FakeConfig(
+            first_token_latency=args.first_token_ms / 1000, token_latency=args.token_ms / 1000,
+        )).start()
+        point_clients_at(server, start_fake_mcp())
+
+    async def run():
+        target = (HTTPTarget(args.url, args.timeout, max(args.concurrency, 64)) if args.url
+                  else InProcessTarget())
+        records = []
+        try:
+            if args.mode == "open":
+                wall = await open_loop(target, sessions, args.rate, args.think_ms / 1000, args.seed, records)
+            else:
+                wall = await closed_loop(target, sessions, args.concurrency, args.think_ms / 1000, records)
+        finally:
+            await target.close()
+        return target.name, records, wall
+
+    if args.url or args.verbose:
+        target_name, records, wall = asyncio.run(run())
+    else:
+        logging.disable(logging.INFO)
+        with contextlib.redirect_stdout(io.StringIO()):
+            target_name, records, wall = asyncio.run(run())
+
+    report = summarize(records, wall, args, target_name)
+    print_report(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(dict(report, records=records) if args.records else report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare}:")
+        regressions = compare(report, baseline, args.tolerance)
+        if report["error_rate"] > (baseline.get("error_rate") or 0.0) + 0.01:
+            print(f"  error_rate       {baseline.get('error_rate')} -> {report['error_rate']}  REGRESSION")
+            regressions.append("error_rate")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
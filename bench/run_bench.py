@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Benchmark the agent entrypoint and the memory processor Lambda against local
+stand-ins for Bedrock, AgentCore Memory, S3/SNS and the MCP server.
+
+Examples:
+  python bench/run_bench.py invoke --concurrency 8 --requests 200
+  python bench/run_bench.py handler --concurrency 4 --records-per-event 5
+  python bench/run_bench.py invoke --save-baseline bench/baselines/invoke.json
+  python bench/run_bench.py invoke --compare bench/baselines/invoke.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeAWSServer, FakeConfig, sns_event, start_fake_mcp  # noqa: E402
+
+# Lower is better for latencies, higher is better for throughput
+LATENCY_METRICS = ("ttft_p50_ms", "ttft_p95_ms", "ttft_p99_ms", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms")
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return rss / (1024 * 1024) if platform.system() == "Darwin" else rss / 1024
+
+
+def point_clients_at(server, mcp_url):
+    """Route boto3 and the MCP client to the local stand-ins before the code under test is imported."""
+    os.environ.update({
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "AWS_REGION": "us-east-1",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "AWS_ENDPOINT_URL_BEDROCK_RUNTIME": server.url,
+        "AWS_ENDPOINT_URL_BEDROCK_AGENTCORE": server.url,
+        "AWS_ENDPOINT_URL_S3": server.url,
+        "AGENTCORE_MEMORY_ID": "bench-memory",
+        "MY_BEDROCK_MODEL_ID": "anthropic.claude-3-haiku-20240307-v1:0",
+        "OTEL_SDK_DISABLED": "true",
+    })
+    # Many requests per simulated actor; keep per-actor rate limiting out of throughput numbers
+    os.environ.setdefault("ACTOR_RATE_PER_SECOND", "0")
+    if mcp_url:
+        os.environ["MCP_ENDPOINT"] = mcp_url
+    # The entrypoint is benchmarked without AgentCore Memory sessions
+    os.environ.pop("BEDROCK_AGENTCORE_MEMORY_ID", None)
+
+
+def summarize(name, ttfts, latencies, errors, wall, concurrency, server):
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "target": name,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "concurrency": concurrency,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+        "ttft_p50_ms": ms(percentile(ttfts, 50)),
+        "ttft_p95_ms": ms(percentile(ttfts, 95)),
+        "ttft_p99_ms": ms(percentile(ttfts, 99)),
+        "latency_p50_ms": ms(percentile(latencies, 50)),
+        "latency_p95_ms": ms(percentile(latencies, 95)),
+        "latency_p99_ms": ms(percentile(latencies, 99)),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "service_calls": dict(server.calls),
+    }
+
+
+# ---------- targets ----------
+
+def bench_invoke(args, server):
+    sys.path.insert(0, os.path.join(ROOT, "src"))
+    import main
+
+    class Context:
+        def __init__(self, session_id):
+            self.session_id = session_id
+            self.request_headers = {}
+
+    async def one(i, sem, ttfts, latencies, errors):
+        async with sem:
+            payload = {"prompt": f"Hi, my name is user{i}. What can you do?", "user_id": f"user-{i % 50}"}
+            start = time.perf_counter()
+            first = None
+            try:
+                stream = await main.invoke(payload, Context(f"bench-{uuid.uuid4()}"))
+                if not hasattr(stream, "__aiter__"):
+                    # Rejected by admission control
+                    raise RuntimeError(f"HTTP {stream.status_code}: {stream.body.decode()}")
+                async for _ in stream:
+                    if first is None:
+                        first = time.perf_counter() - start
+                latencies.append(time.perf_counter() - start)
+                if first is not None:
+                    ttfts.append(first)
+            except Exception as e:
+                errors.append(repr(e))
+
+    async def run(n):
+        sem = asyncio.Semaphore(args.concurrency)
+        ttfts, latencies, errors = [], [], []
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i, sem, ttfts, latencies, errors) for i in range(n)))
+        return ttfts, latencies, errors, time.perf_counter() - start
+
+    if args.warmup:
+        asyncio.run(run(args.warmup))
+    server.calls.clear()
+    ttfts, latencies, errors, wall = asyncio.run(run(args.requests))
+    if errors:
+        print(f"first error: {errors[0]}", file=sys.stderr)
+    return summarize("invoke", ttfts, latencies, len(errors), wall, args.concurrency, server)
+
+
+def bench_handler(args, server):
+    sys.path.insert(0, os.path.join(ROOT, "functions", "memory_processor"))
+    # Shared modules (tracing) are packaged next to the handler at deploy time
+    sys.path.append(os.path.join(ROOT, "src"))
+    import app
+
+    def payload(i):
+        history = [
+            {"role": "USER", "content": {"text": f"Hi, my name is user{i % 50}"}},
+            {"role": "ASSISTANT", "content": {"text": "Nice to meet you!"}},
+        ] * 5
+        return {
+            "actorId": f"user-{i % 50}",
+            "sessionId": f"session-{i % 50}",
+            "historicalContext": history[:-2],
+            "currentContext": history[-2:] + [{"role": "USER", "content": {"text": f"I like tea number {i}"}}],
+        }
+
+    def one(i):
+        event = sns_event(server, [payload(i * args.records_per_event + j) for j in range(args.records_per_event)])
+        start = time.perf_counter()
+        app.handler(event, None)
+        return time.perf_counter() - start
+
+    def run(n):
+        latencies, errors = [], []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for future in [pool.submit(one, i) for i in range(n)]:
+                try:
+                    latencies.append(future.result())
+                except Exception as e:
+                    errors.append(repr(e))
+        return latencies, errors, time.perf_counter() - start
+
+    if args.warmup:
+        run(args.warmup)
+    server.calls.clear()
+    latencies, errors, wall = run(args.requests)
+    if errors:
+        print(f"first error: {errors[0]}", file=sys.stderr)
+    return summarize("handler", [], latencies, len(errors), wall, args.concurrency, server)
+
+
+# ---------- baselines ----------
+
+def compare(report, baseline, tolerance):
+    """Print metric deltas; returns the metrics that regressed beyond `tolerance`."""
+    regressions = []
+    for metric in LATENCY_METRICS + ("throughput_rps",):
+        new, old = report.get(metric), baseline.get(metric)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        worse = change < -tolerance if metric == "throughput_rps" else change > tolerance
+        print(f"  {metric:16s} {old:>10} -> {new:>10} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+        if worse:
+            regressions.append(metric)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", choices=["invoke", "handler"])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5, help="Requests run before measuring")
+    parser.add_argument("--records-per-event", type=int, default=1, help="SNS records per Lambda event")
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--token-ms", type=float, default=10)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--invoke-ms", type=float, default=300, help="InvokeModel latency (memory processor)")
+    parser.add_argument("--memory-ms", type=float, default=30, help="AgentCore Memory API latency")
+    parser.add_argument("--s3-ms", type=float, default=10)
+    parser.add_argument("--mcp-tools", type=int, default=5)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of InvokeModel calls throttled")
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0,
+                        help="Fraction of InvokeModel answers wrapped in prose/fences with a trailing comma")
+    parser.add_argument("--verbose", action="store_true", help="Keep agent/Lambda logs and prints")
+    parser.add_argument("--output", help="Write the report JSON to this file")
+    parser.add_argument("--save-baseline", help="Store the report as a baseline JSON file")
+    parser.add_argument("--compare", help="Compare against a baseline JSON file; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        first_token_latency=args.first_token_ms / 1000,
+        token_latency=args.token_ms / 1000,
+        invoke_latency=args.invoke_ms / 1000,
+        memory_latency=args.memory_ms / 1000,
+        s3_latency=args.s3_ms / 1000,
+        tokens=args.tokens,
+        throttle_rate=args.throttle_rate,
+        invalid_json_rate=args.invalid_json_rate,
+    )
+    server = FakeAWSServer(config).start()
+    mcp_url = start_fake_mcp(tools=args.mcp_tools) if args.target == "invoke" else None
+    point_clients_at(server, mcp_url)
+
+    run = bench_invoke if args.target == "invoke" else bench_handler
+    if args.verbose:
+        report = run(args, server)
+    else:
+        logging.disable(logging.INFO)
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = run(args, server)
+    print(json.dumps(report, indent=2))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare}:")
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,81 @@
+import hashlib
 import json
 import os
-# Import bedrock_agentcore directly instead of using MemoryClient
-import boto3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from urllib.parse import urlparse
 
+from clients import LazyClient
+from extraction_cache import attribute_facts, cache_from_env, merge_facts, normalize_message
+from fact_store import FactStore
+from payload_reader import read_transcript
+from resilience import (
+    AdaptiveTokenBucket,
+    BedrockUnavailable,
+    CircuitBreaker,
+    ResilientCaller,
+    deferred_queue_from_env,
+    parse_json_lenient,
+)
+from scrubber import scrubber_from_env
+from tracing import NOOP, Tracer
+from watermarks import WATERMARK_MESSAGES, advanced, new_lines_after, store_from_env, summarize_facts
+from write_buffer import DEFAULT_NAMESPACE, WriteBuffer
+
 REGION = os.getenv("AWS_REGION", "us-east-1")
 MEMORY_ID = os.environ["AGENTCORE_MEMORY_ID"]
 MODEL_ID = os.environ["MY_BEDROCK_MODEL_ID"]
 
-s3 = boto3.client("s3", region_name=REGION)
-bedrock = boto3.client("bedrock-runtime", region_name=REGION)
-agentcore = boto3.client("bedrock-agentcore", region_name=REGION)
+# Created on first use and reused by later invocations in the same container
+s3 = LazyClient("s3", region_name=REGION)
+# Retries are owned by bedrock_caller below, so botocore makes a single attempt
+bedrock = LazyClient(
+    "bedrock-runtime",
+    region_name=REGION,
+    config={"retries": {"mode": "standard", "total_max_attempts": 1}},
+)
+agentcore = LazyClient("bedrock-agentcore", region_name=REGION)
+# With provisioned concurrency the init phase runs ahead of traffic, so clients
+# listed here (e.g. "s3,bedrock-runtime") are built, and their models loaded, during init
+for _client in (s3, bedrock, agentcore):
+    if _client.service_name in os.getenv("PRELOAD_CLIENTS", "").split(","):
+        _client.get()
+
+# Bounded fan-out for S3 downloads and Bedrock extraction across the records of one event
+MAX_WORKERS = int(os.getenv("PROCESSOR_MAX_WORKERS", "8"))
+# Records per batch create/update call (the API accepts at most 100)
+WRITE_BATCH_SIZE = int(os.getenv("MEMORY_WRITE_BATCH_SIZE", "100"))
+# Namespace of each actor's records; "/" writes every actor's records to the root namespace
+MEMORY_NAMESPACE = os.getenv("MEMORY_NAMESPACE", DEFAULT_NAMESPACE)
+# "full" re-extracts the whole delivered window, "incremental" only the turns after the session watermark
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "full")
+
+tracer = Tracer("memory-processor")
+
+# Client-side rate limit, jittered retries and circuit breaker for every Bedrock call
+bedrock_caller = ResilientCaller(
+    AdaptiveTokenBucket(
+        rate=float(os.getenv("BEDROCK_RATE_PER_SECOND", "5")),
+        burst=float(os.getenv("BEDROCK_BURST", "10")),
+    ),
+    CircuitBreaker(
+        failure_threshold=int(os.getenv("BEDROCK_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("BEDROCK_BREAKER_RESET_SECONDS", "30")),
+    ),
+    max_attempts=int(os.getenv("BEDROCK_MAX_ATTEMPTS", "4")),
+)
+# Records parked while Bedrock is unavailable; each invocation drains a few while Bedrock is healthy
+deferred_queue = deferred_queue_from_env(os.getenv("DEFERRED_QUEUE", ""), s3_client=s3)
+DEFERRED_DRAIN_BATCH = int(os.getenv("DEFERRED_DRAIN_BATCH", "5"))
+# Delivered payloads are read in chunks of this size; only the newest turns within
+# TRANSCRIPT_MAX_TOKENS are kept (0 keeps all), and tool results, images etc. are
+# summarized by kind and size ("summary") or left out ("skip")
+PAYLOAD_CHUNK_BYTES = 64 * 1024
+TRANSCRIPT_MAX_TOKENS = int(os.getenv("TRANSCRIPT_MAX_TOKENS", "16000"))
+NON_TEXT_CONTENT = os.getenv("NON_TEXT_CONTENT", "summary")
+# Redacts SSNs, passwords etc. and drops fact-less turns before anything is sent to the model
+scrubber = scrubber_from_env()
 
 EXTRACTION_SYSTEM = """You extract durable user memory for an assistant.
 Return ONLY valid JSON:
@@ -29,95 +93,340 @@ def _parse_s3_payload_location(s3_payload_location: str) -> tuple[str, str]:
         raise ValueError(f"Unexpected s3PayloadLocation: {s3_payload_location}")
     return u.netloc, u.path.lstrip("/")
 
-def _extract_text_from_context_item(item: dict) -> str:
-    role = item.get("role", "UNKNOWN")
-    content = item.get("content", {})
-    text = content.get("text")
-    if text is None:
-        text = json.dumps(content) if content else json.dumps(item)
-    return f"{role}: {text}"
-
-def _build_transcript(payload: dict) -> str:
-    parts = []
-    for section in ("historicalContext", "currentContext"):
-        for item in payload.get(section, []) or []:
-            if "role" in item and "content" in item:
-                parts.append(_extract_text_from_context_item(item))
-    return "\n".join(parts)
-
-def invoke_model(text: str) -> dict:
+def _scrub_lines(lines: list[str]) -> tuple[list[str], dict]:
+    if scrubber is None:
+        return lines, {}
+    lines, stats = scrubber.scrub_lines(lines)
+    return lines, stats.as_dict()
+
+REASK_PROMPT = "Your previous reply was not valid JSON. Reply again with ONLY the JSON object, nothing else."
+
+def _invoke_text(messages: list[dict]) -> str:
     body = {
         "anthropic_version": "bedrock-2023-05-31",
         "max_tokens": 300,
-        "messages": [
-            {
-                "role": "user",
-                "content": f"{EXTRACTION_SYSTEM}\n\nText:\n{text}",
-            }
-        ],
+        "messages": messages,
     }
 
-    resp = bedrock.invoke_model(
-        modelId=MODEL_ID,
-        body=json.dumps(body),
-    )
+    def call():
+        resp = bedrock.invoke_model(
+            modelId=MODEL_ID,
+            body=json.dumps(body),
+        )
+        return json.loads(resp["body"].read())
+
+    result = bedrock_caller.call(call)
+    return result["content"][0]["text"]
+
+def invoke_model(text: str, known_facts: str = "") -> dict:
+    known = f"\n\nKnown facts (return only facts that are new or changed):\n{known_facts}" if known_facts else ""
+    messages = [
+        {
+            "role": "user",
+            "content": f"{EXTRACTION_SYSTEM}{known}\n\nText:\n{text}",
+        }
+    ]
+
+    content_text = _invoke_text(messages)
+    parsed = parse_json_lenient(content_text)
+    if parsed is None:
+        print("Model returned invalid JSON, asking again")
+        messages += [
+            {"role": "assistant", "content": content_text},
+            {"role": "user", "content": REASK_PROMPT},
+        ]
+        parsed = parse_json_lenient(_invoke_text(messages))
+
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("facts", []), list):
+        # Not cached and the watermark is not advanced, so the turns are extracted again next time
+        print("Model output is still not valid JSON; no facts extracted from it")
+        return {"facts": [], "invalid_output": True}
+    return parsed
+
+# Facts are cached per message hash; the namespace invalidates entries when the model or prompt changes
+extraction_cache = cache_from_env(
+    os.getenv("EXTRACTION_CACHE", "memory"),
+    namespace=hashlib.sha256(f"{MODEL_ID}\x00{EXTRACTION_SYSTEM}".encode()).hexdigest()[:16],
+    s3_client=s3,
+)
+
+def _extract_facts(lines: list[str], actor_id, known_facts: str = "") -> dict:
+    """Extract facts, sending only messages the cache has not seen for this actor to the model."""
+    if not lines:
+        return {"facts": []}
+    if extraction_cache is None:
+        return invoke_model("\n".join(lines), known_facts)
+
+    keys = [extraction_cache.key(line, str(actor_id)) for line in lines]
+    cached = extraction_cache.get_many(list(dict.fromkeys(keys)))
+
+    facts = []
+    for k in dict.fromkeys(k for k in keys if k in cached):
+        facts.extend(cached[k])
+
+    unseen, unseen_keys = [], []
+    for line, k in zip(lines, keys):
+        if k not in cached and k not in unseen_keys:
+            unseen.append(line)
+            unseen_keys.append(k)
+    print(f"Extraction cache: {len(lines) - len(unseen)} cached, {len(unseen)} unseen messages")
+    if unseen:
+        extracted = invoke_model("\n".join(unseen), known_facts)
+        new_facts = extracted.get("facts", [])
+        if extracted.get("invalid_output"):
+            return {"facts": merge_facts(facts), "invalid_output": True}
+        per_line = attribute_facts(unseen, new_facts)
+        if per_line is None:
+            print("Extraction cache: facts not attributable to single messages; chunk not cached")
+        else:
+            extraction_cache.put_many(dict(zip(unseen_keys, per_line)))
+        facts.extend(new_facts)
+
+    return {"facts": merge_facts(facts)}
+
+watermark_store = store_from_env(os.getenv("WATERMARK_STORE", "memory"), s3_client=s3)
+_watermark_locks = {}
+_watermark_locks_guard = threading.Lock()
+# Attempts at a compare-and-set watermark save before giving up (the turns are then re-extracted)
+WATERMARK_SAVE_ATTEMPTS = 5
+
+def _message_key(line: str) -> str:
+    return hashlib.sha256(normalize_message(line).encode()).hexdigest()
+
+def _session_lock(actor_id, session_id) -> threading.Lock:
+    with _watermark_locks_guard:
+        return _watermark_locks.setdefault((actor_id, session_id), threading.Lock())
+
+def _watermark_of(state: dict):
+    # "last_message" is the single hash stored by earlier versions
+    return state.get("last_messages") or state.get("last_message")
+
+def _extract_incremental(lines: list[str], actor_id, session_id):
+    """
+    Extract facts from the turns after the session watermark only, with the
+    previously known facts as a compact summary instead of the full history.
+    Returns the facts and a callback that advances the watermark.
+    """
+    with _session_lock(actor_id, session_id):
+        state = watermark_store.load(actor_id, session_id) or {}
+        keys = [_message_key(line) for line in lines]
+        new_lines = new_lines_after(lines, keys, _watermark_of(state))
+        known = state.get("facts", [])
+        print(f"Incremental extraction: {len(new_lines)} of {len(lines)} messages are new")
+
+        extracted = _extract_facts(new_lines, actor_id, summarize_facts(known))
+
+    def commit():
+        # Advanced only once the records are stored, so a redelivery re-extracts the same turns.
+        # The session lock is released by now, so the save only replaces the state it was
+        # based on; if another delivery saved in between, its facts are kept and the
+        # watermark only moves if this window reaches past it.
+        if not keys or extracted.get("invalid_output"):
+            return
+        current = state
+        for _ in range(WATERMARK_SAVE_ATTEMPTS):
+            version = current.get("version", 0)
+            mark = _watermark_of(current)
+            if version == state.get("version", 0) or advanced(keys, mark):
+                mark = keys[-WATERMARK_MESSAGES:]
+            saved = watermark_store.save_if(actor_id, session_id, {
+                "last_messages": mark,
+                "facts": merge_facts(current.get("facts", []) + extracted.get("facts", [])),
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "version": version + 1,
+            }, version)
+            if saved:
+                return
+            current = watermark_store.load(actor_id, session_id) or {}
+        print(f"Watermark for session {session_id} not saved after {WATERMARK_SAVE_ATTEMPTS} attempts")
 
-    result = json.loads(resp["body"].read())
-    content_text = result["content"][0]["text"]
-    return json.loads(content_text)
+    return extracted, commit
+
+# Per-actor key -> value/confidence index used to skip facts that are already stored
+fact_store = FactStore(store_from_env(os.getenv("FACT_INDEX_STORE", "memory"), s3_client=s3))
+
+def _record_id(record: dict) -> str:
+    if "Sns" in record:
+        return record["Sns"].get("MessageId", "")
+    return record.get("messageId", "")
+
+def _message_from_record(record: dict) -> dict:
+    # SNS -> Lambda, or SNS -> SQS -> Lambda (with or without raw message delivery)
+    if "Sns" in record:
+        return json.loads(record["Sns"]["Message"])
+    body = json.loads(record["body"])
+    if "Message" in body and "s3PayloadLocation" not in body:
+        return json.loads(body["Message"])
+    return body
+
+def _prepare_records(record: dict, trace=NOOP):
+    """
+    Download one delivered payload, extract facts and build its memory records.
+    Returns the records and an optional callback to run once they are stored.
+    """
+    msg = _message_from_record(record)
+
+    # Get S3 payload location and download payload JSON
+    with trace.span("s3_fetch") as span:
+        bucket, key = _parse_s3_payload_location(msg["s3PayloadLocation"])
+        obj = s3.get_object(Bucket=bucket, Key=key)
+        span.set("bytes", obj.get("ContentLength"))
+        # Parsed as it downloads; the whole payload is never held in memory
+        delivered = read_transcript(
+            obj["Body"].iter_chunks(PAYLOAD_CHUNK_BYTES),
+            max_tokens=TRANSCRIPT_MAX_TOKENS,
+            non_text=NON_TEXT_CONTENT,
+        )
+        payload_stats = delivered.stats.as_dict()
+        span.set("payload", payload_stats)
+        if delivered.stats.turns_dropped or delivered.stats.texts_truncated or delivered.stats.non_text_blocks:
+            print(f"Payload: {json.dumps(payload_stats)}")
+
+    actor_id = delivered.actor_id
+    session_id = delivered.session_id
+
+    with trace.span("extraction", actor_id=actor_id, session_id=session_id, mode=EXTRACTION_MODE) as span:
+        lines, scrubbed = _scrub_lines(delivered.lines)
+        if scrubbed:
+            print(f"Scrubber: {json.dumps(scrubbed)}")
+            span.set("scrub_bytes_saved", scrubbed["bytes_saved"])
+            span.set("scrub_tokens_saved", scrubbed["tokens_saved"])
+        span.set("messages", len(lines))
+        span.set_payload("transcript", "\n".join(lines))
+
+        commit = None
+        if EXTRACTION_MODE == "incremental":
+            extracted, commit = _extract_incremental(lines, actor_id, session_id)
+        else:
+            extracted = _extract_facts(lines, actor_id)
+        span.set("facts", len(extracted.get("facts", [])))
+        span.set_payload("extracted", extracted)
+
+    # Stamped with the delivery time rather than now, so a redelivered payload
+    # produces the same records and batches
+    timestamp = (obj.get("LastModified") or datetime.now(timezone.utc)).isoformat()
+
+    writes = [
+        {"actor_id": actor_id, "fact": f, "memory_record_id": memory_record_id, "timestamp": timestamp}
+        for f, memory_record_id in fact_store.diff(actor_id, extracted.get("facts", []))
+    ]
+
+    print(f"Created {len(writes)} new or changed records for actor_id: {actor_id}, session_id: {session_id}")
+    return writes, commit
+
+def _take_deferred() -> list[tuple[str, dict]]:
+    if deferred_queue is None or DEFERRED_DRAIN_BATCH <= 0 or not bedrock_caller.breaker.healthy:
+        return []
+    try:
+        return deferred_queue.take(DEFERRED_DRAIN_BATCH)
+    except Exception as e:
+        print(f"Error reading deferred queue: {str(e)}")
+        return []
+
+def _defer(record: dict, result: dict, reason: str) -> bool:
+    if deferred_queue is None:
+        return False
+    try:
+        key = deferred_queue.put(record, reason)
+    except Exception as e:
+        print(f"Error deferring record {result['messageId']}: {str(e)}")
+        return False
+    print(f"Bedrock unavailable ({reason}); deferred record {result['messageId']} to {key}")
+    result["deferred"] = True
+    return True
 
 def handler(event, context):
-    # 1) SNS -> Lambda
-    sns_msg_raw = event["Records"][0]["Sns"]["Message"]
-    print("SNS message raw:", sns_msg_raw)
-
-    msg = json.loads(sns_msg_raw)
-
-    # 2) Get S3 payload location
-    s3_payload_location = msg["s3PayloadLocation"]
-    bucket, key = _parse_s3_payload_location(s3_payload_location)
-
-    # 3) Download payload JSON
-    obj = s3.get_object(Bucket=bucket, Key=key)
-    delivered = json.loads(obj["Body"].read())
-
-    actor_id = delivered.get("actorId")
-    session_id = delivered.get("sessionId")
-
-    transcript = _build_transcript(delivered)
-    print(f"Transcript: {transcript}")
-    
-    extracted = invoke_model(transcript)
-    print(f"Extracted facts: {extracted}")
-
-    now = datetime.now(timezone.utc).isoformat()
-
-    records = []
-    for f in extracted.get("facts", []):
-        print(f"Processing fact: {f}")
-        records.append({
-            "requestIdentifier": f"{session_id}-{f.get('key', 'unknown')}",
-            # "namespaces": [f"/users/{actor_id}/info", "/"],
-            "namespaces": ["/"],
-            "content": {"text": f'{f["key"]}: {f["value"]}'},
-            "timestamp": now,
-        })
-    
-    print(f"Created {len(records)} records for actor_id: {actor_id}, session_id: {session_id}")
-
-    # Store memories using boto3 bedrock-agentcore client
+    sns_records = event.get("Records", [])
+    trace = tracer.start_trace("handler", records=len(sns_records))
+    try:
+        response = _handle(sns_records, trace, _take_deferred())
+    except BaseException as e:
+        trace.end(e)
+        raise
+    trace.end()
+    return response
+
+def _handle(sns_records, trace, drained=()):
+    # Deferred records drained from the queue are processed alongside the event's own
+    # records, but only deleted on success and never reported back to the event source
+    records = list(sns_records) + [r for _, r in drained]
+    results = [{"messageId": _record_id(r), "ok": True, "stored": 0} for r in records]
+
+    # 1) Fetch payloads and extract facts for every record concurrently
+    prepared = [None] * len(records)
+    commits = [None] * len(records)
     if records:
-        try:
-            print(f"Attempting to store {len(records)} records to memory {MEMORY_ID}")
-            response = agentcore.batch_create_memory_records(
-                memoryId=MEMORY_ID,
-                records=records,
-            )
-            print(f"Successfully stored records. Response: {response}")
-        except Exception as e:
-            print(f"Error storing records: {str(e)}")
-            raise e
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(records))) as pool:
+            futures = [pool.submit(_prepare_records, r, trace) for r in records]
+            for i, future in enumerate(futures):
+                try:
+                    prepared[i], commits[i] = future.result()
+                except BedrockUnavailable as e:
+                    if not _defer(records[i], results[i], str(e)):
+                        print(f"Bedrock unavailable for record {results[i]['messageId']}: {str(e)}")
+                        results[i].update(ok=False, error=str(e))
+                except Exception as e:
+                    print(f"Error processing record {results[i]['messageId']}: {str(e)}")
+                    results[i].update(ok=False, error=str(e))
+
+    # 2) Buffer the writes of every delivery; the same fact may come from several
+    #    deliveries for one actor, so the highest-confidence write wins and is owned by all of them
+    buffer = WriteBuffer(MEMORY_NAMESPACE, WRITE_BATCH_SIZE)
+    for i, writes in enumerate(prepared):
+        for w in writes or []:
+            buffer.add(w["actor_id"], w["fact"], w["memory_record_id"], w["timestamp"], owner=i)
+
+    # 3) Flush them in as few batch calls as possible
+    if buffer:
+        with trace.span("batch_write", records=len(buffer), coalesced=buffer.added - len(buffer)) as span:
+            flushed = buffer.flush(agentcore, MEMORY_ID)
+            span.set("calls", buffer.calls)
     else:
+        flushed = []
         print("No records to store")
 
-    return {"ok": True, "stored": len(records)}
+    # 4) Index what was stored so unchanged facts are skipped next time
+    written = {}
+    for w, stored, record_id in flushed:
+        for i in w.owners:
+            if not stored:
+                results[i].update(ok=False, error="memory record write failed")
+            elif results[i]["ok"]:
+                results[i]["stored"] += 1
+        if stored:
+            written.setdefault(w.actor_id, []).append((w.fact, record_id))
+    for actor_id, facts in written.items():
+        fact_store.commit(actor_id, facts)
+
+    for i, commit in enumerate(commits):
+        if commit and results[i]["ok"]:
+            commit()
+
+    for (key, _), result in zip(drained, results[len(sns_records):]):
+        if result["ok"]:
+            try:
+                deferred_queue.delete(key)
+            except Exception as e:
+                # Records are idempotent, so it is only processed again
+                print(f"Error deleting deferred record {key}: {str(e)}")
+    if drained:
+        done = sum(1 for r in results[len(sns_records):] if r["ok"] and not r.get("deferred"))
+        print(f"Drained {done} of {len(drained)} deferred records")
+        trace.set("drained", len(drained))
+    results = results[:len(sns_records)]
+    if trace.sampled:
+        trace.set("bedrock", bedrock_caller.stats())
+
+    failures = [r["messageId"] for r in results if not r["ok"]]
+    if failures and sns_records and "Sns" in sns_records[0]:
+        # SNS retries the whole event on error; records are idempotent by requestIdentifier
+        raise RuntimeError(f"Failed to process SNS messages: {failures}")
+
+    return {
+        "ok": not failures,
+        "stored": sum(r["stored"] for r in results),
+        "deferred": sum(1 for r in results if r.get("deferred")),
+        "results": results,
+        # Partial batch response, honored when the function is fed from SQS
+        "batchItemFailures": [{"itemIdentifier": m} for m in failures],
+    }
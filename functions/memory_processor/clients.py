@@ -0,0 +1,49 @@
+"""
+boto3 clients created on first use and reused for the life of the container.
+
+Importing boto3 and loading a service model costs tens of milliseconds per
+client, which a module-level `boto3.client(...)` pays during every cold start
+even when the invocation never touches that service (a duplicate delivery
+answered from the extraction cache never calls Bedrock, an empty drain never
+lists S3). LazyClient defers both to the first attribute access.
+"""
+import threading
+
+# boto3's default session is not safe to create clients from concurrently
+_create_lock = threading.Lock()
+
+
+class LazyClient:
+    """
+    Stand-in for `boto3.client(service_name, **kwargs)` that builds the client
+    on first attribute access. `config` may be a dict of botocore Config
+    arguments so that botocore is not imported until then either.
+    """
+
+    def __init__(self, service_name: str, **kwargs):
+        self.service_name = service_name
+        self._kwargs = kwargs
+        self._client = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._client is not None
+
+    def get(self):
+        client = self._client
+        if client is None:
+            with _create_lock:
+                if self._client is None:
+                    import boto3
+
+                    kwargs = dict(self._kwargs)
+                    if isinstance(kwargs.get("config"), dict):
+                        from botocore.config import Config
+
+                        kwargs["config"] = Config(**kwargs["config"])
+                    self._client = boto3.client(self.service_name, **kwargs)
+                client = self._client
+        return client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -0,0 +1,223 @@
+"""
+Content-addressed cache of extracted facts for the memory processor.
+
+Each transcript line (one message) is normalized and hashed together with a
+namespace derived from the model id and extraction prompt, and with the actor
+the transcript belongs to, so one actor's entries are never served to another.
+The facts the model extracted from a chunk are attributed to the messages whose
+words they share and stored under those messages' hashes only; repeated
+historical context is then answered from the cache and only unseen messages
+are sent to Bedrock.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+_WS = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def normalize_message(line: str) -> str:
+    return _WS.sub(" ", line).strip()
+
+
+def _words(text) -> set[str]:
+    return set(_WORD.findall(str(text).casefold()))
+
+
+def attribute_facts(lines: list[str], facts: list[dict]) -> list[list[dict]] | None:
+    """
+    The facts of each line: a fact belongs to the line(s) sharing the most words
+    with its value. Returns None when a fact shares no word with any line, in
+    which case the chunk must not be cached, since no message can be said to
+    carry that fact.
+    """
+    per_line = [[] for _ in lines]
+    line_words = [_words(line) for line in lines]
+    for fact in facts:
+        value = _words(fact.get("value", ""))
+        scores = [len(value & words) for words in line_words]
+        best = max(scores, default=0)
+        if not best:
+            return None
+        for i, score in enumerate(scores):
+            if score == best:
+                per_line[i].append(fact)
+    return per_line
+
+
+class LRUBackend:
+    """In-process LRU; survives across warm Lambda invocations."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: list[str]) -> dict:
+        found = {}
+        with self._lock:
+            for k in keys:
+                if k in self._data:
+                    self._data.move_to_end(k)
+                    found[k] = self._data[k]
+        return found
+
+    def put_many(self, items: dict) -> None:
+        with self._lock:
+            for k, v in items.items():
+                self._data[k] = v
+                self._data.move_to_end(k)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class FileBackend:
+    """One JSON file per key; a local stand-in for the S3 backend."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get_many(self, keys: list[str]) -> dict:
+        found = {}
+        for k in keys:
+            try:
+                with open(self._path(k)) as f:
+                    found[k] = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+        return found
+
+    def put_many(self, items: dict) -> None:
+        for k, v in items.items():
+            tmp = f"{self._path(k)}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(v, f)
+            os.replace(tmp, self._path(k))
+
+
+class S3Backend:
+    """One object per key under s3://bucket/prefix/; lookups run concurrently."""
+
+    def __init__(self, s3_client, bucket: str, prefix: str = "extraction-cache", max_workers: int = 8):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.max_workers = max_workers
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}.json" if self.prefix else f"{key}.json"
+
+    def _get(self, key: str):
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=self._key(key))
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        return json.loads(obj["Body"].read())
+
+    def get_many(self, keys: list[str]) -> dict:
+        if not keys:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(keys))) as pool:
+            values = list(pool.map(self._get, keys))
+        return {k: v for k, v in zip(keys, values) if v is not None}
+
+    def put_many(self, items: dict) -> None:
+        if not items:
+            return
+        def _put(kv):
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=self._key(kv[0]),
+                Body=json.dumps(kv[1]).encode(),
+                ContentType="application/json",
+            )
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as pool:
+            list(pool.map(_put, items.items()))
+
+
+class TieredBackend:
+    """LRU in front of a slower shared backend."""
+
+    def __init__(self, near: LRUBackend, far):
+        self.near = near
+        self.far = far
+
+    def get_many(self, keys: list[str]) -> dict:
+        found = self.near.get_many(keys)
+        missing = [k for k in keys if k not in found]
+        if missing:
+            far = self.far.get_many(missing)
+            self.near.put_many(far)
+            found.update(far)
+        return found
+
+    def put_many(self, items: dict) -> None:
+        self.near.put_many(items)
+        self.far.put_many(items)
+
+
+class ExtractionCache:
+    def __init__(self, backend, namespace: str = ""):
+        self.backend = backend
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, line: str, scope: str = "") -> str:
+        # `scope` is the actor the line belongs to
+        payload = f"{self.namespace}\x00{scope}\x00{normalize_message(line)}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict:
+        found = self.backend.get_many(keys)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: dict) -> None:
+        self.backend.put_many(items)
+
+
+def merge_facts(facts: list[dict]) -> list[dict]:
+    """One fact per key; the highest confidence wins, later facts win ties."""
+    merged = {}
+    for f in facts:
+        key = f.get("key")
+        if key is None:
+            continue
+        prev = merged.get(key)
+        if prev is None or float(f.get("confidence") or 0) >= float(prev.get("confidence") or 0):
+            merged[key] = f
+    return list(merged.values())
+
+
+def cache_from_env(spec: str, namespace: str, s3_client=None):
+    """
+    Build a cache from an EXTRACTION_CACHE spec:
+      off | memory | file:/path/to/dir | s3://bucket/prefix
+    Shared backends are fronted by the in-process LRU.
+    """
+    spec = (spec or "").strip()
+    if spec in ("", "off", "none"):
+        return None
+    lru = LRUBackend(int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "4096")))
+    if spec == "memory":
+        return ExtractionCache(lru, namespace)
+    if spec.startswith("file:"):
+        return ExtractionCache(TieredBackend(lru, FileBackend(spec[len("file:"):])), namespace)
+    if spec.startswith("s3://"):
+        u = urlparse(spec)
+        return ExtractionCache(TieredBackend(lru, S3Backend(s3_client, u.netloc, u.path)), namespace)
+    raise ValueError(f"Unsupported EXTRACTION_CACHE: {spec}")
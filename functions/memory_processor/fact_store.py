@@ -0,0 +1,90 @@
+"""
+Per-actor index of stored facts: key -> value, confidence and memory record id.
+
+New extractions are diffed against the index so that only facts that are new,
+or whose value changed with at least the stored confidence, reach the memory
+store. Changed facts that already have a record are updated in place instead
+of creating another `key: value` record.
+"""
+import re
+import threading
+
+_WS = re.compile(r"\s+")
+
+INDEX_SLOT = "facts"
+
+
+def normalize_key(key) -> str:
+    return _WS.sub("_", str(key).strip().lower())
+
+
+def _normalize_value(value) -> str:
+    return _WS.sub(" ", str(value)).strip().casefold()
+
+
+def _confidence(fact: dict) -> float:
+    try:
+        return float(fact.get("confidence") or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class FactStore:
+    """
+    `store` is any load/save(actor_id, slot) backend from watermarks.py; the
+    index of each actor is cached in-process after the first load.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _index(self, actor_id: str) -> dict:
+        with self._lock:
+            index = self._indexes.get(actor_id)
+        if index is None:
+            index = self.store.load(actor_id, INDEX_SLOT) or {}
+            with self._lock:
+                index = self._indexes.setdefault(actor_id, index)
+        return index
+
+    def diff(self, actor_id: str, facts: list[dict]) -> list[tuple[dict, str | None]]:
+        """
+        Facts that must be written, each with the record id to update (None to create).
+        Unchanged facts and lower-confidence changes are dropped.
+        """
+        index = self._index(actor_id)
+        changed = []
+        for fact in facts:
+            if fact.get("key") is None or fact.get("value") is None:
+                continue
+            prev = index.get(normalize_key(fact["key"]))
+            if prev is None:
+                changed.append((fact, None))
+            elif _normalize_value(prev["value"]) == _normalize_value(fact["value"]):
+                continue
+            elif _confidence(fact) >= prev.get("confidence", 0.0):
+                changed.append((fact, prev.get("record_id")))
+        return changed
+
+    def commit(self, actor_id: str, written: list[tuple[dict, str | None]]) -> None:
+        """Record facts that were stored, with the memory record id they were stored under."""
+        if not written:
+            return
+        index = self._index(actor_id)
+        with self._lock:
+            for fact, record_id in written:
+                key = normalize_key(fact["key"])
+                prev = index.get(key, {})
+                index[key] = {
+                    "value": fact["value"],
+                    "confidence": _confidence(fact),
+                    "record_id": record_id or prev.get("record_id"),
+                }
+            snapshot = dict(index)
+        self.store.save(actor_id, INDEX_SLOT, snapshot)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"actors": len(self._indexes), "facts": sum(len(i) for i in self._indexes.values())}
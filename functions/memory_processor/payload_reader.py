@@ -0,0 +1,302 @@
+"""
+Incremental reader for the memory event payloads AgentCore delivers to S3.
+
+A payload is one JSON object whose `historicalContext` and `currentContext`
+arrays hold the conversation turns. Sessions with tool calls can carry
+megabytes of tool output or base64 images in those turns, none of which is
+useful for extracting user facts. The reader walks the S3 body chunk by chunk:
+text content is decoded, every other content block is skipped with a regex
+scan (never decoded or re-serialized) and summarized by kind and size, and
+only the most recent turns that fit a token budget are kept. Memory stays
+proportional to the chunk size plus the budget, whatever the payload size.
+"""
+import json
+import re
+import sys
+from collections import deque
+from typing import Iterable, Iterator, Optional
+
+from scrubber import estimate_tokens
+
+SECTIONS = ("historicalContext", "currentContext")
+
+_WS = re.compile(rb"[ \t\r\n]*")
+# Possessive quantifiers (Python 3.11+, the Lambda runtime) spare the regex engine the
+# backtracking state of long runs. The patterns below are written unrolled, so every
+# input has a single way to match and a build on an older Python matches the same text
+# in linear time without them.
+_Q = rb"+" if sys.version_info >= (3, 11) else rb""
+# The body of a string up to its closing quote, escapes included
+_STRING_BODY = re.compile(rb'[^"\\]*' + _Q + rb'(?:\\.[^"\\]*' + _Q + rb')*' + _Q, re.DOTALL)
+_STRING = rb'"[^"\\]*' + _Q + rb'(?:\\.[^"\\]*' + _Q + rb')*' + _Q + rb'"'
+_PLAIN = rb'[^"\[\]{}]*' + _Q
+# While skipping a container: everything up to the next bracket that changes the depth,
+# i.e. plain characters, complete strings and complete containers without nested ones,
+# so that most of a skipped value is consumed by the regex engine rather than in Python.
+_SKIP_RUN = re.compile(
+    _PLAIN + rb'(?:(?:' + _STRING + rb'|[\[{]' + _PLAIN + rb'(?:' + _STRING + _PLAIN + rb')*' + _Q + rb'[\]}])'
+    + _PLAIN + rb')*' + _Q,
+    re.DOTALL,
+)
+_SCALAR_END = re.compile(rb"[,\]}\s]")
+
+
+class PayloadStats:
+    __slots__ = ("bytes_read", "turns", "turns_dropped", "texts_truncated", "non_text_blocks", "non_text_bytes")
+
+    def __init__(self):
+        self.bytes_read = 0
+        self.turns = 0
+        self.turns_dropped = 0
+        self.texts_truncated = 0
+        self.non_text_blocks = 0
+        self.non_text_bytes = 0
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _Scanner:
+    """Pull-style JSON tokenizer over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes], stats: PayloadStats):
+        self._chunks = iter(chunks)
+        self._stats = stats
+        self.buf = b""
+        self.pos = 0
+
+    def _fill(self) -> None:
+        for chunk in self._chunks:
+            if chunk:
+                self._stats.bytes_read += len(chunk)
+                # Consumed bytes are dropped, so the buffer never holds much more than one chunk
+                self.buf = self.buf[self.pos:] + chunk
+                self.pos = 0
+                return
+        raise ValueError("Unexpected end of payload")
+
+    def peek(self) -> int:
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            self._fill()
+
+    def expect(self, char: bytes) -> None:
+        if self.peek() != char[0]:
+            raise ValueError(f"Expected {char!r} at payload offset {self._offset()}")
+        self.pos += 1
+
+    def maybe(self, char: bytes) -> bool:
+        if self.peek() == char[0]:
+            self.pos += 1
+            return True
+        return False
+
+    def _offset(self) -> int:
+        return self._stats.bytes_read - len(self.buf) + self.pos
+
+    def string(self, keep: Optional[int] = None) -> tuple[Optional[str], int, bool]:
+        """
+        Read a string. At most `keep` raw bytes are decoded (all if None, none if
+        0); the rest is only scanned. Returns (value, raw length, truncated).
+        """
+        self.expect(b'"')
+        parts, kept, length = [], 0, 0
+        while True:
+            end = _STRING_BODY.match(self.buf, self.pos).end()
+            if keep is None or kept < keep:
+                part = self.buf[self.pos:end] if keep is None else self.buf[self.pos:min(end, self.pos + keep - kept)]
+                parts.append(part)
+                kept += len(part)
+            length += end - self.pos
+            self.pos = end
+            if end < len(self.buf) and self.buf[end] == ord('"'):
+                self.pos += 1
+                break
+            # Out of data, or a backslash whose escaped character is in the next chunk
+            self._fill()
+
+        if keep == 0:
+            return None, length, length > 0
+        return _decode(b"".join(parts)), length, kept < length
+
+    def skip(self) -> int:
+        """Skip one value without decoding it; returns its size in bytes."""
+        start = self._offset()
+        char = self.peek()
+        if char == ord('"'):
+            self.string(keep=0)
+        elif char in b"{[":
+            self.pos += 1
+            depth = 1
+            while depth:
+                self.pos = _SKIP_RUN.match(self.buf, self.pos).end()
+                if self.pos == len(self.buf):
+                    self._fill()
+                    continue
+                char = self.buf[self.pos]
+                if char == ord('"'):
+                    # A string that continues into the next chunk
+                    self.string(keep=0)
+                else:
+                    depth += 1 if char in b"{[" else -1
+                    self.pos += 1
+        else:
+            self.scalar()
+        return self._offset() - start
+
+    def scalar(self):
+        """A number, true, false or null."""
+        while True:
+            m = _SCALAR_END.search(self.buf, self.pos)
+            if m is not None:
+                break
+            self._fill()
+        raw, self.pos = self.buf[self.pos:m.start()], m.start()
+        return json.loads(raw)
+
+    def value(self, keep: Optional[int] = None):
+        """A string or scalar; containers are skipped and read as None."""
+        char = self.peek()
+        if char == ord('"'):
+            return self.string(keep)[0]
+        if char in b"{[":
+            self.skip()
+            return None
+        return self.scalar()
+
+    def object_keys(self) -> Iterator[str]:
+        """Iterate an object's keys; the caller consumes each value before the next key."""
+        self.expect(b"{")
+        if self.maybe(b"}"):
+            return
+        while True:
+            key = self.string()[0]
+            self.expect(b":")
+            yield key
+            if not self.maybe(b","):
+                self.expect(b"}")
+                return
+
+    def array_items(self) -> Iterator[None]:
+        """Iterate an array; the caller consumes each item."""
+        self.expect(b"[")
+        if self.maybe(b"]"):
+            return
+        while True:
+            yield None
+            if not self.maybe(b","):
+                self.expect(b"]")
+                return
+
+
+def _decode(raw: bytes) -> str:
+    # `raw` may end inside an escape sequence or a multi-byte character when truncated
+    text = raw.decode("utf-8", "ignore")
+    if "\\" not in text:
+        return text
+    try:
+        return json.loads(f'"{text}"')
+    except json.JSONDecodeError:
+        return json.loads(f'"{text[:text.rfind(chr(92))]}"')
+
+
+def _human_size(n: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024 or unit == "MB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+class Transcript:
+    def __init__(self):
+        self.actor_id = None
+        self.session_id = None
+        self.lines: list[str] = []
+        self.stats = PayloadStats()
+
+
+def read_transcript(
+    chunks: Iterable[bytes],
+    max_tokens: int = 0,
+    non_text: str = "summary",
+) -> Transcript:
+    """
+    Read `actorId`, `sessionId` and the transcript turns ("ROLE: text") from a
+    delivered payload given as byte chunks (e.g. `Body.iter_chunks()`).
+
+    With `max_tokens`, the oldest turns are dropped until the rest fit, and
+    texts longer than the whole budget are cut to it. `non_text` is "summary"
+    (tool results, images etc. become "[toolResult 2.3 MB]") or "skip".
+    """
+    if non_text not in ("summary", "skip"):
+        raise ValueError(f"Unsupported non-text handling: {non_text}")
+    transcript = Transcript()
+    stats = transcript.stats
+    scanner = _Scanner(chunks, stats)
+    # Longest text decoded from one content block; the budget estimates ~4 bytes per token
+    keep = max_tokens * 4 if max_tokens else None
+    lines, tokens = deque(), 0
+
+    def add(line: str) -> None:
+        nonlocal tokens
+        size = estimate_tokens(len(line.encode()))
+        lines.append((line, size))
+        tokens += size
+        while max_tokens and tokens > max_tokens and len(lines) > 1:
+            tokens -= lines.popleft()[1]
+            stats.turns_dropped += 1
+
+    def content_text() -> Optional[str]:
+        char = scanner.peek()
+        if char == ord('"'):
+            text, _, truncated = scanner.string(keep)
+            stats.texts_truncated += truncated
+            return text
+        if char != ord("{"):
+            scanner.skip()
+            return None
+        texts, blocks = [], []
+        for key in scanner.object_keys():
+            if key == "text" and scanner.peek() == ord('"'):
+                text, _, truncated = scanner.string(keep)
+                stats.texts_truncated += truncated
+                texts.append(text)
+            else:
+                size = scanner.skip()
+                stats.non_text_blocks += 1
+                stats.non_text_bytes += size
+                blocks.append(f"[{key} {_human_size(size)}]")
+        if texts:
+            return " ".join(texts)
+        if blocks and non_text == "summary":
+            return " ".join(blocks)
+        return None
+
+    for key in scanner.object_keys():
+        if key in SECTIONS and scanner.peek() == ord("["):
+            for _ in scanner.array_items():
+                if scanner.peek() != ord("{"):
+                    scanner.skip()
+                    continue
+                role, text = "UNKNOWN", None
+                for item_key in scanner.object_keys():
+                    if item_key == "role":
+                        role = scanner.value(keep=64) or role
+                    elif item_key == "content":
+                        text = content_text()
+                    else:
+                        scanner.skip()
+                if text is not None:
+                    stats.turns += 1
+                    add(f"{role}: {text}")
+        elif key == "actorId":
+            transcript.actor_id = scanner.value()
+        elif key == "sessionId":
+            transcript.session_id = scanner.value()
+        else:
+            scanner.skip()
+
+    transcript.lines = [line for line, _ in lines]
+    return transcript
@@ -0,0 +1,374 @@
+"""
+Rate limiting, retries and a circuit breaker around Bedrock calls.
+
+Every model call first takes a token from an adaptive token bucket: a throttle
+cuts the refill rate and each success adds a little back, so when many
+Lambda containers spike at once each of them slows down instead of retrying
+in lockstep. Retryable errors are retried with full-jitter exponential
+backoff. Repeated failures open a circuit breaker; while it is open, calls
+fail fast with BedrockUnavailable and the handler parks the work in a
+deferred S3 queue that later invocations drain.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+RETRYABLE_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "InternalServerException",
+}
+THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException"}
+# How long a drained deferred record stays claimed before another drain may take it;
+# longer than the maximum Lambda run time, so live claims are never taken over
+DEFERRED_LEASE_SECONDS = 960
+# Claims a deferred record gets before it is moved under dead/ instead of being claimed again
+DEFERRED_MAX_ATTEMPTS = 5
+
+
+class BedrockUnavailable(Exception):
+    """Bedrock is throttling or failing; the work should be deferred, not redelivered."""
+
+
+def _error_code(error: Exception):
+    # ClientError carries the parsed error response; checked by shape so botocore
+    # is only imported once a client has actually been created
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if _error_code(error) in RETRYABLE_CODES:
+        return True
+    from botocore.exceptions import ConnectionError as BotoConnectionError, ReadTimeoutError
+
+    return isinstance(error, (BotoConnectionError, ReadTimeoutError))
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket whose refill rate backs off multiplicatively on throttles and
+    recovers additively on successes (between `min_rate` and `max_rate`).
+    Throttles within `cooldown` seconds of a decrease count as one, so a burst
+    of concurrent throttles does not collapse the rate.
+    """
+
+    def __init__(self, rate: float, burst: float, min_rate: float = 0.5, recovery: float = 0.5,
+                 backoff: float = 0.7, cooldown: float = 1.0):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = burst
+        self.recovery = recovery
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._decreased_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float) -> bool:
+        """Take one token, waiting up to `timeout` seconds for it."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._decreased_at >= self.cooldown:
+                self.rate = max(self.min_rate, self.rate * self.backoff)
+                self._decreased_at = now
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.recovery)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; open ->
+    half-open after `reset_timeout` seconds, letting one probe call through;
+    the probe's outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        """Closed, and the last call did not fail."""
+        return self.state == "closed" and self._failures == 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                self._probing = False
+            if self.state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def abandon(self) -> None:
+        """The allowed call never reached Bedrock; let another probe through."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class ResilientCaller:
+    def __init__(
+        self,
+        bucket: AdaptiveTokenBucket,
+        breaker: CircuitBreaker,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        acquire_timeout: float = 20.0,
+    ):
+        self.bucket = bucket
+        self.breaker = breaker
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.acquire_timeout = acquire_timeout
+        self.retries = 0
+        self.throttles = 0
+
+    def call(self, fn):
+        """Run `fn()` under the rate limit, retry policy and circuit breaker."""
+        if not self.breaker.allow():
+            raise BedrockUnavailable("circuit open")
+
+        for attempt in range(self.max_attempts):
+            if not self.bucket.acquire(self.acquire_timeout):
+                self.breaker.abandon()
+                raise BedrockUnavailable("rate limit wait exceeded")
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    # Bedrock answered; the request itself is at fault
+                    self.breaker.record_success()
+                    raise
+                if _error_code(e) in THROTTLE_CODES:
+                    self.throttles += 1
+                    self.bucket.on_throttle()
+                if attempt == self.max_attempts - 1:
+                    self.breaker.record_failure()
+                    raise BedrockUnavailable(str(e)) from e
+                self.retries += 1
+                # Full jitter: spreads the retries of concurrent callers over the whole window
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                continue
+            self.bucket.on_success()
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "rate": round(self.bucket.rate, 3),
+            "retries": self.retries,
+            "throttles": self.throttles,
+        }
+
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def parse_json_lenient(text: str):
+    """
+    Parse a model's JSON answer, repairing the usual defects: code fences,
+    prose around the object and trailing commas. Returns None if it can't.
+    """
+    text = _FENCE.sub("", text.strip())
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    candidate = text[start:end + 1]
+    for attempt in (candidate, _TRAILING_COMMA.sub(r"\1", candidate)):
+        try:
+            return json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+class S3DeferredQueue:
+    """
+    Lambda records parked under s3://bucket/prefix/ while Bedrock is unavailable.
+
+    A container drains a record only after claiming it: it creates a copy under
+    prefix/inflight/ with a conditional put that fails if the copy already
+    exists, then deletes the original. Containers draining at the same time
+    therefore never process the same record twice. Claims not deleted within
+    `lease_seconds` (the container failed or the record could not be stored)
+    are claimed again by a later drain, up to `max_attempts` claims in all;
+    a record that still has not been stored is then moved under prefix/dead/
+    for inspection instead of being retried forever.
+    """
+
+    def __init__(self, s3_client, bucket: str, prefix: str = "deferred", lease_seconds: float = DEFERRED_LEASE_SECONDS,
+                 max_attempts: int = DEFERRED_MAX_ATTEMPTS):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def put(self, record: dict, reason: str) -> str:
+        # Time-ordered keys, so draining picks up the oldest work first
+        key = f"{self.prefix}/{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}.json"
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=json.dumps({"record": record, "reason": reason}).encode(),
+            ContentType="application/json",
+        )
+        return key
+
+    def take(self, limit: int) -> list[tuple[str, dict]]:
+        """
+        Claim up to `limit` of the oldest deferred records, expired claims first.
+        Returns (claim key, record) pairs; a claim stays until delete().
+        """
+        items = self._reclaim_expired(limit)
+        if len(items) < limit:
+            # Delimiter keeps the inflight/ claims out of the listing
+            response = self.s3.list_objects_v2(
+                Bucket=self.bucket, Prefix=f"{self.prefix}/", Delimiter="/", MaxKeys=limit - len(items),
+            )
+            for obj in response.get("Contents", []) or []:
+                item = self._claim(obj["Key"])
+                if item is not None:
+                    items.append(item)
+        return items
+
+    def delete(self, key: str) -> None:
+        self.s3.delete_object(Bucket=self.bucket, Key=key)
+
+    def _claim_key(self, key: str) -> str:
+        return f"{self.prefix}/inflight/{key.rsplit('/', 1)[-1]}"
+
+    def _body(self, record: dict, reason: str, attempts: int) -> bytes:
+        # claimed_at makes every claim's ETag unique, so a reclaim can be conditioned on it
+        return json.dumps({"record": record, "reason": reason, "claimed_at": time.time(), "attempts": attempts}).encode()
+
+    def _claim(self, key: str):
+        try:
+            data = json.loads(self.s3.get_object(Bucket=self.bucket, Key=key)["Body"].read())
+        except self.s3.exceptions.NoSuchKey:
+            # Claimed concurrently by another container
+            return None
+        claim = self._claim_key(key)
+        if not self._conditional_put(claim, self._body(data["record"], data.get("reason", ""), 1), IfNoneMatch="*"):
+            return None
+        self.s3.delete_object(Bucket=self.bucket, Key=key)
+        return claim, data["record"]
+
+    def _reclaim_expired(self, limit: int) -> list[tuple[str, dict]]:
+        response = self.s3.list_objects_v2(Bucket=self.bucket, Prefix=f"{self.prefix}/inflight/", MaxKeys=1000)
+        cutoff = time.time() - self.lease_seconds
+        items = []
+        for obj in response.get("Contents", []) or []:
+            if len(items) >= limit:
+                break
+            modified = obj.get("LastModified")
+            if modified is None or modified.timestamp() > cutoff:
+                continue
+            try:
+                current = self.s3.get_object(Bucket=self.bucket, Key=obj["Key"])
+            except self.s3.exceptions.NoSuchKey:
+                continue
+            data = json.loads(current["Body"].read())
+            # Claims written before attempts were counted have had at least one
+            attempts = data.get("attempts", 1)
+            if attempts >= self.max_attempts:
+                self._bury(obj["Key"], data, current["ETag"])
+                continue
+            body = self._body(data["record"], data.get("reason", ""), attempts + 1)
+            if self._conditional_put(obj["Key"], body, IfMatch=current["ETag"]):
+                items.append((obj["Key"], data["record"]))
+        return items
+
+    def _bury(self, claim: str, data: dict, etag: str) -> None:
+        # Rewriting the claim first (dead_at changes its ETag) makes sure only one container moves it
+        body = json.dumps({**data, "dead_at": time.time()}).encode()
+        if not self._conditional_put(claim, body, IfMatch=etag):
+            return
+        dead = f"{self.prefix}/dead/{claim.rsplit('/', 1)[-1]}"
+        self.s3.put_object(Bucket=self.bucket, Key=dead, Body=body, ContentType="application/json")
+        self.s3.delete_object(Bucket=self.bucket, Key=claim)
+        print(f"Deferred record not stored after {data.get('attempts', 1)} attempts; moved to {dead}")
+
+    def _conditional_put(self, key: str, body: bytes, **condition) -> bool:
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType="application/json", **condition)
+        except Exception as e:
+            # 412 PreconditionFailed / 409 ConditionalRequestConflict: another container won
+            if _error_code(e) in ("PreconditionFailed", "ConditionalRequestConflict"):
+                return False
+            raise
+        return True
+
+
+def deferred_queue_from_env(spec: str, s3_client=None):
+    """DEFERRED_QUEUE spec: empty (disabled) or s3://bucket/prefix."""
+    spec = (spec or "").strip()
+    if not spec:
+        return None
+    if spec.startswith("s3://"):
+        u = urlparse(spec)
+        return S3DeferredQueue(s3_client, u.netloc, u.path.strip("/") or "deferred")
+    raise ValueError(f"Unsupported DEFERRED_QUEUE: {spec}")
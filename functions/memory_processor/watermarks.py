@@ -0,0 +1,243 @@
+"""
+Per-(actorId, sessionId) watermarks for incremental extraction.
+
+A watermark records the hashes of the last few messages that were sent for
+extraction and the facts known for the session so far. The next delivery only
+needs the messages after the point where that run of hashes ends, plus a
+compact summary of the known facts. Matching several messages rather than the
+last one keeps a repeated line ("USER: yes") from being taken for the
+watermark. Every state carries a version, and save_if() only replaces the
+version it was read at, so concurrent deliveries of one session cannot
+overwrite each other's progress.
+"""
+import json
+import os
+import sqlite3
+import threading
+from urllib.parse import urlparse
+
+# Message hashes kept as the watermark
+WATERMARK_MESSAGES = 8
+
+
+def _version(state) -> int:
+    return (state or {}).get("version", 0)
+
+
+class MemoryWatermarkStore:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def load(self, actor_id: str, session_id: str):
+        with self._lock:
+            return self._data.get((actor_id, session_id))
+
+    def save(self, actor_id: str, session_id: str, state: dict) -> None:
+        with self._lock:
+            self._data[(actor_id, session_id)] = state
+
+    def save_if(self, actor_id: str, session_id: str, state: dict, expected_version: int) -> bool:
+        with self._lock:
+            if _version(self._data.get((actor_id, session_id))) != expected_version:
+                return False
+            self._data[(actor_id, session_id)] = state
+            return True
+
+
+class JsonFileWatermarkStore:
+    """All watermarks in a single JSON file; intended for local runs and tests."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def load(self, actor_id: str, session_id: str):
+        with self._lock:
+            return self._read().get(f"{actor_id}/{session_id}")
+
+    def save(self, actor_id: str, session_id: str, state: dict) -> None:
+        with self._lock:
+            data = self._read()
+            data[f"{actor_id}/{session_id}"] = state
+            self._write(data)
+
+    def save_if(self, actor_id: str, session_id: str, state: dict, expected_version: int) -> bool:
+        with self._lock:
+            data = self._read()
+            if _version(data.get(f"{actor_id}/{session_id}")) != expected_version:
+                return False
+            data[f"{actor_id}/{session_id}"] = state
+            self._write(data)
+            return True
+
+    def _write(self, data: dict) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+
+class SQLiteWatermarkStore:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS watermarks ("
+                "actor_id TEXT NOT NULL, session_id TEXT NOT NULL, state TEXT NOT NULL, "
+                "PRIMARY KEY (actor_id, session_id))"
+            )
+
+    def load(self, actor_id: str, session_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM watermarks WHERE actor_id = ? AND session_id = ?",
+                (actor_id, session_id),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, actor_id: str, session_id: str, state: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks (actor_id, session_id, state) VALUES (?, ?, ?)",
+                (actor_id, session_id, json.dumps(state)),
+            )
+
+    def save_if(self, actor_id: str, session_id: str, state: dict, expected_version: int) -> bool:
+        # BEGIN IMMEDIATE also excludes other processes sharing the database file
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT state FROM watermarks WHERE actor_id = ? AND session_id = ?",
+                    (actor_id, session_id),
+                ).fetchone()
+                if _version(json.loads(row[0]) if row else None) != expected_version:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO watermarks (actor_id, session_id, state) VALUES (?, ?, ?)",
+                    (actor_id, session_id, json.dumps(state)),
+                )
+                self._conn.execute("COMMIT")
+                return True
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class S3WatermarkStore:
+    """One object per session under s3://bucket/prefix/{actorId}/{sessionId}.json."""
+
+    def __init__(self, s3_client, bucket: str, prefix: str = "watermarks"):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _key(self, actor_id: str, session_id: str) -> str:
+        return f"{self.prefix}/{actor_id}/{session_id}.json"
+
+    def load(self, actor_id: str, session_id: str):
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=self._key(actor_id, session_id))
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        return json.loads(obj["Body"].read())
+
+    def save(self, actor_id: str, session_id: str, state: dict) -> None:
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=self._key(actor_id, session_id),
+            Body=json.dumps(state).encode(),
+            ContentType="application/json",
+        )
+
+    def save_if(self, actor_id: str, session_id: str, state: dict, expected_version: int) -> bool:
+        # Conditional put on the ETag read here, so a save from another container in between fails it
+        key = self._key(actor_id, session_id)
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=key)
+            current, condition = json.loads(obj["Body"].read()), {"IfMatch": obj["ETag"]}
+        except self.s3.exceptions.NoSuchKey:
+            current, condition = None, {"IfNoneMatch": "*"}
+        if _version(current) != expected_version:
+            return False
+        try:
+            self.s3.put_object(
+                Bucket=self.bucket, Key=key, Body=json.dumps(state).encode(),
+                ContentType="application/json", **condition,
+            )
+        except Exception as e:
+            code = (getattr(e, "response", None) or {}).get("Error", {}).get("Code")
+            if code in ("PreconditionFailed", "ConditionalRequestConflict"):
+                return False
+            raise
+        return True
+
+
+def new_lines_after(lines: list[str], keys: list[str], watermark) -> list[str]:
+    """
+    Messages after the last position where the watermark's run of hashes ends.
+    The whole run must match, except where the delivered window starts inside
+    it. A single hash (older states) is a run of one. If the watermark is
+    unknown or has slid out of the delivered window, every message is new.
+    """
+    if not watermark:
+        return lines
+    if isinstance(watermark, str):
+        run = [watermark]
+    else:
+        run = list(watermark)
+        # A shorter run was a whole window from the start of the session, which
+        # the delivered window still starts with unless it has slid past it
+        if len(run) < WATERMARK_MESSAGES and keys[:len(run)] == run:
+            return lines[len(run):]
+    for i in range(len(keys) - 1, -1, -1):
+        n = min(len(run), i + 1)
+        if keys[i - n + 1:i + 1] == run[-n:]:
+            return lines[i + 1:]
+    return lines
+
+
+def advanced(keys: list[str], watermark) -> bool:
+    """Whether `keys` reach past `watermark`, i.e. a watermark taken from them is newer."""
+    if not watermark:
+        return True
+    return len(new_lines_after(keys, keys, watermark)) < len(keys)
+
+
+def summarize_facts(facts: list[dict], max_facts: int = 50, max_value_chars: int = 100) -> str:
+    """Compact `key: value` lines, the only prior context sent in incremental mode."""
+    lines = []
+    for f in facts[:max_facts]:
+        value = str(f.get("value", ""))
+        if len(value) > max_value_chars:
+            value = value[:max_value_chars] + "..."
+        lines.append(f"- {f.get('key')}: {value}")
+    return "\n".join(lines)
+
+
+def store_from_env(spec: str, s3_client=None):
+    """
+    Build a store from a WATERMARK_STORE spec:
+      memory | json:/path/file.json | sqlite:/path/file.db | s3://bucket/prefix
+    """
+    spec = (spec or "memory").strip()
+    if spec == "memory":
+        return MemoryWatermarkStore()
+    if spec.startswith("json:"):
+        return JsonFileWatermarkStore(spec[len("json:"):])
+    if spec.startswith("sqlite:"):
+        return SQLiteWatermarkStore(spec[len("sqlite:"):])
+    if spec.startswith("s3://"):
+        u = urlparse(spec)
+        return S3WatermarkStore(s3_client, u.netloc, u.path)
+    raise ValueError(f"Unsupported WATERMARK_STORE: {spec}")
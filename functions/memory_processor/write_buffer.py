@@ -0,0 +1,171 @@
+"""
+Write-behind buffer for memory records.
+
+Facts from every delivery handled by one invocation (the event's own records
+and any drained deferred ones) are added to a single buffer instead of being
+written per trigger. Writes of the same fact for the same actor coalesce: the
+highest-confidence one wins and is owned by every delivery that produced it.
+flush() then stores the buffer in as few calls as the API allows, new facts
+through batch_create_memory_records and changed facts through
+batch_update_memory_records, 100 records per call.
+
+Each actor's records live in their own namespace (`/users/{actor_id}/info` by
+default), so retrieval reads one user's records rather than the tenant's.
+Request identifiers and client tokens are derived from the record contents and
+batches are built in a stable order, so a redelivered event sends the same
+batches again and the service treats them as retries.
+"""
+import hashlib
+import json
+import re
+
+from fact_store import normalize_key
+
+# Maximum number of records accepted by one batch create/update call
+MAX_BATCH = 100
+DEFAULT_NAMESPACE = "/users/{actor_id}/info"
+
+# Characters allowed in a namespace segment (the API also allows "/", "*" and ":")
+_NAMESPACE_UNSAFE = re.compile(r"[^a-zA-Z0-9_-]")
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256("\x00".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _confidence(fact: dict) -> float:
+    try:
+        return float(fact.get("confidence") or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def actor_namespace(actor_id, template: str = DEFAULT_NAMESPACE) -> str:
+    """
+    The namespace of an actor's records. Characters the namespace pattern does
+    not allow are replaced, with a short hash of the original id appended so
+    that distinct ids never share a namespace.
+    """
+    actor = str(actor_id)
+    safe = _NAMESPACE_UNSAFE.sub("_", actor) or "_"
+    if safe != actor:
+        safe = f"{safe}-{_digest(actor)[:8]}"
+    return template.format(actor_id=safe)
+
+
+def request_identifier(namespace: str, key: str, value) -> str:
+    # [a-zA-Z0-9_-]{1,80}; the same fact in the same namespace always maps to the same id
+    return _digest(namespace, key, value)[:40]
+
+
+class PendingWrite:
+    __slots__ = ("actor_id", "key", "fact", "record", "owners")
+
+    def __init__(self, actor_id, key: str, fact: dict, record: dict):
+        self.actor_id = actor_id
+        self.key = key
+        self.fact = fact
+        self.record = record
+        self.owners = set()
+
+
+class WriteBuffer:
+    """
+    `namespace` is a template with an `{actor_id}` field; "/" puts every
+    record in the root namespace. Not thread-safe: records are added and
+    flushed by the thread that handles the invocation.
+    """
+
+    def __init__(self, namespace: str = DEFAULT_NAMESPACE, max_batch: int = MAX_BATCH):
+        self.namespace = namespace
+        self.max_batch = max(1, min(max_batch, MAX_BATCH))
+        self._pending = {}
+        self.added = 0
+        self.calls = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, actor_id, fact: dict, memory_record_id, timestamp: str, owner) -> None:
+        """
+        Buffer a fact for an actor; `memory_record_id` is the record to update
+        (None to create) and `owner` is whatever the caller tracks deliveries by.
+        """
+        self.added += 1
+        key = normalize_key(fact["key"])
+        namespace = actor_namespace(actor_id, self.namespace)
+        slot = (namespace, key)
+        prev = self._pending.get(slot)
+        if prev is None or _confidence(fact) >= _confidence(prev.fact):
+            record = {
+                "namespaces": [namespace],
+                "content": {"text": f'{fact["key"]}: {fact["value"]}'},
+                "timestamp": timestamp,
+            }
+            if memory_record_id:
+                record["memoryRecordId"] = memory_record_id
+            else:
+                record["requestIdentifier"] = request_identifier(namespace, key, fact["value"])
+            write = PendingWrite(actor_id, key, fact, record)
+            if prev is not None:
+                write.owners = prev.owners
+            self._pending[slot] = prev = write
+        prev.owners.add(owner)
+
+    def batches(self) -> list[tuple[str, list[PendingWrite]]]:
+        """
+        The buffered writes as ("create" | "update", writes) batches, each as
+        large as allowed and composed the same way for the same input.
+        """
+        writes = [self._pending[slot] for slot in sorted(self._pending)]
+        out = []
+        for kind, group in (
+            ("create", [w for w in writes if "memoryRecordId" not in w.record]),
+            ("update", [w for w in writes if "memoryRecordId" in w.record]),
+        ):
+            for start in range(0, len(group), self.max_batch):
+                out.append((kind, group[start:start + self.max_batch]))
+        return out
+
+    def flush(self, client, memory_id: str) -> list[tuple[PendingWrite, bool, str | None]]:
+        """
+        Write every buffered record and empty the buffer. Returns each write
+        with whether it was stored and its memory record id.
+        """
+        results = []
+        for kind, batch in self.batches():
+            results.extend(self._write(client, memory_id, kind, batch))
+        self._pending.clear()
+        return results
+
+    def _write(self, client, memory_id: str, kind: str, batch: list[PendingWrite]):
+        records = [w.record for w in batch]
+        if kind == "create":
+            id_field = "requestIdentifier"
+            call = client.batch_create_memory_records
+            kwargs = {"clientToken": _digest(json.dumps(records, sort_keys=True, default=str))}
+        else:
+            id_field = "memoryRecordId"
+            call = client.batch_update_memory_records
+            kwargs = {}
+
+        failed = set()
+        created_ids = {}
+        try:
+            print(f"Attempting to store {len(records)} records to memory {memory_id}")
+            self.calls += 1
+            response = call(memoryId=memory_id, records=records, **kwargs)
+            for item in response.get("failedRecords", []) or []:
+                failed.add(item.get(id_field))
+            for item in response.get("successfulRecords", []) or []:
+                created_ids[item.get(id_field)] = item.get("memoryRecordId")
+        except Exception as e:
+            print(f"Error storing records: {str(e)}")
+            failed = {r[id_field] for r in records}
+
+        return [
+            (w, w.record[id_field] not in failed,
+             w.record.get("memoryRecordId") or created_ids.get(w.record[id_field]))
+            for w in batch
+        ]
+
@@ -7,6 +7,8 @@ echo "Deploying CloudFormation stack: $STACK_NAME"
 
 # Use placeholder if MEMORY_ID not set
 MEMORY_ID_PARAM=${MEMORY_ID:-"placeholder"}
+# Seconds SQS collects triggers into one Lambda invocation (0: SNS invokes the Lambda per trigger)
+WRITE_BATCHING_WINDOW=${WRITE_BATCHING_WINDOW_SECONDS:-0}
 
 # Check if MEMORY_EXEC_ROLE_ARN is set
 if [ -z "$MEMORY_EXEC_ROLE_ARN" ]; then
@@ -20,7 +22,8 @@ aws cloudformation deploy \
   --stack-name $STACK_NAME \
   --region $REGION \
   --capabilities CAPABILITY_IAM \
-  --parameter-overrides MemoryId=$MEMORY_ID_PARAM MemoryExecutionRoleArn=$MEMORY_EXEC_ROLE_ARN
+  --parameter-overrides MemoryId=$MEMORY_ID_PARAM MemoryExecutionRoleArn=$MEMORY_EXEC_ROLE_ARN \
+    WriteBatchingWindowSeconds=$WRITE_BATCHING_WINDOW
 
 if [ $? -eq 0 ]; then
     echo "Stack deployed successfully!"
@@ -2,36 +2,57 @@
 """
 Check what's stored in the memory
 """
+import argparse
 import os
 import sys
+
 import boto3
 
+from memory_scanner import ScanStats, scan_namespaces, write_records
+
+# Actor namespaces are built exactly as the memory processor writes them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "functions", "memory_processor"))
+from write_buffer import DEFAULT_NAMESPACE, actor_namespace  # noqa: E402
+
 REGION = os.getenv("AWS_REGION", "us-east-1")
+MEMORY_NAMESPACE = os.getenv("MEMORY_NAMESPACE", DEFAULT_NAMESPACE)
 
-def check_memory_records(memory_id):
-    """Check what records are stored in memory"""
+def check_memory_records(memory_id, namespaces=("/",), output=None, max_workers=4):
+    """Check what records are stored in memory, following every page"""
     client = boto3.client("bedrock-agentcore", region_name=REGION)
     
     print(f"Checking memory: {memory_id}")
-    print("\nReading memory records...")
-    
-    response = client.list_memory_records(memoryId=memory_id, namespace="/")
-    
-    records = response.get("memoryRecordSummaries", [])
-    print(f"Found {len(records)} total records:")
+    print(f"\nReading memory records from {', '.join(namespaces)}...")
     
-    for record in records:
-        content = record.get("content", {})
-        timestamp = record.get("timestamp", "")
-        print(f"  - {content.get('text', 'N/A')} (created: {timestamp[:19] if timestamp else 'N/A'})")
-    
-    return len(records)
+    stats = ScanStats()
+    items = scan_namespaces(client, memory_id, namespaces, max_workers=max_workers, stats=stats)
+
+    if output:
+        count = write_records(items, output)
+        print(f"Wrote {count} records to {output}")
+    else:
+        count = 0
+        for namespace, record in items:
+            content = record.get("content", {})
+            timestamp = str(record.get("timestamp", ""))
+            prefix = f"[{namespace}] " if len(namespaces) > 1 else ""
+            print(f"  - {prefix}{content.get('text', 'N/A')} (created: {timestamp[:19] if timestamp else 'N/A'})")
+            count += 1
+
+    print(f"Scanned {stats.summary()}")
+    return count
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python check_memory.py <memory-id>")
-        sys.exit(1)
-    
-    memory_id = sys.argv[1]
-    count = check_memory_records(memory_id)
-    print(f"\nTotal records: {count}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="List memory records, following pagination")
+    parser.add_argument("memory_id")
+    parser.add_argument("--namespace", action="append", default=[],
+                        help="Namespace to scan (repeatable, default: /)")
+    parser.add_argument("--actor", action="append", default=[],
+                        help="Scan this actor's namespace, as written by the memory processor (repeatable)")
+    parser.add_argument("--output", help="Stream records to a .jsonl or .csv file instead of printing")
+    parser.add_argument("--workers", type=int, default=4, help="Namespaces scanned in parallel")
+    args = parser.parse_args()
+
+    namespaces = args.namespace + [actor_namespace(actor, MEMORY_NAMESPACE) for actor in args.actor]
+    count = check_memory_records(args.memory_id, namespaces or ["/"], args.output, args.workers)
+    print(f"\nTotal records: {count}")
@@ -1,117 +1,452 @@
 #!/usr/bin/env python3
 """
 Minimal Lambda deployment with correct platform targeting
+
+Dependencies are installed once per distinct requirement set into a
+content-addressed cache (build/cache/deps-<hash>), so iterative deploys only
+re-stage the handler modules. The package is a deterministic zip (sorted
+entries, fixed timestamps and permissions) compressed in parallel and written
+to disk; identical code is therefore recognised by its CodeSha256 and not
+uploaded again.
+
+Build without AWS access, e.g. against a local wheelhouse:
+  python scripts/deploy_lambda.py --build-only --find-links ./wheels
 """
+import argparse
+import base64
+import compileall
+import hashlib
+import json
 import os
+import py_compile
+import re
+import shutil
+import struct
 import sys
 import boto3
-import zipfile
-import io
 import subprocess
 import tempfile
 import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
 REGION = os.getenv("AWS_REGION", "us-east-1")
 STACK_NAME = "userinfoagent-memory-infrastructure-02"
+FUNCTION_DIR = "functions/memory_processor"
+# Modules shared with the agent runtime, packaged next to the handler
+SHARED_MODULES = ["src/tracing.py", "src/scrubber.py"]
+# Installed for the Lambda Python 3.11 runtime; jmespath, s3transfer etc. come from the runtime
+REQUIREMENTS = ["boto3", "botocore", "urllib3"]
+PIP_PLATFORM_ARGS = [
+    "--platform", "linux_x86_64",
+    "--implementation", "cp",
+    "--python-version", "3.11",
+    "--only-binary=:all:",
+    "--no-deps",
+]
+# Services the handler creates clients for; --optimize drops every other botocore model
+LAMBDA_SERVICES = {"s3", "bedrock-runtime", "bedrock-agentcore"}
+# Provided by the Lambda Python runtime in a version botocore accepts
+RUNTIME_PROVIDED = {"urllib3"}
+BUILD_DIR = "build"
+CACHE_DIR = os.path.join(BUILD_DIR, "cache")
+PACKAGE = os.path.join(BUILD_DIR, "memory_processor.zip")
+IMPORT_REPORT = os.path.join(BUILD_DIR, "lambda-importtime.json")
+# Import-time growth over the previous report that is flagged as a regression
+IMPORT_REGRESSION = 0.15
+# Bump when the way cached dependency trees are produced changes
+CACHE_VERSION = 1
+ZIP_WORKERS = os.cpu_count() or 4
+LAMBDA_TASK_ROOT = "/var/task"
+
+# ---------- dependencies ----------
+
+def dependencies_key(optimize, requirements=REQUIREMENTS):
+    """Hash of everything that determines the installed dependency tree."""
+    spec = {
+        "version": CACHE_VERSION,
+        "requirements": sorted(requirements),
+        "pip": PIP_PLATFORM_ARGS,
+        "optimize": optimize,
+        "services": sorted(LAMBDA_SERVICES) if optimize else None,
+        "runtime_provided": sorted(RUNTIME_PROVIDED) if optimize else None,
+        # Bytecode is only produced when building with the runtime's Python
+        "python": f"{sys.version_info[0]}.{sys.version_info[1]}" if optimize else None,
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+def install_dependencies(cache_dir=CACHE_DIR, optimize=False, find_links=None, refresh=False):
+    """
+    Return a directory holding the installed (and, with `optimize`, trimmed and
+    precompiled) dependencies, installing them only if no cached tree exists
+    for the current requirements. `find_links` installs from a local
+    wheelhouse without contacting an index.
+    """
+    deps_dir = os.path.join(cache_dir, f"deps-{dependencies_key(optimize)}")
+    if os.path.isdir(deps_dir) and not refresh:
+        print(f"Reusing dependencies from {deps_dir}")
+        return deps_dir
+
+    print("Installing dependencies for Lambda Python 3.11...")
+    os.makedirs(cache_dir, exist_ok=True)
+    # Installed next to the cache entry and renamed into place, so an interrupted
+    # install never leaves a partial tree behind under the final name
+    staging = tempfile.mkdtemp(prefix=".deps-", dir=cache_dir)
+    try:
+        index_args = ["--no-index", "--find-links", find_links] if find_links else []
+        subprocess.run(
+            [sys.executable, "-m", "pip", "install", *REQUIREMENTS, "--target", staging,
+             *PIP_PLATFORM_ARGS, *index_args],
+            check=True,
+        )
+        if optimize:
+            optimize_dependencies(staging)
+        if os.path.isdir(deps_dir):
+            shutil.rmtree(deps_dir)
+        os.replace(staging, deps_dir)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return deps_dir
+
+def optimize_dependencies(deps_dir):
+    """
+    Drop what the handler never loads and precompile the rest. Lambda's
+    /var/task is read-only, so without bundled bytecode every cold start
+    compiles boto3 and botocore from source.
+    """
+    size_before = _tree_size(deps_dir)
+
+    data_dir = os.path.join(deps_dir, "botocore", "data")
+    for name in os.listdir(data_dir):
+        path = os.path.join(data_dir, name)
+        # Top-level files (endpoints, partitions, retry and default configuration) are always loaded
+        if os.path.isdir(path) and name not in LAMBDA_SERVICES:
+            shutil.rmtree(path)
+    # Resource models; the handler only uses clients
+    shutil.rmtree(os.path.join(deps_dir, "boto3", "data"), ignore_errors=True)
+    for name in os.listdir(deps_dir):
+        # The package itself and its dist-info directory
+        if name.split("-")[0].lower() in RUNTIME_PROVIDED:
+            shutil.rmtree(os.path.join(deps_dir, name))
+    # pip compiles with the local interpreter, which need not be the runtime's
+    for root, dirs, _ in os.walk(deps_dir):
+        if "__pycache__" in dirs:
+            shutil.rmtree(os.path.join(root, "__pycache__"))
+            dirs.remove("__pycache__")
+    compile_bytecode(deps_dir)
+
+    print(f"Optimized dependencies: {size_before / 1e6:.1f} MB -> {_tree_size(deps_dir) / 1e6:.1f} MB")
+
+def compile_bytecode(path):
+    if sys.version_info[:2] != (3, 11):
+        print(f"Skipping bytecode: building with Python {sys.version_info[0]}.{sys.version_info[1]}, Lambda runs 3.11")
+        return
+    # Hash-checked pycs stay valid whatever mtime the files get on the Lambda host, and
+    # recording the deployed paths instead of the build directory keeps them reproducible
+    compileall.compile_dir(
+        path, quiet=1, stripdir=path, prependdir=LAMBDA_TASK_ROOT,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+
+def _tree_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files
+    )
+
+# ---------- handler ----------
+
+def stage_handler(code_dir, optimize=False):
+    """Copy the handler (app.py as index.py), its sibling modules and the shared modules."""
+    for module in sorted(os.listdir(FUNCTION_DIR)):
+        if module.endswith('.py'):
+            target = 'index.py' if module == 'app.py' else module
+            shutil.copyfile(os.path.join(FUNCTION_DIR, module), os.path.join(code_dir, target))
+    for path in SHARED_MODULES:
+        shutil.copyfile(path, os.path.join(code_dir, os.path.basename(path)))
+    if optimize:
+        compile_bytecode(code_dir)
+
+# ---------- deterministic zip ----------
+
+# 1980-01-01 00:00:00, the earliest DOS timestamp, for every entry
+_DOS_TIME, _DOS_DATE = 0, (0 << 9) | (1 << 5) | 1
+_FILE_ATTRS = (0o100644 << 16)
+_UTF8_NAMES = 0x800
+
+def _package_files(roots):
+    """(arcname, path) for every file under `roots`, sorted; later roots win on conflicts."""
+    files = {}
+    for root_dir in roots:
+        for root, dirs, names in os.walk(root_dir):
+            dirs.sort()
+            for name in names:
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, root_dir).replace(os.sep, "/")] = path
+    return sorted(files.items())
+
+def _deflate(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    # zlib releases the GIL, so files are compressed concurrently by the worker threads
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    return zlib.crc32(data), len(data), compressed
+
+def write_zip(output_path, roots, workers=ZIP_WORKERS):
+    """
+    Zip the files under `roots` into `output_path`. Entries are sorted and carry
+    fixed timestamps and permissions, so unchanged inputs produce a byte-identical
+    archive. Compression runs on `workers` threads; at most a few files per worker
+    are held in memory while the archive is streamed to disk.
+    """
+    files = _package_files(roots)
+    if len(files) >= 0xFFFF:
+        raise ValueError(f"{len(files)} files need ZIP64, which this writer does not produce")
+
+    tmp_path = f"{output_path}.tmp"
+    central = []
+    with open(tmp_path, "wb") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        window = max(1, workers * 4)
+        for i in range(0, len(files), window):
+            batch = files[i:i + window]
+            for (arcname, _), (crc, size, data) in zip(batch, pool.map(_deflate, [p for _, p in batch])):
+                name = arcname.encode()
+                if len(data) > 0xFFFFFFFF or size > 0xFFFFFFFF:
+                    raise ValueError(f"{arcname} needs ZIP64, which this writer does not produce")
+                central.append((name, crc, len(data), size, out.tell()))
+                out.write(struct.pack(
+                    "<IHHHHHIIIHH", 0x04034B50, 20, _UTF8_NAMES, zipfile.ZIP_DEFLATED,
+                    _DOS_TIME, _DOS_DATE, crc, len(data), size, len(name), 0,
+                ))
+                out.write(name)
+                out.write(data)
+
+        directory_offset = out.tell()
+        for name, crc, compressed_size, size, offset in central:
+            out.write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | 20, 20, _UTF8_NAMES, zipfile.ZIP_DEFLATED,
+                _DOS_TIME, _DOS_DATE, crc, compressed_size, size, len(name), 0, 0, 0, 0,
+                _FILE_ATTRS, offset,
+            ))
+            out.write(name)
+        directory_size = out.tell() - directory_offset
+        out.write(struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, len(central), len(central), directory_size, directory_offset, 0,
+        ))
+    os.replace(tmp_path, output_path)
+    return len(central)
+
+def code_sha256(path):
+    """SHA-256 of a package, base64-encoded like Lambda's CodeSha256."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode()
+
+# ---------- import-time report ----------
 
-def update_lambda_code(memory_id=None):
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+_IMPORT_PROBE = """
+import json, time
+start = time.perf_counter()
+import index
+imported = time.perf_counter()
+for client in (index.s3, index.bedrock, index.agentcore):
+    client.get()
+print(json.dumps({"import_ms": (imported - start) * 1000, "clients_ms": (time.perf_counter() - imported) * 1000}))
+"""
+
+def import_time_report(code_dir, report_path=IMPORT_REPORT, deps_dir=None, runs=3, top=15):
+    """
+    Import the packaged handler the way a cold start does (`python -X importtime`)
+    and write the fastest of `runs` runs to `report_path`: total import time,
+    time to create the boto3 clients, and the slowest top-level imports.
+    Compares against the report left by the previous build, if any.
+    """
+    env = dict(
+        os.environ,
+        AGENTCORE_MEMORY_ID="import-report",
+        MY_BEDROCK_MODEL_ID="import-report",
+        AWS_REGION=REGION,
+        # Nothing may be written into the package being measured
+        PYTHONDONTWRITEBYTECODE="1",
+    )
+    if deps_dir:
+        env["PYTHONPATH"] = os.path.abspath(deps_dir)
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _IMPORT_PROBE],
+            cwd=code_dir, env=env, capture_output=True, text=True, check=True,
+        )
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        if best is None or timings["import_ms"] < best[0]["import_ms"]:
+            best = (timings, result.stderr)
+
+    timings, stderr = best
+    modules = []
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_LINE.match(line)
+        if m:
+            modules.append({
+                "module": m.group(4),
+                "depth": len(m.group(3)) // 2,
+                "self_us": int(m.group(1)),
+                "cumulative_us": int(m.group(2)),
+            })
+    report = {
+        "python": f"{sys.version_info[0]}.{sys.version_info[1]}",
+        "import_ms": round(timings["import_ms"], 1),
+        "clients_ms": round(timings["clients_ms"], 1),
+        "modules": len(modules),
+        "slowest": sorted(
+            (m for m in modules if m["depth"] == 0), key=lambda m: m["cumulative_us"], reverse=True
+        )[:top],
+    }
+
+    previous = None
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            previous = json.load(f)
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Import time: {report['import_ms']} ms import, {report['clients_ms']} ms clients, "
+          f"{report['modules']} modules (report: {report_path})")
+    for m in report["slowest"][:5]:
+        print(f"  {m['cumulative_us'] / 1000:8.1f} ms  {m['module']}")
+    if previous:
+        for key in ("import_ms", "clients_ms"):
+            before, after = previous.get(key), report[key]
+            if before and after > before * (1 + IMPORT_REGRESSION):
+                print(f"WARNING: {key} regressed from {before} to {after}")
+    return report
+
+# ---------- build ----------
+
+def build_package(output_path=PACKAGE, cache_dir=CACHE_DIR, optimize=False, import_report=IMPORT_REPORT,
+                  find_links=None, refresh=False):
+    """Build the deployment zip at `output_path` without touching AWS; returns its CodeSha256."""
+    start = time.perf_counter()
+    deps_dir = install_dependencies(cache_dir, optimize=optimize, find_links=find_links, refresh=refresh)
+    deps_done = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as code_dir:
+        stage_handler(code_dir, optimize=optimize)
+        if import_report:
+            import_time_report(code_dir, import_report, deps_dir=deps_dir)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        zip_start = time.perf_counter()
+        entries = write_zip(output_path, [deps_dir, code_dir])
+        zip_done = time.perf_counter()
+
+    sha = code_sha256(output_path)
+    print(f"Built {output_path}: {entries} files, {os.path.getsize(output_path) / 1e6:.1f} MB "
+          f"(dependencies {deps_done - start:.1f}s, zip {zip_done - zip_start:.1f}s, sha256 {sha})")
+    return sha
+
+# ---------- deploy ----------
+
+def wait_for_update(lambda_client, function_name, timeout=300, interval=0.5):
+    """Poll LastUpdateStatus until a code/configuration update has finished; returns the configuration."""
+    deadline = time.monotonic() + timeout
+    while True:
+        config = lambda_client.get_function_configuration(FunctionName=function_name)
+        status = config.get("LastUpdateStatus", "Successful")
+        if status == "Successful":
+            return config
+        if status == "Failed":
+            raise RuntimeError(f"Update of {function_name} failed: {config.get('LastUpdateStatusReason')}")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{function_name} still {status} after {timeout}s")
+        time.sleep(interval)
+
+def update_lambda_code(memory_id=None, optimize=False, import_report=IMPORT_REPORT, find_links=None,
+                       refresh=False):
     """Update Lambda function with code and dependencies"""
     try:
         # Get Lambda function name from CloudFormation
         cf = boto3.client("cloudformation", region_name=REGION)
         lambda_client = boto3.client("lambda", region_name=REGION)
-        
+
         # Get stack outputs
         response = cf.describe_stacks(StackName=STACK_NAME)
         outputs = response['Stacks'][0]['Outputs']
-        
+
         # Find Lambda function ARN
         lambda_arn = None
         for output in outputs:
             if output['OutputKey'] == 'LambdaFunctionArn':
                 lambda_arn = output['OutputValue']
                 break
-        
+
         if not lambda_arn:
             print("Error: Could not find Lambda function ARN in stack outputs")
             return False
-        
+
         function_name = lambda_arn.split(':')[-1]
-        
-        # Create temporary directory for building package
-        with tempfile.TemporaryDirectory() as temp_dir:
-            print("Installing dependencies for Lambda Python 3.11...")
-            
-            # Install only essential packages with correct platform
-            subprocess.run([
-                "pip", "install", 
-                "boto3", "botocore", "urllib3",
-                "--target", temp_dir,
-                "--platform", "linux_x86_64",
-                "--implementation", "cp",
-                "--python-version", "3.11",
-                "--only-binary=:all:",
-                "--no-deps"
-            ], check=True)
-            
-            # Read lambda function code
-            with open('functions/memory_processor/app.py', 'r') as f:
-                code_content = f.read()
-            
-            # Write lambda code to temp directory
-            with open(os.path.join(temp_dir, 'index.py'), 'w') as f:
-                f.write(code_content)
-            
-            # Create zip file
-            zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for root, dirs, files in os.walk(temp_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arc_name = os.path.relpath(file_path, temp_dir)
-                        zip_file.write(file_path, arc_name)
-            
-            zip_buffer.seek(0)
-            
+        start = time.perf_counter()
+
+        sha = build_package(optimize=optimize, import_report=import_report, find_links=find_links,
+                            refresh=refresh)
+
+        # Also waits out an update still running from a previous deploy
+        config = wait_for_update(lambda_client, function_name)
+        if config["CodeSha256"] == sha:
+            print(f"Code of {function_name} is unchanged, skipping upload")
+        else:
             print(f"Updating Lambda function {function_name}...")
-            
-            # Update Lambda function code
-            lambda_client.update_function_code(
-                FunctionName=function_name,
-                ZipFile=zip_buffer.read()
-            )
-            
-            # Wait for code update to complete before updating configuration
-            if memory_id:
-                print("Waiting for code update to complete...")
-                time.sleep(10)
-            
-            # Update environment variables if memory_id provided
-            if memory_id:
+            with open(PACKAGE, "rb") as f:
+                lambda_client.update_function_code(FunctionName=function_name, ZipFile=f.read())
+            config = wait_for_update(lambda_client, function_name)
+
+        # Update environment variables if memory_id provided, keeping the ones set by the stack
+        if memory_id:
+            variables = dict(config.get("Environment", {}).get("Variables", {}))
+            wanted = dict(variables, AGENTCORE_MEMORY_ID=memory_id,
+                          MY_BEDROCK_MODEL_ID='anthropic.claude-3-haiku-20240307-v1:0')
+            if wanted != variables:
                 print(f"Updating environment variables with memory ID: {memory_id}")
                 lambda_client.update_function_configuration(
                     FunctionName=function_name,
-                    Environment={
-                        'Variables': {
-                            'AGENTCORE_MEMORY_ID': memory_id,
-                            'MY_BEDROCK_MODEL_ID': 'anthropic.claude-3-haiku-20240307-v1:0'
-                        }
-                    }
+                    Environment={'Variables': wanted}
                 )
-            
-            print(f"Updated Lambda function {function_name} with new code and dependencies")
-            return True
-        
+                wait_for_update(lambda_client, function_name)
+
+        print(f"Updated Lambda function {function_name} in {time.perf_counter() - start:.1f}s")
+        return True
+
     except Exception as e:
         print(f"Error: Could not update Lambda function: {str(e)}")
         return False
 
 if __name__ == "__main__":
-    memory_id = sys.argv[1] if len(sys.argv) > 1 else None
-    if not memory_id:
-        print("Usage: python update_lambda_minimal.py <MEMORY_ID>")
-        sys.exit(1)
-    
-    print(f"Using memory ID: {memory_id}")
-    success = update_lambda_code(memory_id)
-    exit(0 if success else 1)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Package and deploy the memory processor Lambda")
+    parser.add_argument("memory_id", nargs="?", help="AgentCore memory ID for the function's environment")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Precompile bytecode and drop botocore models and packages the handler never loads")
+    parser.add_argument("--import-report", default=IMPORT_REPORT,
+                        help=f"Where to write the import-time report (default {IMPORT_REPORT}); '' to skip")
+    parser.add_argument("--build-only", action="store_true",
+                        help=f"Only build {PACKAGE}; no AWS calls")
+    parser.add_argument("--find-links", help="Install dependencies from this local wheel directory only")
+    parser.add_argument("--refresh-deps", action="store_true",
+                        help="Reinstall dependencies even if a cached tree exists")
+    args = parser.parse_args()
+
+    if args.build_only:
+        build_package(optimize=args.optimize, import_report=args.import_report, find_links=args.find_links,
+                      refresh=args.refresh_deps)
+        sys.exit(0)
+    if not args.memory_id:
+        parser.error("memory_id is required unless --build-only is given")
+
+    print(f"Using memory ID: {args.memory_id}")
+    success = update_lambda_code(args.memory_id, optimize=args.optimize, import_report=args.import_report,
+                                 find_links=args.find_links, refresh=args.refresh_deps)
+    exit(0 if success else 1)
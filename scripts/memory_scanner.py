@@ -0,0 +1,146 @@
+"""
+Streaming, paginated scanner for AgentCore memory records
+"""
+import csv
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PAGE_SIZE = 100  # maxResults accepted by list_memory_records
+
+_DONE = object()
+
+
+class ScanStats:
+    """Pages and records seen by a scan, safe to update from several threads"""
+
+    def __init__(self):
+        self.pages = 0
+        self.records = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_page(self, records):
+        with self._lock:
+            self.pages += 1
+            self.records += records
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def records_per_second(self):
+        return self.records / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.records} records in {self.pages} pages, "
+                f"{self.elapsed:.2f}s ({self.records_per_second:.1f} records/s)")
+
+
+def scan_records(client, memory_id, namespace="/", page_size=PAGE_SIZE, stats=None):
+    """Yield memory record summaries one by one, fetching the next page only when needed"""
+    kwargs = {"memoryId": memory_id, "namespace": namespace, "maxResults": page_size}
+    while True:
+        response = client.list_memory_records(**kwargs)
+        records = response.get("memoryRecordSummaries", [])
+        if stats is not None:
+            stats.add_page(len(records))
+        yield from records
+
+        token = response.get("nextToken")
+        if not token:
+            return
+        kwargs["nextToken"] = token
+
+
+def scan_namespaces(client, memory_id, namespaces, max_workers=4, page_size=PAGE_SIZE, stats=None, buffer=1000):
+    """
+    Scan several namespaces in parallel, yielding (namespace, record) pairs.
+
+    Workers hand records over through a bounded queue, so a slow consumer
+    pauses the scan instead of buffering whole namespaces in memory.
+    """
+    namespaces = list(namespaces)
+    if not namespaces:
+        return
+    out = queue.Queue(maxsize=buffer)
+    stop = threading.Event()
+
+    def _worker(namespace):
+        try:
+            for record in scan_records(client, memory_id, namespace, page_size, stats):
+                if stop.is_set():
+                    return
+                out.put((namespace, record))
+        except Exception as e:
+            out.put((namespace, e))
+        finally:
+            out.put(_DONE)
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(namespaces)))
+    for namespace in namespaces:
+        pool.submit(_worker, namespace)
+
+    remaining = len(namespaces)
+    try:
+        while remaining:
+            item = out.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            namespace, record = item
+            if isinstance(record, Exception):
+                raise record
+            yield namespace, record
+    finally:
+        stop.set()
+        # Unblock workers waiting on a full queue
+        while remaining:
+            try:
+                if out.get(timeout=0.1) is _DONE:
+                    remaining -= 1
+            except queue.Empty:
+                pass
+        pool.shutdown(wait=True)
+
+
+def _row(namespace, record):
+    timestamp = record.get("timestamp", "")
+    return {
+        "namespace": namespace,
+        "memoryRecordId": record.get("memoryRecordId", ""),
+        "text": record.get("content", {}).get("text", ""),
+        "timestamp": str(timestamp),
+    }
+
+
+def write_jsonl(items, path):
+    """Stream (namespace, record) pairs to a JSONL file; returns the count written"""
+    count = 0
+    with open(path, "w") as f:
+        for namespace, record in items:
+            f.write(json.dumps(_row(namespace, record), default=str) + "\n")
+            count += 1
+    return count
+
+
+def write_csv(items, path):
+    """Stream (namespace, record) pairs to a CSV file; returns the count written"""
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["namespace", "memoryRecordId", "text", "timestamp"])
+        writer.writeheader()
+        for namespace, record in items:
+            writer.writerow(_row(namespace, record))
+            count += 1
+    return count
+
+
+def write_records(items, path):
+    """Pick the output format from the file extension (.csv, otherwise JSONL)"""
+    if path.endswith(".csv"):
+        return write_csv(items, path)
+    return write_jsonl(items, path)
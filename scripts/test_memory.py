@@ -6,6 +6,8 @@ import boto3
 import sys
 from datetime import datetime, timezone
 
+from memory_scanner import ScanStats, scan_records
+
 REGION = "us-east-1"
 
 def test_memory(memory_id):
@@ -32,17 +34,18 @@ def test_memory(memory_id):
     
     # Read back records
     print("\nReading memory records...")
-    response = client.list_memory_records(memoryId=memory_id, namespace="/")
-    
-    records = response.get("memoryRecordSummaries", [])
-    print(f"Found {len(records)} total records:")
-    
-    for record in records:
+    stats = ScanStats()
+    count = 0
+    for record in scan_records(client, memory_id, namespace="/", stats=stats):
         content = record.get("content", {})
-        timestamp = record.get("timestamp", "")
+        timestamp = str(record.get("timestamp", ""))
         print(f"  - {content.get('text', 'N/A')} (created: {timestamp[:19]})")
+        count += 1
+    
+    print(f"Found {count} total records")
+    print(f"Scanned {stats.summary()}")
     
-    return len(records)
+    return count
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
@@ -0,0 +1,281 @@
+"""
+Admission control for the agent entrypoint.
+
+Each invocation holds one of `max_concurrent` global slots for as long as it
+streams, which bounds the MCP sessions and Bedrock streams open at once.
+Per actor, a token bucket limits the request rate and a counter limits how
+many of that actor's requests run or wait at the same time, so a burst from
+one user cannot take every slot. Requests that find all slots busy wait in a
+bounded FIFO queue until `queue_timeout`; once the queue is full they are
+rejected immediately. Rejections carry a retry hint derived from the current
+queue depth and the average time a slot is held.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+# Token bucket per actor: sustained requests per second (0 disables) and burst size
+ACTOR_RATE_PER_SECOND = float(os.getenv("ACTOR_RATE_PER_SECOND", "1"))
+ACTOR_BURST = float(os.getenv("ACTOR_BURST", "10"))
+# Requests of one actor running or queued at once (0 disables)
+ACTOR_MAX_CONCURRENT = int(os.getenv("ACTOR_MAX_CONCURRENT", "4"))
+
+# Actors whose bucket and counters are tracked; the least recently seen idle ones are forgotten
+_MAX_ACTORS = 10_000
+# Recent queue waits kept for the wait-time percentiles
+_WAIT_SAMPLES = 1024
+# Initial estimate of how long a request holds a slot, before any has finished
+_DEFAULT_HOLD_SECONDS = 5.0
+
+
+class Rejected(Exception):
+    """
+    The request was not admitted. `status` is 429 for per-actor limits and
+    503 when the instance is saturated; `retry_after` is in seconds.
+    """
+
+    def __init__(self, reason: str, retry_after: float, status: int):
+        super().__init__(f"request rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status = status
+
+
+class _Actor:
+    __slots__ = ("tokens", "updated", "inflight")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+        self.inflight = 0
+
+
+class Permit:
+    """
+    A held slot. release() is idempotent and may be called from any thread.
+    """
+
+    def __init__(self, controller: "AdmissionController", actor_id: str, wait_s: float, queued: int):
+        self._controller = controller
+        self._loop = asyncio.get_running_loop()
+        self._released = False
+        self.actor_id = actor_id
+        self.wait_ms = round(wait_s * 1000, 1)
+        # Position in the wait queue on arrival (0 when a slot was free)
+        self.queued = queued
+        self.admitted_at = time.monotonic()
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop or self._loop.is_closed():
+            self._controller._release(self)
+        else:
+            self._loop.call_soon_threadsafe(self._controller._release, self)
+
+
+class AdmissionController:
+    """
+    Global concurrency semaphore, bounded wait queue and per-actor limits.
+
+    State is guarded by a lock, but waiters are futures of the event loop the
+    entrypoint runs on, so admit() must always be awaited on that loop.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+        actor_rate: float = ACTOR_RATE_PER_SECOND,
+        actor_burst: float = ACTOR_BURST,
+        actor_max_concurrent: int = ACTOR_MAX_CONCURRENT,
+    ):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.actor_rate = actor_rate
+        self.actor_burst = max(actor_burst, 1.0)
+        self.actor_max_concurrent = actor_max_concurrent
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+        self._actors: "OrderedDict[str, _Actor]" = OrderedDict()
+        self._hold_avg = _DEFAULT_HOLD_SECONDS
+        self._waits: "deque[float]" = deque(maxlen=_WAIT_SAMPLES)
+        self.admitted = 0
+        self.queued_total = 0
+        self.max_queue_depth = 0
+        self.rejected = {"actor_rate": 0, "actor_concurrency": 0, "queue_full": 0, "queue_timeout": 0}
+
+    # ---------- admission ----------
+
+    async def admit(self, actor_id: str) -> Permit:
+        """
+        Wait for a slot and return its permit, or raise Rejected.
+        """
+        start = time.monotonic()
+        with self._lock:
+            actor = self._actor(actor_id, start)
+            if self.actor_max_concurrent and actor.inflight >= self.actor_max_concurrent:
+                raise self._reject("actor_concurrency", self._hold_avg, 429)
+            queued = len(self._waiters)
+            free = self._active < self.max_concurrent and not queued
+            if not free and queued >= self.max_queue:
+                raise self._reject("queue_full", self._queue_eta(queued), 503)
+            # Taken last, so requests rejected for any other reason cost the caller no token
+            self._take_token(actor, start)
+
+            if free:
+                self._active += 1
+                actor.inflight += 1
+                self.admitted += 1
+                return Permit(self, actor_id, 0.0, 0)
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            actor.inflight += 1
+            self.queued_total += 1
+            self.max_queue_depth = max(self.max_queue_depth, queued + 1)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except BaseException as e:
+            with self._lock:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over just as the wait ended; pass it on
+                    self._active -= 1
+                    self._wake()
+                else:
+                    waiter.cancel()
+                    self._remove_waiter(waiter)
+                actor.inflight -= 1
+                self._refund_token(actor)
+                if isinstance(e, asyncio.TimeoutError):
+                    raise self._reject("queue_timeout", self._queue_eta(len(self._waiters)), 503) from None
+            raise
+
+        wait = time.monotonic() - start
+        with self._lock:
+            self.admitted += 1
+            self._waits.append(wait)
+        return Permit(self, actor_id, wait, queued + 1)
+
+    def _take_token(self, actor: _Actor, now: float) -> None:
+        if not self.actor_rate:
+            return
+        actor.tokens = min(self.actor_burst, actor.tokens + (now - actor.updated) * self.actor_rate)
+        actor.updated = now
+        if actor.tokens < 1:
+            raise self._reject("actor_rate", (1 - actor.tokens) / self.actor_rate, 429)
+        actor.tokens -= 1
+
+    def _refund_token(self, actor: _Actor) -> None:
+        # Caller holds the lock; the request was never served
+        if self.actor_rate:
+            actor.tokens = min(self.actor_burst, actor.tokens + 1)
+
+    def _reject(self, reason: str, retry_after: float, status: int) -> Rejected:
+        # Caller holds the lock
+        self.rejected[reason] += 1
+        return Rejected(reason, retry_after, status)
+
+    def _queue_eta(self, queued: int) -> float:
+        # Slots free up about max_concurrent per average hold time
+        return self._hold_avg * (queued + 1) / self.max_concurrent
+
+    # ---------- release ----------
+
+    def _release(self, permit: Permit) -> None:
+        with self._lock:
+            held = time.monotonic() - permit.admitted_at
+            self._hold_avg += 0.1 * (held - self._hold_avg)
+            actor = self._actors.get(permit.actor_id)
+            if actor is not None:
+                actor.inflight -= 1
+            self._active -= 1
+            self._wake()
+
+    def _wake(self) -> None:
+        # Caller holds the lock; hands free slots to waiters in arrival order
+        while self._waiters and self._active < self.max_concurrent:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._active += 1
+                waiter.set_result(None)
+
+    def _remove_waiter(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _actor(self, actor_id: str, now: float) -> _Actor:
+        # Caller holds the lock
+        actor = self._actors.get(actor_id)
+        if actor is None:
+            actor = self._actors[actor_id] = _Actor(self.actor_burst, now)
+            if len(self._actors) > _MAX_ACTORS:
+                self._forget_idle_actor()
+        else:
+            self._actors.move_to_end(actor_id)
+        return actor
+
+    def _forget_idle_actor(self) -> None:
+        for actor_id, actor in self._actors.items():
+            if not actor.inflight:
+                del self._actors[actor_id]
+                return
+
+    # ---------- metrics ----------
+
+    @property
+    def saturated(self) -> bool:
+        return self._active >= self.max_concurrent
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "active": self._active,
+                "max_concurrent": self.max_concurrent,
+                "queue_depth": len(self._waiters),
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": self.admitted,
+                "queued": self.queued_total,
+                "rejected": dict(self.rejected),
+                "wait_p50_ms": _percentile_ms(waits, 50),
+                "wait_p95_ms": _percentile_ms(waits, 95),
+                "wait_max_ms": _percentile_ms(waits, 100),
+                "hold_avg_ms": round(self._hold_avg * 1000, 1),
+            }
+
+
+def _percentile_ms(ordered: list, pct: float) -> Optional[float]:
+    if not ordered:
+        return None
+    rank = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return round(ordered[rank] * 1000, 1)
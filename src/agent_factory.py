@@ -0,0 +1,104 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from strands import Agent
+from strands.models import BedrockModel
+
+from model.load import MODEL_ID, load_model
+
+
+class AgentTemplate:
+    """
+    The request-independent part of an Agent: system prompt and model.
+    """
+
+    def __init__(self, name: str, system_prompt: str, model_id: str = MODEL_ID, **agent_kwargs: Any):
+        self.name = name
+        self.system_prompt = system_prompt
+        self.model_id = model_id
+        self.agent_kwargs = agent_kwargs
+
+
+class AgentFactory:
+    """
+    Builds per-request Agents from pre-registered templates.
+
+    BedrockModel instances (and the boto3 client inside them) are created once
+    per model id and shared for the life of the process; they hold no
+    conversation state, so concurrent Agents can use the same one. Only the
+    per-request parts (tools bound to the borrowed MCP session, the memory
+    session manager, trace attributes) are attached in build().
+    """
+
+    def __init__(self, model_loader: Callable[[str], BedrockModel] = load_model):
+        self._model_loader = model_loader
+        self._models: Dict[str, BedrockModel] = {}
+        self._model_cost_us: Dict[str, int] = {}
+        self._templates: Dict[str, AgentTemplate] = {}
+        self._lock = threading.Lock()
+        self._builds = 0
+        self._saved_us_total = 0
+
+    def register(self, template: AgentTemplate) -> AgentTemplate:
+        with self._lock:
+            self._templates[template.name] = template
+        return template
+
+    def model(self, model_id: str = MODEL_ID) -> Tuple[BedrockModel, int]:
+        """
+        Return the shared model for `model_id` and the microseconds of setup
+        saved by not constructing it (0 on the call that creates it).
+        """
+        model = self._models.get(model_id)
+        if model is not None:
+            return model, self._model_cost_us[model_id]
+
+        with self._lock:
+            model = self._models.get(model_id)
+            if model is not None:
+                return model, self._model_cost_us[model_id]
+            start = time.perf_counter_ns()
+            model = self._model_loader(model_id)
+            self._model_cost_us[model_id] = (time.perf_counter_ns() - start) // 1000
+            self._models[model_id] = model
+            return model, 0
+
+    def build(
+        self,
+        name: str,
+        tools: Optional[List] = None,
+        session_manager=None,
+        model_id: Optional[str] = None,
+        **overrides: Any,
+    ) -> Tuple[Agent, int]:
+        """
+        Build an Agent from the `name` template, optionally on another model.
+
+        Returns the agent and the microseconds of setup saved for this request.
+        """
+        template = self._templates[name]
+        model, saved_us = self.model(model_id or template.model_id)
+
+        kwargs = dict(template.agent_kwargs)
+        kwargs.update(overrides)
+        agent = Agent(
+            model=model,
+            system_prompt=template.system_prompt,
+            tools=tools,
+            session_manager=session_manager,
+            **kwargs,
+        )
+
+        with self._lock:
+            self._builds += 1
+            self._saved_us_total += saved_us
+        return agent, saved_us
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "builds": self._builds,
+                "models": len(self._models),
+                "saved_us_total": self._saved_us_total,
+            }
@@ -1,19 +1,117 @@
+import asyncio
+import json
+import math
 import os
+import threading
+import time
 import uuid
-from strands import Agent
-from bedrock_agentcore.runtime import BedrockAgentCoreApp
-from bedrock_agentcore.memory.integrations.strands.config import AgentCoreMemoryConfig
-from bedrock_agentcore.memory.integrations.strands.session_manager import AgentCoreMemorySessionManager
-from mcp_client.client import get_streamable_http_mcp_client
-from model.load import load_model
+import weakref
+from functools import partial
+from bedrock_agentcore.runtime import BedrockAgentCoreApp, PingStatus
+from starlette.responses import JSONResponse
+from admission import AdmissionController, Rejected
+from streaming import STREAM_COALESCE, coalesce
+from tracing import Tracer
 
 app = BedrockAgentCoreApp()
 log = app.logger
 
 MEMORY_ID = os.getenv("BEDROCK_AGENTCORE_MEMORY_ID")
 REGION = os.getenv("AWS_REGION", "us-east-1")
+# eager: build the runtime at import; lazy: on the first invocation;
+# preload: in a background thread at import, so the server starts answering pings meanwhile
+STARTUP_MODE = os.getenv("STARTUP_MODE", "preload")
 
-mcp_client = get_streamable_http_mcp_client()
+tracer = Tracer("userinfoagent")
+
+# Global concurrency slots, bounded wait queue and per-actor limits (ADMISSION_*, ACTOR_*)
+admission = AdmissionController()
+
+class _Runtime:
+    """
+    strands, mcp, the AgentCore memory integration and the objects built from
+    them. They account for most of the import time, so they are imported here
+    rather than at module load and live for the whole process once built.
+    """
+
+    def __init__(self):
+        import boto3
+        from bedrock_agentcore.memory.integrations.strands.config import AgentCoreMemoryConfig
+        from mcp_client.federation import MCPFederation
+        from agent_factory import AgentFactory, AgentTemplate
+        from memory_cache import CachedMemorySessionManager, SessionMemoryCache
+        from tool_selection import ToolSelector
+        from model.load import load_model, select_model_id
+
+        self.AgentCoreMemoryConfig = AgentCoreMemoryConfig
+        self.CachedMemorySessionManager = CachedMemorySessionManager
+        self.select_model_id = select_model_id
+
+        # One boto3 session for every memory session manager, so service models are
+        # loaded once per process instead of once per turn. Loaded here, before the
+        # runtime is published, because clients must not be created concurrently.
+        self.boto_session = boto3.Session(region_name=REGION)
+        if MEMORY_ID:
+            for service in ("bedrock-agentcore", "bedrock-agentcore-control"):
+                self.boto_session.client(service)
+
+        # Long-lived MCP sessions per configured server (MCP_SERVERS), shared across
+        # invocations; tool lists are cached per session and namespaced per server.
+        self.mcp_pool = MCPFederation(
+            max_size=int(os.getenv("MCP_POOL_SIZE", "4")),
+            tools_ttl=float(os.getenv("MCP_TOOLS_TTL_SECONDS", "300")),
+            retry_after=float(os.getenv("MCP_SERVER_RETRY_SECONDS", "30")),
+        )
+
+        # Optional relevance ranking of the merged catalog (TOOL_SELECTION); indexes are kept per catalog
+        self.tool_selector = ToolSelector()
+
+        # Session/agent/message history restored per turn, kept between turns of the same session
+        self.memory_cache = SessionMemoryCache()
+
+        # Model clients live for the whole process; agents are built per request from this template.
+        self.agent_factory = AgentFactory(model_loader=partial(load_model, metrics_logger=log))
+        self.default_template = self.agent_factory.register(AgentTemplate(
+            name="jeni",
+            system_prompt=(
+                "You are a helpful assistant name Jeni, you like to say your name alot.\n"
+                "Use memory when it helps personalize answers.\n"
+                "Do not store or repeat highly sensitive identifiers."
+            ),
+            # Streamed text is returned to the caller; don't also echo every token to stdout
+            callback_handler=None,
+        ))
+
+    def preload(self) -> None:
+        """Create the default model's client, which loads the bedrock-runtime service model."""
+        self.agent_factory.model(self.default_template.model_id)
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+def get_runtime() -> _Runtime:
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                start = time.perf_counter()
+                _runtime = _Runtime()
+                log.info(f"runtime initialized in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return _runtime
+
+def _preload() -> None:
+    try:
+        get_runtime().preload()
+    except Exception:
+        # The first invocation retries and surfaces the error
+        log.exception("runtime preload failed")
+
+if STARTUP_MODE == "eager":
+    get_runtime().preload()
+elif STARTUP_MODE == "preload":
+    threading.Thread(target=_preload, name="runtime-preload", daemon=True).start()
+elif STARTUP_MODE != "lazy":
+    raise ValueError(f"Unsupported STARTUP_MODE: {STARTUP_MODE}")
 
 # ---------- helpers ----------
 
@@ -74,15 +172,33 @@ def _resolve_actor_id(payload, context) -> str:
 
     return "user"
 
+async def _text_fragments(stream):
+    async for event in stream:
+        if "data" in event and isinstance(event["data"], str):
+            yield event["data"]
+
+def _rejection(e: Rejected) -> JSONResponse:
+    return JSONResponse(
+        {"error": str(e), "reason": e.reason, "retry_after_ms": round(e.retry_after * 1000)},
+        status_code=e.status,
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+    )
+
 # ---------- entrypoint ----------
 
+@app.ping
+def ping():
+    # Busy while every slot is taken, so new sessions are routed to other instances
+    return PingStatus.HEALTHY_BUSY if admission.saturated else PingStatus.HEALTHY
+
 @app.entrypoint
 async def invoke(payload, context):
-    print("payload", payload)
+    """
+    Admit the request, then return its response stream. Rejected requests get
+    a 429 (per-actor limits) or 503 (instance saturated) with a Retry-After.
+    """
     payload = payload or {}
 
-    print("context", context)
-
     prompt = payload.get("prompt", "")
 
     session_id = _resolve_session_id(payload, context)
@@ -90,35 +206,109 @@ async def invoke(payload, context):
 
     log.info(f"runtime session_id={session_id} actor_id={actor_id}")
 
-    session_manager = None
-    if MEMORY_ID:
-        session_manager = AgentCoreMemorySessionManager(
-            agentcore_memory_config=AgentCoreMemoryConfig(
-                memory_id=MEMORY_ID,
-                session_id=session_id,
-                actor_id=actor_id,
-            ),
-            region_name=REGION,
-        )
+    trace = tracer.start_trace("invoke", session_id=session_id, actor_id=actor_id)
+    trace.set_payload("prompt", prompt)
+    try:
+        with trace.span("admission") as span:
+            permit = await admission.admit(actor_id)
+            span.set("wait_ms", permit.wait_ms)
+            span.set("queued", permit.queued)
+            if trace.sampled:
+                span.set("stats", admission.stats())
+    except Rejected as e:
+        trace.end(e)
+        log.warning("admission " + json.dumps({
+            "outcome": "rejected", "reason": e.reason, "retry_after_s": round(e.retry_after, 2),
+            "active": admission.active, "queue_depth": admission.queue_depth,
+        }))
+        return _rejection(e)
+    except BaseException as e:
+        trace.end(e)
+        raise
+    if permit.queued:
+        log.info("admission " + json.dumps({
+            "outcome": "queued", "wait_ms": permit.wait_ms, "position": permit.queued,
+            "active": admission.active, "queue_depth": admission.queue_depth,
+        }))
 
-    with mcp_client as client:
-        tools = client.list_tools_sync()
+    stream = _respond(prompt, session_id, actor_id, permit, trace)
+    # The stream releases its slot when it finishes; this covers one that is never started
+    weakref.finalize(stream, permit.release)
+    return stream
 
-        agent = Agent(
-            model=load_model(),
-            session_manager=session_manager,
-            system_prompt=(
-                "You are a helpful assistant name Jeni, you like to say your name alot.\n"
-                "Use memory when it helps personalize answers.\n"
-                "Do not store or repeat highly sensitive identifiers."
-            ),
-            tools=tools,
-        )
+async def _respond(prompt, session_id, actor_id, permit, trace):
+    error = None
+    try:
+        rt = _runtime
+        if rt is None:
+            # Built off the event loop, so pings and other requests are still served meanwhile
+            with trace.span("runtime_init"):
+                rt = await asyncio.to_thread(get_runtime)
+
+        session_manager = None
+        if MEMORY_ID:
+            with trace.span("memory_session_setup") as span:
+                session_manager = rt.CachedMemorySessionManager(
+                    agentcore_memory_config=rt.AgentCoreMemoryConfig(
+                        memory_id=MEMORY_ID,
+                        session_id=session_id,
+                        actor_id=actor_id,
+                    ),
+                    region_name=REGION,
+                    boto_session=rt.boto_session,
+                    cache=rt.memory_cache,
+                )
+                if trace.sampled:
+                    span.set("cache", rt.memory_cache.stats())
+
+        connect = trace.span("mcp_connect")
+        if trace.sampled:
+            connect.set("pool", rt.mcp_pool.stats())
+        async with rt.mcp_pool.session_async() as mcp_session:
+            connect.end()
+            with trace.span("tool_listing") as span:
+                tools = mcp_session.tools
+                span.set("tools", len(tools))
+                if mcp_session.missing:
+                    span.set("servers_missing", mcp_session.missing)
+
+            if rt.tool_selector.enabled:
+                with trace.span("tool_selection") as span:
+                    selection = rt.tool_selector.select(prompt, tools)
+                    tools = selection.tools
+                    span.set("tools", len(tools))
+                    span.set("tokens_saved", selection.tokens_saved)
+                    if trace.sampled:
+                        span.set("selected", selection.names)
+
+            with trace.span("agent_build") as span:
+                agent, saved_us = rt.agent_factory.build(
+                    "jeni",
+                    tools=tools,
+                    session_manager=session_manager,
+                    model_id=rt.select_model_id(prompt),
+                    trace_attributes={"session.id": session_id, "user.id": actor_id},
+                )
+                span.set("saved_us", saved_us)
+            # Logged on every request: spans are only recorded for sampled traces
+            log.info("agent setup " + json.dumps({"saved_us": saved_us, **rt.agent_factory.stats()}))
 
-        stream = agent.stream_async(prompt)
-        async for event in stream:
-            if "data" in event and isinstance(event["data"], str):
-                yield event["data"]
+            with trace.span("model_stream", coalesce=STREAM_COALESCE) as span:
+                start = time.perf_counter()
+                chunks = 0
+                stream = agent.stream_async(prompt)
+                async for chunk in coalesce(_text_fragments(stream)):
+                    if not chunks:
+                        span.set("ttft_ms", round((time.perf_counter() - start) * 1000, 1))
+                    chunks += 1
+                    yield chunk
+                span.set("chunks", chunks)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        permit.release()
+        trace.end(error)
 
 if __name__ == "__main__":
     app.run()
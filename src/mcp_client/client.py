@@ -1,12 +1,64 @@
+import os
+import re
+from typing import List, Optional
+
 from mcp.client.streamable_http import streamablehttp_client
 from strands.tools.mcp.mcp_client import MCPClient
 
 # ExaAI provides information about code through web searches, crawling and code context searches through their platform. Requires no authentication
 EXAMPLE_MCP_ENDPOINT = "https://mcp.exa.ai/mcp"
+# Override to point the agent at another streamable-HTTP server (e.g. the local benchmark stand-in)
+MCP_ENDPOINT = os.getenv("MCP_ENDPOINT", EXAMPLE_MCP_ENDPOINT)
+# Several servers: "name=url[;timeout=seconds],..." (MCP_ENDPOINT is used when unset)
+MCP_SERVERS = os.getenv("MCP_SERVERS", "")
+# How long a request waits for a server's session (connect + list_tools when cold) before going on without it
+MCP_SERVER_TIMEOUT_SECONDS = float(os.getenv("MCP_SERVER_TIMEOUT_SECONDS", "10"))
+
+
+class MCPServer:
+    """
+    One streamable-HTTP MCP server. With several servers, tool names are
+    prefixed with the server name ("exa_web_search") so they cannot collide.
+    """
+
+    def __init__(self, name: str, url: str, timeout: float = MCP_SERVER_TIMEOUT_SECONDS, prefix: Optional[str] = None):
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self.prefix = prefix
+
+
+def load_servers(spec: str = MCP_SERVERS) -> List[MCPServer]:
+    if not spec.strip():
+        return [MCPServer("default", MCP_ENDPOINT)]
+
+    servers = []
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        name, sep, rest = entry.partition("=")
+        url, *options = rest.split(";")
+        if not sep or not name.strip() or not url.strip():
+            raise ValueError(f"Unsupported MCP_SERVERS entry: {entry}")
+        server = MCPServer(name.strip(), url.strip())
+        for option in options:
+            key, _, value = option.partition("=")
+            if key.strip() != "timeout":
+                raise ValueError(f"Unsupported MCP_SERVERS option: {option}")
+            server.timeout = float(value)
+        servers.append(server)
+
+    if len({s.name for s in servers}) != len(servers):
+        raise ValueError(f"Duplicate server names in MCP_SERVERS: {spec}")
+    if len(servers) > 1:
+        for server in servers:
+            # Agent tool names allow letters, digits, '_' and '-' only
+            server.prefix = re.sub(r"[^A-Za-z0-9_-]", "_", server.name)
+    return servers
+
 
-def get_streamable_http_mcp_client() -> MCPClient:
+def get_streamable_http_mcp_client(server: Optional[MCPServer] = None) -> MCPClient:
     """
     Returns an MCP Client compatible with Strands
     """
+    server = server or MCPServer("default", MCP_ENDPOINT)
     # to use an MCP server that supports bearer authentication, add headers={"Authorization": f"Bearer {access_token}"}
-    return MCPClient(lambda: streamablehttp_client(EXAMPLE_MCP_ENDPOINT))
\ No newline at end of file
+    return MCPClient(lambda: streamablehttp_client(server.url), prefix=server.prefix)
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Dict, List, Optional
+
+from mcp_client.client import MCPServer, get_streamable_http_mcp_client, load_servers
+from mcp_client.pool import (
+    DEFAULT_POOL_SIZE,
+    DEFAULT_TOOLS_TTL_SECONDS,
+    MCPSessionPool,
+    PoolExhausted,
+    PooledMCPSession,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_SECONDS = 30.0
+
+
+class FederatedSession:
+    """
+    One pooled session per reachable server, borrowed for a single request.
+
+    Each server's client is created with its name as tool prefix, and every
+    MCP tool stays bound to the client it was listed from, so the merged
+    catalog is namespaced and tool calls go back to the right session.
+    """
+
+    def __init__(self, sessions: Dict[str, PooledMCPSession], missing: List[str]):
+        self.sessions = sessions
+        self.missing = missing
+        self._tools: Optional[List] = None
+
+    @property
+    def tools(self) -> List:
+        """
+        Merged catalog of the borrowed sessions, built from their cached lists.
+        """
+        if self._tools is None:
+            if len(self.sessions) == 1:
+                self._tools = next(iter(self.sessions.values())).tools
+            else:
+                seen, tools = set(), []
+                for name, session in self.sessions.items():
+                    for tool in session.tools:
+                        if tool.tool_name in seen:
+                            logger.warning(f"MCP server {name}: duplicate tool {tool.tool_name} ignored")
+                            continue
+                        seen.add(tool.tool_name)
+                        tools.append(tool)
+                self._tools = tools
+        return self._tools
+
+
+class MCPFederation:
+    """
+    Session pools for a set of MCP servers, borrowed together per request.
+
+    Idle sessions are taken without leaving the event loop; servers without
+    one are connected concurrently, each bounded by its own timeout. A server
+    that times out or fails is left out of that request and skipped for
+    `retry_after` seconds, so one slow server cannot hold up requests. A
+    session that arrives after its timeout is returned to its pool for the
+    next request. Waiting while all of a server's sessions are lent out, or
+    being opened for other requests, is bounded by the same timeout, but is
+    done on the event loop and does not put the server on hold; only a probe
+    or connect made for this request that is still running at the timeout
+    does.
+    """
+
+    def __init__(
+        self,
+        servers: Optional[List[MCPServer]] = None,
+        max_size: int = DEFAULT_POOL_SIZE,
+        tools_ttl: float = DEFAULT_TOOLS_TTL_SECONDS,
+        retry_after: float = DEFAULT_RETRY_SECONDS,
+    ):
+        self.servers = {server.name: server for server in (servers or load_servers())}
+        self.pools = {
+            name: MCPSessionPool(partial(get_streamable_http_mcp_client, server), max_size=max_size, tools_ttl=tools_ttl)
+            for name, server in self.servers.items()
+        }
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._unavailable_until: Dict[str, float] = {}
+        # Servers with a late session still on its way; not asked again until it lands
+        self._connecting: set = set()
+        self._counters = {name: {"timeouts": 0, "failures": 0, "busy": 0, "skipped": 0} for name in self.servers}
+
+    # ---------- borrowing ----------
+
+    @asynccontextmanager
+    async def session_async(self):
+        sessions: Dict[str, PooledMCPSession] = {}
+        pending = []
+        now = time.monotonic()
+        for name, pool in self.pools.items():
+            session = pool.try_acquire()
+            if session is not None:
+                sessions[name] = session
+            elif name in self._connecting or self._unavailable_until.get(name, 0.0) > now:
+                self._count(name, "skipped")
+            else:
+                pending.append(name)
+
+        if pending:
+            results = await asyncio.gather(*(self._acquire(name) for name in pending))
+            sessions.update((name, session) for name, session in zip(pending, results) if session is not None)
+
+        # Keep the configured order so the merged catalog is stable across requests
+        sessions = {name: sessions[name] for name in self.pools if name in sessions}
+        missing = [name for name in self.pools if name not in sessions]
+        healthy = True
+        try:
+            yield FederatedSession(sessions, missing)
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            for name, session in sessions.items():
+                self.pools[name].release(session, healthy=healthy)
+
+    async def _acquire(self, name: str) -> Optional[PooledMCPSession]:
+        server, pool = self.servers[name], self.pools[name]
+        deadline = time.monotonic() + server.timeout
+        delay = 0.005
+        while True:
+            if self._exhausted(pool):
+                # Every session is lent out or being opened by other requests: wait on
+                # the event loop instead of parking an executor thread
+                if time.monotonic() + delay > deadline:
+                    logger.warning(f"MCP server {name}: all {pool.max_size} sessions busy, continuing without it")
+                    self._count(name, "busy")
+                    return None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+                if name in self._connecting:
+                    # Another request's connect timed out meanwhile and put the server on hold
+                    self._count(name, "skipped")
+                    return None
+                session = pool.try_acquire()
+                if session is not None:
+                    return session
+                continue
+
+            # The thread never waits for other borrowers, so it only runs this request's own probe or connect
+            remaining = max(deadline - time.monotonic(), 0.001)
+            task = asyncio.ensure_future(asyncio.to_thread(pool.acquire, remaining, False))
+            try:
+                session = await asyncio.wait_for(asyncio.shield(task), remaining)
+            except PoolExhausted:
+                # Lost the free slot to another request; the server is not at fault
+                continue
+            except asyncio.TimeoutError:
+                task.add_done_callback(partial(self._release_late, name))
+                logger.warning(f"MCP server {name}: no session within {server.timeout}s, continuing without it")
+                self._connecting.add(name)
+                self._mark_unavailable(name, "timeouts")
+                return None
+            except Exception as e:
+                logger.warning(f"MCP server {name} unavailable: {e}")
+                self._mark_unavailable(name, "failures")
+                return None
+            with self._lock:
+                self._unavailable_until.pop(name, None)
+            return session
+
+    @staticmethod
+    def _exhausted(pool: MCPSessionPool) -> bool:
+        stats = pool.stats()
+        return not stats["idle"] and stats["size"] >= stats["max_size"]
+
+    def _release_late(self, name: str, task: asyncio.Future) -> None:
+        self._connecting.discard(name)
+        if not task.cancelled() and task.exception() is None:
+            self.pools[name].release(task.result())
+
+    def _mark_unavailable(self, name: str, counter: str) -> None:
+        with self._lock:
+            self._unavailable_until[name] = time.monotonic() + self.retry_after
+            self._counters[name][counter] += 1
+
+    def _count(self, name: str, counter: str) -> None:
+        with self._lock:
+            self._counters[name][counter] += 1
+
+    # ---------- lifecycle ----------
+
+    def warm(self, count: int = 1) -> None:
+        """
+        Pre-open sessions on every server concurrently; unreachable servers are logged and skipped.
+        """
+        def _warm(name: str) -> None:
+            try:
+                self.pools[name].warm(count)
+            except Exception as e:
+                logger.warning(f"MCP server {name}: warm-up failed: {e}")
+
+        threads = [threading.Thread(target=_warm, args=(name,), daemon=True) for name in self.pools]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def close(self) -> None:
+        for pool in self.pools.values():
+            pool.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {name: dict(c) for name, c in self._counters.items()}
+        return {name: {**pool.stats(), **counters[name]} for name, pool in self.pools.items()}
@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, List, Optional
+
+from strands.tools.mcp.mcp_client import MCPClient
+
+from mcp_client.client import get_streamable_http_mcp_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TOOLS_TTL_SECONDS = 300.0
+DEFAULT_HEALTH_CHECK_SECONDS = 60.0
+DEFAULT_ACQUIRE_TIMEOUT_SECONDS = 30.0
+
+
+class PoolExhausted(TimeoutError):
+    """Every session is lent out or being opened by another borrower."""
+
+
+class PooledMCPSession:
+    """
+    A started MCPClient plus the tool catalog listed from it.
+
+    MCP tools returned by list_tools_sync() are bound to the client they were
+    listed from, so the cached catalog lives on the session, not on the pool.
+    """
+
+    def __init__(self, client: MCPClient):
+        self.client = client
+        self._tools: Optional[List] = None
+        self.listed_at = 0.0
+        self.last_used = time.monotonic()
+        self.needs_check = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    @property
+    def tools(self) -> List:
+        """
+        Cached tool list; listed synchronously only the first time.
+        """
+        if self._tools is None:
+            self.refresh_tools()
+        return self._tools
+
+    def is_stale(self, ttl: float) -> bool:
+        return time.monotonic() - self.listed_at > ttl
+
+    def refresh_tools(self) -> List:
+        tools = self.client.list_tools_sync()
+        with self._lock:
+            self._tools = list(tools)
+            self.listed_at = time.monotonic()
+            self.needs_check = False
+        return self._tools
+
+    def start_refresh(self) -> bool:
+        """
+        Mark the session as refreshing. Returns False if a refresh is already in flight.
+        """
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def finish_refresh(self) -> None:
+        with self._lock:
+            self._refreshing = False
+
+    def close(self) -> None:
+        try:
+            self.client.stop(None, None, None)
+        except Exception as e:
+            logger.warning(f"error closing MCP session: {e}")
+
+
+class MCPSessionPool:
+    """
+    Process-wide pool of long-lived MCP sessions.
+
+    Sessions are started once and borrowed per invocation, so warm requests
+    skip both the streamable-HTTP handshake and list_tools. Tool catalogs are
+    refreshed in the background once they are older than `tools_ttl`; idle
+    sessions are probed before being handed out again.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], MCPClient] = get_streamable_http_mcp_client,
+        max_size: int = DEFAULT_POOL_SIZE,
+        tools_ttl: float = DEFAULT_TOOLS_TTL_SECONDS,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_SECONDS,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT_SECONDS,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._factory = factory
+        self.max_size = max_size
+        self.tools_ttl = tools_ttl
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: List[PooledMCPSession] = []
+        # Sessions counted in _size: idle, lent out, or still being opened
+        self._size = 0
+        self._opening = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mcp-tools-refresh")
+
+    # ---------- borrowing ----------
+
+    def acquire(self, timeout: Optional[float] = None, wait: bool = True) -> PooledMCPSession:
+        """
+        Borrow a healthy session, starting a new one if the pool has room.
+        Blocks up to `timeout` seconds when all sessions are in use, or raises
+        PoolExhausted right away with wait=False, so that the only blocking
+        left is this caller's own probe or connect.
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            session = self._take_idle_or_reserve(deadline, wait)
+            if session is None:
+                session = self._open()
+            elif not self._check(session):
+                continue
+            self._maybe_refresh(session)
+            return session
+
+    def try_acquire(self) -> Optional[PooledMCPSession]:
+        """
+        Non-blocking acquire: returns an idle session that needs no health
+        probe, or None so the caller can fall back to acquire().
+        """
+        with self._cond:
+            if self._closed or not self._idle or self._needs_probe(self._idle[-1]):
+                return None
+            session = self._idle.pop()
+        self._maybe_refresh(session)
+        return session
+
+    def release(self, session: PooledMCPSession, healthy: bool = True) -> None:
+        """
+        Return a borrowed session. Pass healthy=False if the borrower hit an
+        error, so the session is probed before its next use.
+        """
+        session.last_used = time.monotonic()
+        if not healthy:
+            session.needs_check = True
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                session.close()
+                return
+            self._idle.append(session)
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, timeout: Optional[float] = None):
+        session = self.acquire(timeout)
+        healthy = True
+        try:
+            yield session
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self.release(session, healthy=healthy)
+
+    @asynccontextmanager
+    async def session_async(self, timeout: Optional[float] = None):
+        """
+        Async variant of session(). The warm path is a non-blocking pop; only
+        connecting or waiting for a free session is moved off the event loop.
+        """
+        session = self.try_acquire()
+        if session is None:
+            session = await asyncio.to_thread(self.acquire, timeout)
+        healthy = True
+        try:
+            yield session
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self.release(session, healthy=healthy)
+
+    # ---------- lifecycle ----------
+
+    def warm(self, count: int = 1) -> None:
+        """
+        Pre-open up to `count` sessions so the first requests skip the handshake.
+        """
+        sessions = [self.acquire() for _ in range(min(count, self.max_size))]
+        for session in sessions:
+            self.release(session)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for session in idle:
+            session.close()
+        self._refresher.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "opening": self._opening,
+                "lent": self._size - len(self._idle) - self._opening,
+                "max_size": self.max_size,
+            }
+
+    # ---------- internals ----------
+
+    def _take_idle_or_reserve(self, deadline: float, wait: bool = True) -> Optional[PooledMCPSession]:
+        """
+        Pop an idle session, or reserve a slot for a new one (returns None).
+        """
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("MCP session pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._opening += 1
+                    return None
+                if not wait:
+                    raise PoolExhausted(f"all {self.max_size} MCP sessions in use")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"no MCP session available within pool of {self.max_size}")
+                self._cond.wait(remaining)
+
+    def _open(self) -> PooledMCPSession:
+        try:
+            client = self._factory()
+            client.start()
+            session = PooledMCPSession(client)
+            try:
+                session.refresh_tools()
+            except Exception:
+                # Started but unusable: stop it so its connection and background task don't leak
+                session.close()
+                raise
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+        return session
+
+    def _check(self, session: PooledMCPSession) -> bool:
+        """
+        Probe sessions that failed or sat idle too long; drop the dead ones.
+        A successful probe doubles as a tool refresh.
+        """
+        if not self._needs_probe(session):
+            return True
+        try:
+            session.refresh_tools()
+            return True
+        except Exception as e:
+            logger.warning(f"dropping unhealthy MCP session: {e}")
+            self._discard(session)
+            return False
+
+    def _needs_probe(self, session: PooledMCPSession) -> bool:
+        idle_for = time.monotonic() - session.last_used
+        return session.needs_check or idle_for >= self.health_check_interval
+
+    def _discard(self, session: PooledMCPSession) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        session.close()
+
+    def _maybe_refresh(self, session: PooledMCPSession) -> None:
+        if not session.is_stale(self.tools_ttl) or not session.start_refresh():
+            return
+
+        def _refresh():
+            try:
+                session.refresh_tools()
+            except Exception as e:
+                logger.warning(f"background tool refresh failed: {e}")
+                session.needs_check = True
+            finally:
+                session.finish_refresh()
+
+        try:
+            self._refresher.submit(_refresh)
+        except RuntimeError:
+            session.finish_refresh()
@@ -0,0 +1,258 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from bedrock_agentcore.memory.integrations.strands.config import PersistenceMode
+from bedrock_agentcore.memory.integrations.strands.session_manager import AgentCoreMemorySessionManager
+from strands.types.session import Session, SessionAgent, SessionMessage
+
+MEMORY_CACHE_TTL_SECONDS = float(os.getenv("MEMORY_CACHE_TTL_SECONDS", "300"))
+MEMORY_CACHE_MAX_SESSIONS = int(os.getenv("MEMORY_CACHE_MAX_SESSIONS", "256"))
+MEMORY_CACHE_MAX_MESSAGES = int(os.getenv("MEMORY_CACHE_MAX_MESSAGES", "500"))
+
+_MISS = object()
+
+
+class _Entry:
+    __slots__ = ("session", "agents", "messages", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.session = None
+        self.agents = {}
+        self.messages = None
+        self.expires_at = expires_at
+
+
+class SessionMemoryCache:
+    """
+    Per-(memory, actor, session) copy of what AgentCoreMemorySessionManager reads
+    when an agent is restored: the session, agent state and message history.
+
+    Entries expire `ttl` seconds after they were last written and the least
+    recently used entry is evicted beyond `max_sessions`; sessions with more than
+    `max_messages` messages are not cached. Values are stored serialized, so
+    callers never share mutable objects across invocations.
+    """
+
+    def __init__(
+        self,
+        ttl: float = MEMORY_CACHE_TTL_SECONDS,
+        max_sessions: int = MEMORY_CACHE_MAX_SESSIONS,
+        max_messages: int = MEMORY_CACHE_MAX_MESSAGES,
+    ):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_sessions > 0
+
+    def _entry(self, key: tuple, create: bool = False) -> Optional[_Entry]:
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[key]
+            entry = None
+        if entry is None and create:
+            entry = self._entries[key] = _Entry(now + self.ttl)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if create:
+                entry.expires_at = now + self.ttl
+        return entry
+
+    def _get(self, key: tuple, read) -> Any:
+        with self._lock:
+            entry = self._entry(key)
+            value = read(entry) if entry is not None else None
+            if value is None:
+                self.misses += 1
+                return _MISS
+            self.hits += 1
+            return value
+
+    def get_session(self, key: tuple) -> Any:
+        return self._get(key, lambda e: e.session)
+
+    def get_agent(self, key: tuple, agent_id: str) -> Any:
+        return self._get(key, lambda e: e.agents.get(agent_id))
+
+    def get_messages(self, key: tuple) -> Any:
+        return self._get(key, lambda e: e.messages)
+
+    def put_session(self, key: tuple, session: dict, new: bool = False) -> None:
+        with self._lock:
+            entry = self._entry(key, create=True)
+            entry.session = session
+            if new:
+                # A session that was just created has no history yet
+                entry.agents = {}
+                entry.messages = []
+
+    def put_agent(self, key: tuple, agent_id: str, agent: dict) -> None:
+        with self._lock:
+            self._entry(key, create=True).agents[agent_id] = agent
+
+    def put_messages(self, key: tuple, messages: list[dict]) -> None:
+        if len(messages) > self.max_messages:
+            return
+        with self._lock:
+            self._entry(key, create=True).messages = messages
+
+    def append_messages(self, key: tuple, messages: list[dict]) -> None:
+        """Mirror messages written through this process onto a cached history."""
+        with self._lock:
+            entry = self._entry(key)
+            if entry is None or entry.messages is None:
+                return
+            if len(entry.messages) + len(messages) > self.max_messages:
+                entry.messages = None
+                return
+            entry.messages = entry.messages + messages
+            entry.expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self, key: tuple) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+class CachedMemorySessionManager(AgentCoreMemorySessionManager):
+    """
+    AgentCoreMemorySessionManager whose restore-time reads (read_session,
+    read_agent, list_messages) are served from a shared SessionMemoryCache.
+
+    Writes go to AgentCore Memory first. Writes whose result is known locally
+    (a new session, agent state, an appended message) then update the cached
+    entry, so the next turn of the same session restores without any memory
+    round-trip; other writes (message updates, buffered batches) invalidate it.
+    """
+
+    def __init__(self, *args: Any, cache: SessionMemoryCache, **kwargs: Any):
+        self.cache = cache
+        # Set before super().__init__, which already calls read_session
+        config = kwargs.get("agentcore_memory_config") or args[0]
+        self._cache_key = (config.memory_id, config.actor_id, config.session_id)
+        # Buffered writes (batch_size > 1) may still fail after the turn, so only cache immediate
+        # writes; with persistence off nothing is stored, so nothing may be served from the cache either
+        self._cache_enabled = (
+            cache.enabled and config.batch_size <= 1 and config.persistence_mode is not PersistenceMode.NONE
+        )
+        super().__init__(*args, **kwargs)
+
+    # ---- reads ----
+
+    def read_session(self, session_id: str, **kwargs: Any) -> Optional[Session]:
+        if not self._cache_enabled or session_id != self.config.session_id:
+            return super().read_session(session_id, **kwargs)
+        cached = self.cache.get_session(self._cache_key)
+        if cached is not _MISS:
+            return Session.from_dict(cached)
+        session = super().read_session(session_id, **kwargs)
+        if session is not None:
+            self.cache.put_session(self._cache_key, session.to_dict())
+        return session
+
+    def read_agent(self, session_id: str, agent_id: str, **kwargs: Any) -> Optional[SessionAgent]:
+        if not self._cache_enabled or session_id != self.config.session_id:
+            return super().read_agent(session_id, agent_id, **kwargs)
+        cached = self.cache.get_agent(self._cache_key, agent_id)
+        if cached is not _MISS:
+            agent = SessionAgent.from_dict(cached)
+            if agent.created_at:
+                self._agent_created_at_cache[agent_id] = agent.created_at
+            return agent
+        agent = super().read_agent(session_id, agent_id, **kwargs)
+        if agent is not None:
+            self.cache.put_agent(self._cache_key, agent_id, agent.to_dict())
+        return agent
+
+    def list_messages(
+        self, session_id: str, agent_id: str, limit: Optional[int] = None, offset: int = 0, **kwargs: Any
+    ) -> list[SessionMessage]:
+        if not self._cache_enabled or session_id != self.config.session_id or limit is not None:
+            return super().list_messages(session_id, agent_id, limit=limit, offset=offset, **kwargs)
+        cached = self.cache.get_messages(self._cache_key)
+        if cached is _MISS:
+            messages = super().list_messages(session_id, agent_id, **kwargs)
+            # An empty list is also what a failed read returns, so it is not cached
+            if messages:
+                self.cache.put_messages(self._cache_key, [m.to_dict() for m in messages])
+            return messages[offset:]
+        return [SessionMessage.from_dict(m) for m in cached[offset:]]
+
+    # ---- writes ----
+
+    def create_session(self, session: Session, **kwargs: Any) -> Session:
+        try:
+            created = super().create_session(session, **kwargs)
+        except Exception:
+            self.cache.invalidate(self._cache_key)
+            raise
+        if self._cache_enabled:
+            self.cache.put_session(self._cache_key, created.to_dict(), new=True)
+        return created
+
+    def create_agent(self, session_id: str, session_agent: SessionAgent, **kwargs: Any) -> None:
+        try:
+            super().create_agent(session_id, session_agent, **kwargs)
+        except Exception:
+            self.cache.invalidate(self._cache_key)
+            raise
+        if self._cache_enabled:
+            self.cache.put_agent(self._cache_key, session_agent.agent_id, session_agent.to_dict())
+
+    def create_message(
+        self, session_id: str, agent_id: str, session_message: SessionMessage, **kwargs: Any
+    ) -> Optional[dict[str, Any]]:
+        try:
+            event = super().create_message(session_id, agent_id, session_message, **kwargs)
+        except Exception:
+            self.cache.invalidate(self._cache_key)
+            raise
+        if not self._cache_enabled or event is None:
+            return event
+        # Convert the stored event exactly as list_messages would on the next read
+        # (blob-sized messages come back as the raw CreateEvent response)
+        stored = event.get("event", event)
+        messages = self.converter.events_to_messages([stored]) if stored.get("payload") else []
+        if not messages:
+            self.cache.invalidate(self._cache_key)
+            return event
+        if self.config.filter_restored_tool_context:
+            messages = self._filter_restored_tool_context(messages)
+        self.cache.append_messages(self._cache_key, [m.to_dict() for m in messages])
+        return event
+
+    def update_message(self, session_id: str, agent_id: str, session_message: SessionMessage, **kwargs: Any) -> None:
+        self.cache.invalidate(self._cache_key)
+        try:
+            super().update_message(session_id, agent_id, session_message, **kwargs)
+        finally:
+            # create_message inside the update may have re-populated the entry
+            self.cache.invalidate(self._cache_key)
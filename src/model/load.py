@@ -1,12 +1,91 @@
+import json
+import logging
+import os
+import time
+from typing import Optional
+
 from strands.models import BedrockModel
 
+try:
+    from strands.models import CacheConfig
+except ImportError:  # strands-agents releases before CacheConfig
+    CacheConfig = None
+
 # Uses global inference profile for Claude Sonnet 4.5
 # https://docs.aws.amazon.com/bedrock/latest/userguide/inference-profiles-support.html
-MODEL_ID = "global.anthropic.claude-sonnet-4-5-20250929-v1:0"
+MODEL_ID = os.getenv("MODEL_ID", "global.anthropic.claude-sonnet-4-5-20250929-v1:0")
+
+# Optional cheaper model for short prompts, e.g. a Haiku inference profile
+SMALL_MODEL_ID = os.getenv("SMALL_MODEL_ID")
+SMALL_PROMPT_MAX_CHARS = int(os.getenv("SMALL_PROMPT_MAX_CHARS", "200"))
+
+# Bedrock prompt caching for the static system prompt and MCP tool schemas ("default" or "off")
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "default")
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedBedrockModel(BedrockModel):
+    """
+    BedrockModel that logs token usage, cache reads, time-to-first-token and
+    total latency for every model call (one line per call, including the
+    follow-up calls of a tool-use loop).
+    """
+
+    def __init__(self, *args, metrics_logger: Optional[logging.Logger] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_logger = metrics_logger or logger
+
+    async def stream(self, *args, **kwargs):
+        start = time.perf_counter()
+        first_token_ms = None
+        usage = {}
+
+        async for event in super().stream(*args, **kwargs):
+            if first_token_ms is None and "contentBlockDelta" in event:
+                first_token_ms = (time.perf_counter() - start) * 1000
+            if "metadata" in event:
+                usage = event["metadata"].get("usage", {}) or {}
+            yield event
+
+        self._emit(usage, first_token_ms, (time.perf_counter() - start) * 1000)
+
+    def _emit(self, usage: dict, first_token_ms: Optional[float], total_ms: float) -> None:
+        input_tokens = usage.get("inputTokens", 0)
+        cache_read = usage.get("cacheReadInputTokens", 0)
+        cache_write = usage.get("cacheWriteInputTokens", 0)
+        prompt_tokens = input_tokens + cache_read + cache_write
+        self.metrics_logger.info("model_call " + json.dumps({
+            "model_id": self.config.get("model_id"),
+            "input_tokens": input_tokens,
+            "output_tokens": usage.get("outputTokens", 0),
+            "cache_read_tokens": cache_read,
+            "cache_write_tokens": cache_write,
+            "cache_hit_rate": round(cache_read / prompt_tokens, 3) if prompt_tokens else 0.0,
+            "ttft_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+            "latency_ms": round(total_ms, 1),
+        }))
+
+
+def select_model_id(prompt: str) -> str:
+    """
+    Per-deployment model choice: SMALL_MODEL_ID for short prompts when configured.
+    """
+    if SMALL_MODEL_ID and len(prompt) <= SMALL_PROMPT_MAX_CHARS:
+        return SMALL_MODEL_ID
+    return MODEL_ID
+
 
-def load_model() -> BedrockModel:
+def load_model(model_id: str = MODEL_ID, metrics_logger: Optional[logging.Logger] = None) -> BedrockModel:
     """
     Get Bedrock model client.
     Uses IAM authentication via the execution role.
     """
-    return BedrockModel(model_id=MODEL_ID)
\ No newline at end of file
+    cache = {}
+    if PROMPT_CACHE == "off":
+        pass
+    elif CacheConfig is not None:
+        cache = {"cache_config": CacheConfig(strategy="auto", system_prompt_ttl=True, tools_ttl=True)}
+    else:
+        cache = {"cache_prompt": PROMPT_CACHE, "cache_tools": PROMPT_CACHE}
+    return InstrumentedBedrockModel(model_id=model_id, metrics_logger=metrics_logger, **cache)
@@ -0,0 +1,154 @@
+"""
+Local redaction of sensitive identifiers before transcripts reach a model.
+
+Shared by the user info extractor (src/user_extractor.py) and the memory
+processor Lambda, which gets a copy of this module in its deployment package.
+All patterns are compiled into one alternation without capture groups, so a
+transcript is scrubbed in a single regex pass regardless of how many
+identifier kinds are enabled; the kind is only worked out for actual matches.
+Turns left with nothing worth extracting (greetings, acknowledgements, or
+nothing but redactions) are dropped instead of being sent to the model.
+"""
+import os
+import re
+from typing import Iterable, Optional
+
+SCRUB_TRANSCRIPTS = os.getenv("SCRUB_TRANSCRIPTS", "on")  # on | off
+
+# Context that makes a bare nine-digit number an SSN ("SSN: 123456789")
+_SSN_CONTEXT = (r"[sS](?<!\w[sS])(?i:(?<=s)sn|(?<=s)ocial security(?: number)?)\b\s*(?:#|no\.?|number)?"
+                r"\s*(?:(?:is|was)\s+)?[:#]?\s*")
+# Lead-ins kept in the output ("password is [redacted:secret]") so the model still
+# sees the turn's shape. Every pattern starts with a literal or a character class
+# guarded by a lookbehind rather than with \b, which lets the regex engine skip
+# ahead to candidate positions instead of trying each one.
+LEADS = {
+    "ssn": f"(?:{_SSN_CONTEXT})?",
+    "secret": r"[pPsSaAtT](?<!\w[pPsSaAtT])(?i:(?<=p)(?:assword|asswd|wd|asscode|in)|(?<=s)ecret"
+              r"|(?<=a)pi[ _-]?key|(?<=t)oken)\b(?:\s+(?:is|was))?\s*[:=]?\s*",
+    "dob": r"[bBdD](?<!\w[bBdD])(?i:(?<=b)orn on|(?<=d)ate of birth|(?<=d)ob)\b\s*[:\-]?\s*",
+}
+# What follows a secret lead-in is only redacted if it looks like a value: anything
+# after ":" or "=", a number of 4+ digits, a word of 6+ characters with a digit or
+# symbol in it, or a 16+ character key. Plain words ("the token was used") are kept.
+_SECRET_VALUE = (r"(?:(?:(?<=[:=])|(?<=[:=]\s))\S+|\d{4,}\b"
+                 r"|(?=\S*(?:\d|[^\w\s.,;:!?'\"()\-]))\S{6,}|[\w+/=-]{16,})")
+
+# Order matters where patterns overlap: the first alternative that matches wins
+PATTERNS = {
+    "card": r"\d(?<!\w\d)\d{3}(?:[- ]?\d{4}){2}[- ]?\d{1,7}\b",
+    # Separated (123-45-6789, 123 45 6789), or unseparated only right after an SSN lead-in
+    "ssn": r"\d(?<!\w\d)(?<=(?!000|666|9\d\d)\d)\d{2}(?:-(?!00)\d{2}-|\s(?!00)\d{2}\s)(?!0000)\d{4}\b"
+           r"|" + _SSN_CONTEXT + r"(?!000|666|9)\d{3}(?!00)\d{2}(?!0000)\d{4}\b",
+    "secret": LEADS["secret"] + _SECRET_VALUE,
+    "aws_key": r"(?:AKIA|ASIA)[0-9A-Z]{16}\b",
+    "dob": LEADS["dob"] + r"(?:\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}|\w+ \d{1,2},? \d{4})",
+}
+
+# Turns consisting only of these (after the role prefix) carry no facts
+_FILLER = re.compile(
+    r"(?i)^\W*(?:(?:hi|hello|hey|thanks|thank you|thx|ok|okay|sure|yes|no|yep|nope|cool|great|bye|goodbye"
+    r"|got it|sounds good|please|\[redacted:\w+\])\W*)*$"
+)
+# Longest turn (after the role prefix) checked against _FILLER
+_FILLER_MAX_CHARS = 64
+# Separates turns while they are scrubbed as one string; no pattern can match across it
+_SEP = "\x1e"
+
+
+def estimate_tokens(n_bytes: int) -> int:
+    return n_bytes // 4
+
+
+class ScrubStats:
+    __slots__ = ("bytes_in", "bytes_out", "turns_in", "turns_out", "redactions")
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.turns_in = 0
+        self.turns_out = 0
+        self.redactions = {}
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    @property
+    def tokens_saved(self) -> int:
+        return estimate_tokens(self.bytes_saved)
+
+    def as_dict(self) -> dict:
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_saved": self.bytes_saved,
+            "tokens_saved": self.tokens_saved,
+            "turns_dropped": self.turns_in - self.turns_out,
+            "redactions": dict(self.redactions),
+        }
+
+
+class Scrubber:
+    def __init__(self, kinds: Optional[Iterable[str]] = None, drop_filler: bool = True):
+        kinds = list(PATTERNS) if kinds is None else list(kinds)
+        self.kinds = kinds
+        self.drop_filler = drop_filler
+        # Named groups around each alternative would defeat the engine's prefix scan,
+        # so the combined pattern has none and matches are classified afterwards
+        self._pattern = re.compile("|".join(PATTERNS[k] for k in kinds))
+        self._kinds = [(k, re.compile(PATTERNS[k])) for k in kinds]
+        self._leads = {k: re.compile(LEADS[k]) for k in kinds if k in LEADS}
+
+    def _redact(self, text: str, stats: ScrubStats) -> str:
+        counts = stats.redactions
+
+        def replace(m):
+            found = m.group(0)
+            kind = next(k for k, pattern in self._kinds if pattern.fullmatch(found))
+            counts[kind] = counts.get(kind, 0) + 1
+            lead = self._leads[kind].match(found).group(0) if kind in self._leads else ""
+            return f"{lead}[redacted:{kind}]"
+
+        return self._pattern.sub(replace, text)
+
+    def scrub(self, text: str, stats: Optional[ScrubStats] = None) -> str:
+        stats = stats if stats is not None else ScrubStats()
+        stats.bytes_in += len(text.encode())
+        text = self._redact(text, stats)
+        stats.bytes_out += len(text.encode())
+        return text
+
+    def scrub_lines(self, lines: list[str], stats: Optional[ScrubStats] = None) -> tuple[list[str], ScrubStats]:
+        """Redact transcript turns in one pass and drop those left without facts."""
+        stats = stats if stats is not None else ScrubStats()
+        joined = _SEP.join(lines)
+        stats.bytes_in += len(joined.encode())
+        stats.turns_in += len(lines)
+
+        out = self._redact(joined, stats).split(_SEP) if lines else []
+        if self.drop_filler:
+            out = [line for line in out if not self._is_filler(line)]
+
+        stats.turns_out += len(out)
+        stats.bytes_out += len(_SEP.join(out).encode())
+        return out, stats
+
+
+    @staticmethod
+    def _is_filler(line: str) -> bool:
+        # Strip the "ROLE: " prefix added by the transcript builder
+        i = line.find(": ")
+        return is_filler(line[i + 2:] if 0 < i < 16 else line)
+
+
+def is_filler(text: str) -> bool:
+    """A greeting, acknowledgement or redaction-only text, which carries no facts."""
+    return len(text) <= _FILLER_MAX_CHARS and _FILLER.match(text) is not None
+
+
+def scrubber_from_env(spec: str = SCRUB_TRANSCRIPTS, **kwargs) -> Optional[Scrubber]:
+    if spec == "off":
+        return None
+    if spec == "on":
+        return Scrubber(**kwargs)
+    raise ValueError(f"Unsupported SCRUB_TRANSCRIPTS value: {spec}")
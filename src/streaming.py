@@ -0,0 +1,106 @@
+import asyncio
+import os
+import re
+from typing import AsyncIterator
+
+# off | size | time | sentence
+STREAM_COALESCE = os.getenv("STREAM_COALESCE", "off")
+STREAM_MAX_CHARS = int(os.getenv("STREAM_MAX_CHARS", "256"))
+STREAM_WINDOW_MS = float(os.getenv("STREAM_WINDOW_MS", "30"))
+STREAM_MAX_PENDING = int(os.getenv("STREAM_MAX_PENDING", "512"))
+
+_SENTENCE_END = re.compile(r"[.!?:;\n]\s*$")
+_END = object()
+
+
+class _Failed:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def coalesce(
+    source: AsyncIterator[str],
+    mode: str = STREAM_COALESCE,
+    max_chars: int = STREAM_MAX_CHARS,
+    window_ms: float = STREAM_WINDOW_MS,
+    max_pending: int = STREAM_MAX_PENDING,
+) -> AsyncIterator[str]:
+    """
+    Merge small text fragments into fewer, larger chunks.
+
+    The first fragment is always yielded immediately. After that, buffered text
+    is flushed when it reaches `max_chars`, and:
+      - size:     only on size (or after the window, so text before a tool call is not held back)
+      - time:     once the oldest buffered fragment is `window_ms` old
+      - sentence: at a sentence boundary, or after the window
+
+    The source is read by a separate task into a queue of at most `max_pending`
+    fragments. When the client reads slowly this generator is not resumed, the
+    queue fills and the producer (and with it the model stream) waits, so the
+    per-session buffer stays bounded.
+    """
+    if mode == "off":
+        async for fragment in source:
+            yield fragment
+        return
+
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+
+    async def produce():
+        try:
+            async for fragment in source:
+                await queue.put(fragment)
+            await queue.put(_END)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            await queue.put(_Failed(e))
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception:
+                    pass
+
+    producer = asyncio.create_task(produce())
+    buf = []
+    size = 0
+    deadline = None
+    first = True
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield "".join(buf)
+                buf, size, deadline = [], 0, None
+                continue
+
+            if item is _END:
+                break
+            if isinstance(item, _Failed):
+                raise item.error
+            if first:
+                first = False
+                yield item
+                continue
+
+            buf.append(item)
+            size += len(item)
+            if deadline is None:
+                deadline = loop.time() + window
+
+            if size >= max_chars or (mode == "sentence" and _SENTENCE_END.search(item)):
+                yield "".join(buf)
+                buf, size, deadline = [], 0, None
+
+        if buf:
+            yield "".join(buf)
+    finally:
+        if not producer.done():
+            producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
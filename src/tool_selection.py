@@ -0,0 +1,197 @@
+"""
+Relevance-based selection of the MCP tools attached to a request.
+
+Every attached tool's JSON schema is sent with each model call, so a large
+catalog costs input tokens and time-to-first-token on every turn. The
+selector ranks the catalog against the prompt with BM25 over each tool's
+name, description and parameter names, and keeps the top-k plus a pinned set.
+The index is built once per catalog (tool names and descriptions) and reused
+until the catalog changes; ranking a prompt is a handful of dict lookups.
+Selected tools keep their catalog order, so requests that select the same
+tools send identical tool definitions and keep hitting the prompt cache.
+"""
+import fnmatch
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from scrubber import estimate_tokens
+
+TOOL_SELECTION = os.getenv("TOOL_SELECTION", "off")  # off | bm25
+TOOL_SELECTION_TOP_K = int(os.getenv("TOOL_SELECTION_TOP_K", "8"))
+# Tool names (or fnmatch patterns) always attached, comma-separated
+TOOL_SELECTION_PINNED = os.getenv("TOOL_SELECTION_PINNED", "")
+
+# BM25 parameters; the tool name is counted NAME_WEIGHT times
+K1 = 1.2
+B = 0.75
+NAME_WEIGHT = 3
+# Catalogs indexed at once (one per distinct set of servers reached)
+_MAX_INDEXES = 8
+
+_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do for from get how i in is it me my of on or please "
+    "show tell that the this to use what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words, with snake_case and camelCase split and plural 's' dropped."""
+    words = []
+    for word in _WORD.findall(text or ""):
+        word = word.lower()
+        if len(word) < 2 or word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def _spec(tool) -> dict:
+    return getattr(tool, "tool_spec", None) or tool
+
+
+def _name(tool) -> str:
+    return getattr(tool, "tool_name", None) or _spec(tool)["name"]
+
+
+def _document(spec: dict) -> List[str]:
+    schema = spec.get("inputSchema", {})
+    schema = schema.get("json", schema)
+    words = tokenize(spec.get("name", "")) * NAME_WEIGHT + tokenize(spec.get("description", ""))
+    for param, definition in (schema.get("properties") or {}).items():
+        words += tokenize(param)
+        if isinstance(definition, dict):
+            words += tokenize(definition.get("description", ""))
+    return words
+
+
+class ToolIndex:
+    """BM25 index over one tool catalog."""
+
+    def __init__(self, tools: Sequence):
+        self.names = [_name(tool) for tool in tools]
+        specs = [_spec(tool) for tool in tools]
+        # Size of each tool's definition as sent in the model request
+        self.tokens = [estimate_tokens(len(json.dumps(spec, default=str))) for spec in specs]
+
+        docs = [Counter(_document(spec)) for spec in specs]
+        lengths = [sum(doc.values()) for doc in docs]
+        avg_length = (sum(lengths) / len(lengths)) if lengths else 1.0
+        df = Counter(word for doc in docs for word in doc)
+        n = len(docs)
+        # word -> [(tool position, weight)], BM25 term weights precomputed
+        self._postings: Dict[str, list] = {}
+        for i, doc in enumerate(docs):
+            norm = K1 * (1 - B + B * lengths[i] / avg_length)
+            for word, tf in doc.items():
+                idf = math.log(1 + (n - df[word] + 0.5) / (df[word] + 0.5))
+                self._postings.setdefault(word, []).append((i, idf * tf * (K1 + 1) / (tf + norm)))
+
+    def scores(self, query: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for word in set(tokenize(query)):
+            for i, weight in self._postings.get(word, ()):
+                scores[i] = scores.get(i, 0.0) + weight
+        return scores
+
+
+class Selection:
+    def __init__(self, tools: List, names: List[str], tokens_total: int, tokens_kept: int):
+        self.tools = tools
+        self.names = names
+        self.tokens_total = tokens_total
+        self.tokens_kept = tokens_kept
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_total - self.tokens_kept
+
+
+class ToolSelector:
+    """
+    Keeps the `top_k` tools most relevant to a prompt, plus the `pinned` ones.
+
+    At least one tool is always kept, so a conversation whose history holds
+    tool calls still gets a tool configuration. Catalogs no larger than the
+    selection are passed through unchanged.
+    """
+
+    def __init__(
+        self,
+        mode: str = TOOL_SELECTION,
+        top_k: int = TOOL_SELECTION_TOP_K,
+        pinned: str = TOOL_SELECTION_PINNED,
+    ):
+        if mode not in ("off", "bm25"):
+            raise ValueError(f"Unsupported TOOL_SELECTION: {mode}")
+        if top_k < 1:
+            raise ValueError("top_k must be at least 1")
+        self.mode = mode
+        self.top_k = top_k
+        self.pinned = [p.strip() for p in pinned.split(",") if p.strip()]
+        self._indexes: "OrderedDict[tuple, ToolIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.selections = 0
+        self.tokens_saved_total = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def index(self, tools: Sequence) -> ToolIndex:
+        key = tuple(_name(tool) for tool in tools)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+        index = ToolIndex(tools)
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > _MAX_INDEXES:
+                self._indexes.popitem(last=False)
+        return index
+
+    def _is_pinned(self, name: str) -> bool:
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self.pinned)
+
+    def select(self, prompt: str, tools: Sequence, top_k: Optional[int] = None) -> Selection:
+        top_k = top_k or self.top_k
+        index = self.index(tools)
+        total = sum(index.tokens)
+        keep = {i for i, name in enumerate(index.names) if self._is_pinned(name)}
+
+        if len(tools) <= top_k + len(keep):
+            keep = set(range(len(tools)))
+        else:
+            ranked = sorted(index.scores(prompt).items(), key=lambda item: (-item[1], item[0]))
+            keep.update(i for i, _ in ranked[:top_k])
+            if not keep:
+                keep.add(0)
+
+        positions = sorted(keep)
+        selection = Selection(
+            [tools[i] for i in positions],
+            [index.names[i] for i in positions],
+            total,
+            sum(index.tokens[i] for i in positions),
+        )
+        with self._lock:
+            self.selections += 1
+            self.tokens_saved_total += selection.tokens_saved
+        return selection
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "selections": self.selections,
+                "tokens_saved_total": self.tokens_saved_total,
+                "indexes": len(self._indexes),
+            }
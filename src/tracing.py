@@ -0,0 +1,240 @@
+"""
+Low-overhead, sampled span tracing for the request hot path.
+
+Shared by the agent entrypoint (src/main.py) and the memory processor Lambda,
+which gets a copy of this module in its deployment package. A trace is
+started per request; spans are opened explicitly on it, so they work the same
+from async generators and from worker threads. Unsampled traces are a shared
+no-op object, so the cost with sampling off is one random() call per request.
+
+A finished trace is emitted as a single JSON line (or replayed into
+OpenTelemetry with TRACE_EXPORTER=otel). Payload-bearing attributes such as
+prompts and transcripts are dropped, truncated or kept per TRACE_PAYLOADS.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_PAYLOADS = os.getenv("TRACE_PAYLOADS", "off")  # off | truncate | full
+TRACE_MAX_ATTR_CHARS = int(os.getenv("TRACE_MAX_ATTR_CHARS", "256"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "json")  # json | otel
+
+# Dict and list attributes stay structured; longer lists and deeper nesting are cut
+_MAX_ATTR_ITEMS = 32
+_MAX_ATTR_DEPTH = 4
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def set_payload(self, key: str, value: Any) -> None:
+        pass
+
+    def span(self, name: str, **attributes: Any) -> "_NoopSpan":
+        return self
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+    sampled = False
+
+
+NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(exc)
+        return False
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = self.trace.tracer.clip(value)
+
+    def set_payload(self, key: str, value: Any) -> None:
+        """Record request/response content, subject to TRACE_PAYLOADS."""
+        value = self.trace.tracer.payload(value)
+        if value is not None:
+            self.attributes[key] = value
+
+    def span(self, name: str, **attributes: Any) -> "Span":
+        return self.trace.start_span(name, self.span_id, attributes)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.perf_counter_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self is self.trace.root:
+            self.trace.finish()
+
+    sampled = True
+
+
+class Trace:
+    def __init__(self, tracer: "Tracer", name: str, attributes: dict):
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex
+        self.epoch_ns = time.time_ns()
+        self.spans = []
+        self._lock = threading.Lock()
+        self.root = self.start_span(name, None, attributes)
+
+    def start_span(self, name: str, parent_id: Optional[str], attributes: dict) -> Span:
+        span = Span(self, name, parent_id, {k: self.tracer.clip(v) for k, v in attributes.items()})
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def _unix_ns(self, perf_ns: int) -> int:
+        return self.epoch_ns + (perf_ns - self.root.start_ns)
+
+    def to_dict(self) -> dict:
+        root_start = self.root.start_ns
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "service": self.tracer.service,
+            "start_time_unix_nano": self.epoch_ns,
+            "duration_ms": round((self.root.end_ns - root_start) / 1e6, 3),
+            "spans": [
+                {
+                    "name": s.name,
+                    "span_id": s.span_id,
+                    "parent_span_id": s.parent_id,
+                    "start_ms": round((s.start_ns - root_start) / 1e6, 3),
+                    "duration_ms": round(((s.end_ns or self.root.end_ns) - s.start_ns) / 1e6, 3),
+                    "attributes": s.attributes,
+                    **({"error": s.error} if s.error else {}),
+                }
+                for s in self.spans
+            ],
+        }
+
+    def finish(self) -> None:
+        self.tracer.export(self)
+
+
+class Tracer:
+    def __init__(
+        self,
+        service: str,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        payloads: str = TRACE_PAYLOADS,
+        max_attr_chars: int = TRACE_MAX_ATTR_CHARS,
+        exporter: str = TRACE_EXPORTER,
+        sink: Optional[Callable[[str], None]] = None,
+    ):
+        self.service = service
+        self.sample_rate = sample_rate
+        self.payloads = payloads
+        self.max_attr_chars = max_attr_chars
+        self.exporter = exporter
+        self.sink = sink or _stdout_sink
+        self._otel = None
+
+    def start_trace(self, name: str, **attributes: Any):
+        """Start a sampled trace, or return the no-op span."""
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return NOOP
+        return Trace(self, name, attributes).root
+
+    def clip(self, value: Any, depth: int = 0) -> Any:
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value
+        if depth < _MAX_ATTR_DEPTH:
+            if isinstance(value, dict):
+                items = list(value.items())
+                clipped = {str(k): self.clip(v, depth + 1) for k, v in items[:_MAX_ATTR_ITEMS]}
+                if len(items) > _MAX_ATTR_ITEMS:
+                    clipped["..."] = f"[{len(items)} items]"
+                return clipped
+            if isinstance(value, (list, tuple, set, frozenset)):
+                items = list(value)
+                clipped = [self.clip(v, depth + 1) for v in items[:_MAX_ATTR_ITEMS]]
+                if len(items) > _MAX_ATTR_ITEMS:
+                    clipped.append(f"...[{len(items)} items]")
+                return clipped
+        text = value if isinstance(value, str) else str(value)
+        if len(text) > self.max_attr_chars:
+            return text[:self.max_attr_chars] + f"...[{len(text)} chars]"
+        return text
+
+    def payload(self, value: Any) -> Any:
+        if self.payloads == "full":
+            return value if isinstance(value, (str, int, float, bool)) else str(value)
+        if self.payloads == "truncate":
+            return self.clip(value)
+        return None
+
+    def export(self, trace: Trace) -> None:
+        try:
+            if self.exporter == "otel":
+                self._export_otel(trace)
+            else:
+                self.sink(json.dumps(trace.to_dict(), default=str))
+        except Exception as e:
+            sys.stderr.write(f"trace export failed: {e}\n")
+
+    def _export_otel(self, trace: Trace) -> None:
+        # Replay the finished spans with their recorded timestamps into the OTel SDK
+        from opentelemetry import trace as otel_trace
+
+        if self._otel is None:
+            self._otel = otel_trace.get_tracer(self.service)
+        contexts = {}
+        for s in trace.spans:
+            parent = contexts.get(s.parent_id)
+            span = self._otel.start_span(
+                s.name,
+                context=otel_trace.set_span_in_context(parent) if parent else None,
+                start_time=trace._unix_ns(s.start_ns),
+                attributes={k: _otel_value(v) for k, v in s.attributes.items() if v is not None},
+            )
+            if s.error:
+                span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, s.error))
+            span.end(end_time=trace._unix_ns(s.end_ns or trace.root.end_ns))
+            contexts[s.span_id] = span
+
+
+def _otel_value(value: Any) -> Any:
+    # OTel attributes are scalars or lists of one scalar type; anything else is sent as JSON
+    if isinstance(value, dict):
+        return json.dumps(value, default=str)
+    if isinstance(value, list):
+        kinds = {type(v) for v in value}
+        if len(kinds) > 1 or kinds & {dict, list, type(None)}:
+            return json.dumps(value, default=str)
+    return value
+
+
+def _stdout_sink(line: str) -> None:
+    sys.stdout.write(line + "\n")
@@ -1,7 +1,59 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+import asyncio
 import json
+import os
+import re
+import threading
 import boto3
+from botocore.config import Config
+from scrubber import PATTERNS, ScrubStats, is_filler, scrubber_from_env
+
+REGION = os.getenv("AWS_REGION", "us-east-1")
+EXTRACTOR_MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+MAX_CONCURRENCY = int(os.getenv("EXTRACTOR_MAX_CONCURRENCY", "8"))
+
+# A text without letters holds no name, and one without digits either holds no SSN
+_LETTER = re.compile(r"[^\W\d_]")
+_DIGIT = re.compile(r"\d")
+_SSN = re.compile(PATTERNS["ssn"])
+_SSN_NUMBER = re.compile(r"\d[\d -]*\d")
+
+# With scrubbing on, SSNs are read locally and redacted, along with passwords and
+# other secrets, before the text is sent to the model.
+_scrubber = scrubber_from_env(drop_filler=False)
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _shared_client(region_name: str):
+    """One bedrock-runtime client per region, with a connection pool sized for concurrent calls."""
+    with _clients_lock:
+        client = _clients.get(region_name)
+        if client is None:
+            client = boto3.client(
+                'bedrock-runtime',
+                region_name=region_name,
+                config=Config(max_pool_connections=max(10, MAX_CONCURRENCY)),
+            )
+            _clients[region_name] = client
+        return client
+
+
+def may_contain_user_info(text: str, names_only: bool = False) -> bool:
+    """
+    Cheap local pre-filter run before any model call. Conservative: only text
+    that provably holds no name (or, unless `names_only`, no SSN) is rejected,
+    i.e. empty text, digits and punctuation only, and greeting/acknowledgement
+    turns. Anything else, however it is capitalized, goes to the model.
+    """
+    text = text.strip()
+    if not text:
+        return False
+    if not _LETTER.search(text):
+        return not names_only and bool(_DIGIT.search(text))
+    return not is_filler(text)
 
 
 class UserInfo(BaseModel):
@@ -11,46 +63,134 @@ class UserInfo(BaseModel):
 
 
 class UserInfoMemoryExtractor:
-    def __init__(self):
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
+    def __init__(self, region_name: str = REGION, max_concurrency: int = MAX_CONCURRENCY):
+        self.bedrock_client = _shared_client(region_name)
         self.user_info = UserInfo()
-    
+        self.max_concurrency = max_concurrency
+        self.skipped = 0
+        self.scrub_stats = ScrubStats()
+        self._semaphore = None
+
+    def _prepare(self, text: str):
+        """
+        Returns the text to send to the model (None to skip the call) and
+        whatever was found locally.
+        """
+        if not text.strip():
+            return None, UserInfo()
+        if _scrubber is None:
+            return (text if may_contain_user_info(text) else None), UserInfo()
+
+        m = _SSN.search(text)
+        # The match may start with its "SSN is" lead-in; only the number is kept
+        local = UserInfo(ssn=_SSN_NUMBER.search(m.group(0)).group(0) if m else None)
+        scrubbed = _scrubber.scrub(text, self.scrub_stats)
+        if not may_contain_user_info(scrubbed, names_only=True):
+            # Nothing is sent at all
+            self.scrub_stats.bytes_out -= len(scrubbed.encode())
+            return None, local
+        return scrubbed, local
+
+    def _combine(self, extracted: UserInfo, local: UserInfo) -> UserInfo:
+        if _scrubber is not None:
+            # The model only ever sees redacted SSNs
+            extracted.ssn = local.ssn
+        return extracted
+
     def extract(self, text: str) -> Dict[str, Any]:
         """Extract user info using Bedrock LLM"""
-        if not text.strip():
+        model_text, local = self._prepare(text)
+        if model_text is None:
+            self.skipped += 1
+            self._merge(local)
+            return {"user_info": self.user_info.model_dump()}
+
+        try:
+            self._merge(self._combine(self._invoke(model_text), local))
+            return {"user_info": self.user_info.model_dump()}
+        except Exception as e:
+            return {"user_info": self.user_info.model_dump(), "error": str(e)}
+
+    async def extract_async(self, text: str) -> Dict[str, Any]:
+        """Same as extract(), without blocking the event loop"""
+        model_text, local = self._prepare(text)
+        if model_text is None:
+            self.skipped += 1
+            self._merge(local)
             return {"user_info": self.user_info.model_dump()}
-            
+
+        try:
+            self._merge(self._combine(await self._invoke_async(model_text), local))
+            return {"user_info": self.user_info.model_dump()}
+        except Exception as e:
+            return {"user_info": self.user_info.model_dump(), "error": str(e)}
+
+    async def extract_many(self, texts: List[str]) -> Dict[str, Any]:
+        """
+        Extract from several texts concurrently (at most max_concurrency model
+        calls at once). Results are merged in input order, so the stored info is
+        the same as calling extract() on each text in turn.
+        """
+        prepared = [self._prepare(t) for t in texts]
+        self.skipped += sum(1 for model_text, _ in prepared if model_text is None)
+
+        async def run(model_text):
+            if model_text is None:
+                return UserInfo()
+            return await self._invoke_async(model_text)
+
+        results = await asyncio.gather(
+            *(run(model_text) for model_text, _ in prepared),
+            return_exceptions=True,
+        )
+
+        errors = []
+        for (model_text, local), result in zip(prepared, results):
+            if isinstance(result, Exception):
+                errors.append(str(result))
+                self._merge(local)
+            else:
+                self._merge(self._combine(result, local) if model_text is not None else local)
+
+        response = {"user_info": self.user_info.model_dump()}
+        if errors:
+            response["errors"] = errors
+        return response
+
+    async def _invoke_async(self, text: str) -> UserInfo:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await asyncio.to_thread(self._invoke, text)
+
+    def _invoke(self, text: str) -> UserInfo:
         prompt = f"""Extract user information from this text. Return only a JSON object with firstname, lastname, and ssn fields.
 If information is not found, use null for that field.
 
 Text: {text}
 
 JSON:"""
-        
-        try:
-            response = self.bedrock_client.invoke_model(
-                modelId="anthropic.claude-3-haiku-20240307-v1:0",
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 200,
-                    "messages": [{"role": "user", "content": prompt}]
-                })
-            )
-            
-            result = json.loads(response['body'].read())
-            content = result['content'][0]['text']
-            
-            user_data = json.loads(content)
-            extracted_info = UserInfo(**user_data)
-            
-            # Update stored info
-            if extracted_info.firstname:
-                self.user_info.firstname = extracted_info.firstname
-            if extracted_info.lastname:
-                self.user_info.lastname = extracted_info.lastname
-            if extracted_info.ssn:
-                self.user_info.ssn = extracted_info.ssn
-            
-            return {"user_info": self.user_info.model_dump()}
-        except Exception as e:
-            return {"user_info": self.user_info.model_dump(), "error": str(e)}
\ No newline at end of file
+
+        response = self.bedrock_client.invoke_model(
+            modelId=EXTRACTOR_MODEL_ID,
+            body=json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": 200,
+                "messages": [{"role": "user", "content": prompt}]
+            })
+        )
+
+        result = json.loads(response['body'].read())
+        content = result['content'][0]['text']
+
+        user_data = json.loads(content)
+        return UserInfo(**user_data)
+
+    def _merge(self, extracted_info: UserInfo) -> None:
+        # Update stored info
+        if extracted_info.firstname:
+            self.user_info.firstname = extracted_info.firstname
+        if extracted_info.lastname:
+            self.user_info.lastname = extracted_info.lastname
+        if extracted_info.ssn:
+            self.user_info.ssn = extracted_info.ssn
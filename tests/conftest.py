@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The agent modules are imported the way the runtime imports them, from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,33 @@
+import pytest
+
+from user_extractor import may_contain_user_info
+
+
+@pytest.mark.parametrize("text", [
+    "John",
+    "Sam here",
+    "john smith",
+    "Hi john here",
+    "my name is jane",
+    "I am Bob Jones",
+    "It's Ana, Ana Lopez",
+])
+def test_possible_names_reach_the_model(text):
+    assert may_contain_user_info(text)
+    assert may_contain_user_info(text, names_only=True)
+
+
+@pytest.mark.parametrize("text", ["123-45-6789", "123456789", "my ssn is 123 45 6789"])
+def test_possible_ssns_reach_the_model(text):
+    assert may_contain_user_info(text)
+
+
+@pytest.mark.parametrize("text", ["", "   ", "...", "?!", "Thanks!", "ok", "Hi", "yes please", "[redacted:ssn]"])
+def test_name_free_text_is_skipped(text):
+    assert not may_contain_user_info(text)
+    assert not may_contain_user_info(text, names_only=True)
+
+
+def test_digits_only_is_skipped_when_only_names_are_wanted():
+    assert not may_contain_user_info("42", names_only=True)
+    assert may_contain_user_info("42")